@@ -0,0 +1,13 @@
+"""Benchmarks of the streams, which aren't part of the addon.
+
+Outside of Kodi the xbmc and xbmcvfs modules imported by streamlink.cache
+don't exist, so the stand-ins of benchmarks/kodi are used instead.
+"""
+
+import os
+import sys
+
+try:
+    import xbmc  # noqa: F401
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "kodi"))
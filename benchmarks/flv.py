@@ -0,0 +1,156 @@
+"""Benchmarks the parsing of FLV tags over a large generated FLV file.
+
+The eager scenarios deserialise the audio, video and script data of every
+tag like Tag.deserialize did before tags were read lazily, the lazy ones
+only decode a payload when it's accessed. The concat scenarios run the
+tags through FLVTagConcat like the HDS and AkamaiHD streams do.
+
+Run from the repository root:
+
+    PYTHONPATH=resources/lib python -m benchmarks.flv [scenario ...]
+
+Outside of Kodi, the stand-ins of benchmarks/kodi are imported in place of
+the xbmc and xbmcvfs modules.
+"""
+
+from __future__ import division
+
+import argparse
+import json
+import sys
+import time
+from collections import OrderedDict
+
+from streamlink.packages.flashmedia.tag import (AACAudioData, AudioData, AVCVideoData, Header, ScriptData,
+                                                 Tag, VideoData, TAG_TYPE_AUDIO, TAG_TYPE_SCRIPT,
+                                                 TAG_TYPE_VIDEO)
+from streamlink.packages.flashmedia.types import ScriptDataECMAArray
+from streamlink.stream.flvconcat import FLVTagConcat, iter_flv_tags
+
+from .run import median
+
+MB = 1024 * 1024
+
+
+def create_fixture(duration, video_size, audio_size):
+    """Returns a FLV file with duration seconds of 25 video and 43 audio
+    frames per second."""
+    buf = bytearray(Header(has_video=True, has_audio=True).serialize())
+    buf += Tag(TAG_TYPE_SCRIPT, 0, ScriptData("onMetaData", ScriptDataECMAArray(duration=float(duration)))).serialize()
+    buf += Tag(TAG_TYPE_AUDIO, 0, AudioData(10, 3, 1, 1, AACAudioData(0, b"\x12\x10"))).serialize()
+    buf += Tag(TAG_TYPE_VIDEO, 0, VideoData(1, 7, AVCVideoData(0, 0, b"\x01\x64\x00\x1f"))).serialize()
+
+    audio = 0
+    for frame in range(int(duration * 25)):
+        timestamp = frame * 40
+        while (audio * 1024000) // 44100 <= timestamp:
+            buf += Tag(TAG_TYPE_AUDIO, (audio * 1024000) // 44100,
+                       AudioData(10, 3, 1, 1, AACAudioData(1, b"\x21" * audio_size))).serialize()
+            audio += 1
+
+        keyframe = 1 if frame % 50 == 0 else 2
+        buf += Tag(TAG_TYPE_VIDEO, timestamp,
+                   VideoData(keyframe, 7, AVCVideoData(1, 0, b"\x65" * video_size))).serialize()
+
+    return bytes(buf)
+
+
+def parse(buf, lazy):
+    tags = 0
+    for tag in iter_flv_tags(buf=buf, lazy=lazy):
+        tag.type, tag.timestamp
+        tags += 1
+
+    return tags
+
+
+def reserialize(buf, lazy):
+    for tag in iter_flv_tags(buf=buf, lazy=lazy):
+        tag.serialize()
+
+
+def concat(buf):
+    for chunk in FLVTagConcat().iter_chunks(buf=buf):
+        pass
+
+
+def concat_buffer(buf):
+    for chunk in FLVTagConcat().iter_buffer_chunks(bytearray(buf)):
+        pass
+
+
+SCENARIOS = OrderedDict([
+    ("parse-eager", lambda buf: parse(buf, False)),
+    ("parse-lazy", lambda buf: parse(buf, True)),
+    ("reserialize-eager", lambda buf: reserialize(buf, False)),
+    ("reserialize-lazy", lambda buf: reserialize(buf, True)),
+    ("concat", concat),
+    ("concat-buffer", concat_buffer),
+])
+
+
+def run_scenario(name, buf, tags, repeat):
+    seconds = []
+    for i in range(repeat):
+        start = time.time()
+        SCENARIOS[name](buf)
+        seconds.append(time.time() - start)
+
+    elapsed = median(seconds)
+    return OrderedDict([
+        ("scenario", name),
+        ("tags", tags),
+        ("seconds", elapsed),
+        ("tags_per_second", tags / elapsed if elapsed else 0.0),
+        ("throughput", len(buf) / MB / elapsed if elapsed else 0.0),
+    ])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("scenarios", nargs="*", metavar="SCENARIO",
+                        help="Scenarios to run, one of: {0}. Default is all of them."
+                             .format(", ".join(SCENARIOS)))
+    parser.add_argument("--duration", type=float, default=600.0,
+                        help="Duration of the FLV file in seconds (default: %(default)s)")
+    parser.add_argument("--video-size", type=int, default=4000,
+                        help="Size of a video frame in bytes (default: %(default)s)")
+    parser.add_argument("--audio-size", type=int, default=200,
+                        help="Size of an audio frame in bytes (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs per scenario, the median is reported (default: %(default)s)")
+    parser.add_argument("--json", action="store_true",
+                        help="Output the results as JSON")
+
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+
+    scenarios = args.scenarios or list(SCENARIOS)
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error("Unknown scenario: {0}".format(name))
+
+    buf = create_fixture(args.duration, args.video_size, args.audio_size)
+    tags = parse(buf, True)
+    if not args.json:
+        sys.stderr.write("FLV file of {0:.1f}MB with {1} tags\n".format(len(buf) / MB, tags))
+        print("{0:<20}{1:>12}{2:>10}".format("scenario", "tags/s", "MB/s"))
+
+    results = []
+    for name in scenarios:
+        result = run_scenario(name, buf, tags, args.repeat)
+        results.append(result)
+        if not args.json:
+            print("{0:<20}{1:>12.0f}{2:>10.1f}".format(name, result["tags_per_second"], result["throughput"]))
+            sys.stdout.flush()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""Stand-in for Kodi's xbmc module, so that streamlink can be imported outside of Kodi."""
+
+from xbmcvfs import translatePath  # noqa: F401
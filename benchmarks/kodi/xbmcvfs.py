@@ -0,0 +1,24 @@
+"""Stand-in for Kodi's xbmcvfs module, so that streamlink can be imported outside of Kodi.
+
+The special:// paths are translated to a directory below the system's
+temporary directory.
+"""
+
+import os
+import tempfile
+
+SPECIAL_ROOT = os.path.join(tempfile.gettempdir(), "streamlink-benchmarks")
+
+
+def translatePath(path):
+    return os.path.join(SPECIAL_ROOT, path.replace("special://", "", 1))
+
+
+def exists(path):
+    return os.path.exists(path)
+
+
+def mkdirs(path):
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    return True
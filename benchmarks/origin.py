@@ -0,0 +1,486 @@
+"""A local HTTP origin which serves synthetic HLS, DASH and HDS streams.
+
+All content is generated, a live stream starts when the origin is started
+and advances in real time. Latency, bandwidth and jitter are simulated per
+request to mimic a remote server.
+
+Paths:
+
+- /hls/{live,vod}/{plain,aes,byterange,fmp4}/index.m3u8 and master.m3u8
+- /dash/{live,vod}/{template,timeline}/manifest.mpd and /dash/vod/list/manifest.mpd
+- /hds/{live,vod}/manifest.f4m
+"""
+
+import base64
+import logging
+import random
+import re
+import socket
+import struct
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock, Thread
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+from Crypto.Cipher import AES
+
+from streamlink.packages.flashmedia.box import (Box, BoxPayloadABST, BoxPayloadAFRT, BoxPayloadASRT,
+                                                 FragmentRunEntry, SegmentRunEntry)
+from streamlink.packages.flashmedia.tag import (AACAudioData, AudioData, AVCVideoData, Tag, VideoData,
+                                                 TAG_TYPE_AUDIO, TAG_TYPE_VIDEO)
+
+log = logging.getLogger(__name__)
+
+KEY = b"0123456789abcdef"
+TS_PACKET_SIZE = 188
+WRITE_SIZE = 16 * 1024
+
+_range_re = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+class OriginConfig(object):
+    """The parameters of the simulated origin.
+
+    :param segment_size: size of a segment in bytes
+    :param segment_duration: duration of a segment in seconds
+    :param segments: number of segments of a VOD stream
+    :param window: number of segments listed in a live playlist
+    :param latency: delay before a response is sent in seconds
+    :param jitter: maximum random variation of the latency in seconds
+    :param bandwidth: transfer rate of a response in bytes per second, 0 is unlimited
+    """
+
+    def __init__(self, segment_size=1024 * 1024, segment_duration=2.0, segments=60, window=6,
+                 latency=0.0, jitter=0.0, bandwidth=0):
+        self.segment_size = segment_size
+        self.segment_duration = segment_duration
+        self.segments = segments
+        self.window = window
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+
+
+def mp4_box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def pkcs7_pad(data):
+    pad = 16 - len(data) % 16
+    return data + bytes(bytearray([pad] * pad))
+
+
+def num_to_iv(n):
+    return struct.pack(">8xq", n)
+
+
+def isoformat(timestamp):
+    return datetime.utcfromtimestamp(timestamp).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class Content(object):
+    """Generates the playlists, manifests and segments."""
+
+    def __init__(self, config):
+        self.config = config
+        self.started = time.time()
+        self.cache = OrderedDict()
+        self.lock = Lock()
+
+        packets = self.config.segment_size // TS_PACKET_SIZE or 1
+        self.ts_segment = b"".join(struct.pack(">BHB", 0x47, 0x100, 0x10 | (i & 0x0f)) +
+                                   b"\xff" * (TS_PACKET_SIZE - 4)
+                                   for i in range(packets))
+        self.mp4_init = mp4_box(b"ftyp", b"iso6\x00\x00\x00\x00iso6dash") + mp4_box(b"moov", b"\x00" * 512)
+        self.mp4_segment = (mp4_box(b"moof", b"\x00" * 128) +
+                            mp4_box(b"mdat", b"\x00" * max(self.config.segment_size - 144, 0)))
+
+    def cached(self, key, func, *args):
+        with self.lock:
+            if key in self.cache:
+                return self.cache[key]
+
+        data = func(*args)
+        with self.lock:
+            self.cache[key] = data
+            while len(self.cache) > 32:
+                self.cache.popitem(last=False)
+
+        return data
+
+    def live_sequence(self):
+        """Returns the number of the newest complete segment of the live
+        streams, which start with a full window."""
+        elapsed = time.time() - self.started
+        return int(elapsed / self.config.segment_duration) + self.config.window - 1
+
+    def sequences(self, live):
+        if live:
+            last = self.live_sequence()
+            return range(max(last - self.config.window + 1, 0), last + 1)
+
+        return range(self.config.segments)
+
+    def available(self, live, num):
+        if live:
+            return 0 <= num <= self.live_sequence()
+
+        return 0 <= num < self.config.segments
+
+    # HLS
+
+    def hls_playlist(self, live, variant):
+        duration = self.config.segment_duration
+        sequences = self.sequences(live)
+        lines = ["#EXTM3U",
+                 "#EXT-X-VERSION:{0}".format(6 if variant == "fmp4" else 4),
+                 "#EXT-X-TARGETDURATION:{0}".format(int(duration + 0.999)),
+                 "#EXT-X-MEDIA-SEQUENCE:{0}".format(sequences[0])]
+
+        if variant == "aes":
+            lines.append("#EXT-X-KEY:METHOD=AES-128,URI=\"key.bin\"")
+        elif variant == "fmp4":
+            lines.append("#EXT-X-MAP:URI=\"init.mp4\"")
+
+        for num in sequences:
+            lines.append("#EXTINF:{0:.3f},".format(duration))
+            if variant == "byterange":
+                size = len(self.ts_segment)
+                lines.append("#EXT-X-BYTERANGE:{0}@{1}".format(size, num * size))
+                lines.append("media.ts")
+            elif variant == "fmp4":
+                lines.append("{0}.m4s".format(num))
+            else:
+                lines.append("{0}.ts".format(num))
+
+        if not live:
+            lines.append("#EXT-X-ENDLIST")
+
+        return "\n".join(lines) + "\n"
+
+    def hls_master_playlist(self):
+        bandwidth = int(self.config.segment_size * 8 / self.config.segment_duration)
+        return ("#EXTM3U\n"
+                "#EXT-X-STREAM-INF:BANDWIDTH={0},RESOLUTION=1280x720\n"
+                "index.m3u8\n".format(bandwidth))
+
+    def hls_encrypted_segment(self, num):
+        return AES.new(KEY, AES.MODE_CBC, num_to_iv(num)).encrypt(pkcs7_pad(self.ts_segment))
+
+    # DASH
+
+    def dash_manifest(self, live, variant):
+        duration = self.config.segment_duration
+        timescale = 1000
+        attrs = ["xmlns=\"urn:mpeg:dash:schema:mpd:2011\"",
+                 "profiles=\"urn:mpeg:dash:profile:isoff-live:2011\"",
+                 "minBufferTime=\"PT{0:.1f}S\"".format(duration)]
+
+        if live:
+            attrs += ["type=\"dynamic\"",
+                      # The window is complete when the origin starts
+                      "availabilityStartTime=\"{0}\"".format(
+                          isoformat(self.started - self.config.window * duration)),
+                      "publishTime=\"{0}\"".format(isoformat(time.time())),
+                      "minimumUpdatePeriod=\"PT{0:.1f}S\"".format(duration),
+                      "suggestedPresentationDelay=\"PT{0:.1f}S\"".format(duration * 2),
+                      "timeShiftBufferDepth=\"PT{0:.1f}S\"".format(duration * self.config.window)]
+        else:
+            attrs += ["type=\"static\"",
+                      "mediaPresentationDuration=\"PT{0:.1f}S\"".format(duration * self.config.segments)]
+
+        if variant == "template":
+            segments = ("<SegmentTemplate timescale=\"{0}\" duration=\"{1}\" startNumber=\"1\" "
+                        "initialization=\"init.mp4\" media=\"$Number$.m4s\"/>"
+                        .format(timescale, int(duration * timescale)))
+        elif variant == "timeline":
+            sequences = self.sequences(live)
+            segments = ("<SegmentTemplate timescale=\"{0}\" startNumber=\"{1}\" "
+                        "initialization=\"init.mp4\" media=\"t$Time$.m4s\">"
+                        "<SegmentTimeline><S t=\"{2}\" d=\"{3}\" r=\"{4}\"/></SegmentTimeline>"
+                        "</SegmentTemplate>"
+                        .format(timescale, sequences[0], int(sequences[0] * duration * timescale),
+                                int(duration * timescale), len(sequences) - 1))
+        else:
+            segments = ("<SegmentList timescale=\"{0}\" duration=\"{1}\">"
+                        "<Initialization sourceURL=\"init.mp4\"/>{2}</SegmentList>"
+                        .format(timescale, int(duration * timescale),
+                                "".join("<SegmentURL media=\"{0}.m4s\"/>".format(num + 1)
+                                        for num in self.sequences(live))))
+
+        return ("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+                "<MPD {0}><Period id=\"0\" start=\"PT0S\">"
+                "<AdaptationSet mimeType=\"video/mp4\" segmentAlignment=\"true\">"
+                "<Representation id=\"video\" bandwidth=\"{1}\" codecs=\"avc1.64001f\" width=\"1280\" height=\"720\">"
+                "{2}</Representation></AdaptationSet></Period></MPD>\n"
+                .format(" ".join(attrs), int(self.config.segment_size * 8 / duration), segments))
+
+    def dash_segment_num(self, name):
+        if name.startswith("t"):
+            return int(name[1:]) // int(self.config.segment_duration * 1000)
+
+        # The template numbers start at 1
+        return int(name) - 1
+
+    # HDS
+
+    def hds_bootstrap(self, live):
+        duration = int(self.config.segment_duration * 1000)
+        sequences = self.sequences(live)
+
+        if live:
+            fragment_runs = [FragmentRunEntry(1, 0, duration, None)]
+            current_time = (sequences[-1] + 1) * duration
+        else:
+            fragment_runs = [FragmentRunEntry(num + 1, num * duration, duration, None) for num in sequences]
+            fragment_runs.append(FragmentRunEntry(len(sequences) + 1, 0, 0, 0))
+            current_time = len(sequences) * duration
+
+        asrt = Box("asrt", BoxPayloadASRT(0, 0, [], [SegmentRunEntry(1, 0xffffffff if live else len(sequences))]))
+        afrt = Box("afrt", BoxPayloadAFRT(0, 0, 1000, [], fragment_runs))
+        abst = BoxPayloadABST(0, 1, 0, int(live), 0, 1000, current_time, 0, "", [], [], "", "", [asrt], [afrt])
+
+        return Box("abst", abst).serialize()
+
+    def hds_manifest(self, live):
+        bootstrap = self.hds_bootstrap(live)
+        if live:
+            bootstrap_info = "<bootstrapInfo profile=\"named\" id=\"bootstrap\" url=\"bootstrap\"/>"
+        else:
+            bootstrap_info = ("<bootstrapInfo profile=\"named\" id=\"bootstrap\">{0}</bootstrapInfo>"
+                              .format(base64.b64encode(bootstrap).decode("ascii")))
+
+        return ("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+                "<manifest xmlns=\"http://ns.adobe.com/f4m/1.0\">"
+                "<id>benchmark</id><streamType>{0}</streamType>{1}"
+                "<media streamId=\"benchmark\" url=\"stream\" bootstrapInfoId=\"bootstrap\" "
+                "bitrate=\"{2}\" height=\"720\"/></manifest>\n"
+                .format("live" if live else "recorded", bootstrap_info,
+                        int(self.config.segment_size * 8 / self.config.segment_duration / 1000)))
+
+    def hds_fragment(self, num):
+        """Returns a fragment with a mdat box of FLV tags, 25 video and
+        43 audio frames per second."""
+        duration = int(self.config.segment_duration * 1000)
+        start = num * duration
+        frames = max(int(self.config.segment_duration * 25), 1)
+        audio_size = 200
+        video_size = max(self.config.segment_size // frames - audio_size * 2, 16)
+        tags = bytearray()
+
+        # Every fragment starts with the sequence headers
+        tags += Tag(TAG_TYPE_AUDIO, start, AudioData(10, 3, 1, 1, AACAudioData(0, b"\x12\x10"))).serialize()
+        tags += Tag(TAG_TYPE_VIDEO, start, VideoData(1, 7, AVCVideoData(0, 0, b"\x01\x64\x00\x1f"))).serialize()
+
+        audio = 0
+        for frame in range(frames):
+            timestamp = start + frame * 40
+            while (audio * 1024000) // 44100 <= frame * 40:
+                tags += Tag(TAG_TYPE_AUDIO, start + (audio * 1024000) // 44100,
+                            AudioData(10, 3, 1, 1, AACAudioData(1, b"\x21" * audio_size))).serialize()
+                audio += 1
+
+            keyframe = 1 if frame == 0 else 2
+            tags += Tag(TAG_TYPE_VIDEO, timestamp,
+                        VideoData(keyframe, 7, AVCVideoData(1, 0, b"\x65" * video_size))).serialize()
+
+        return mp4_box(b"mdat", bytes(tags))
+
+
+class OriginRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "StreamlinkBenchmark"
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        parts = path.strip("/").split("/")
+        try:
+            response = self.route(parts)
+        except (ValueError, IndexError):
+            response = None
+
+        if response is None:
+            self.simulate_latency()
+            self.send_error(404)
+            return
+
+        data, content_type = response
+        self.send_data(data, content_type)
+
+    def route(self, parts):
+        content = self.server.content
+        protocol, mode = parts[0], parts[1]
+        live = mode == "live"
+        if mode not in ("live", "vod"):
+            return
+
+        if protocol == "hls":
+            variant, name = parts[2], parts[3]
+            if name == "index.m3u8":
+                return content.hls_playlist(live, variant).encode("utf8"), "application/vnd.apple.mpegurl"
+            elif name == "master.m3u8":
+                return content.hls_master_playlist().encode("utf8"), "application/vnd.apple.mpegurl"
+            elif name == "key.bin":
+                return KEY, "application/octet-stream"
+            elif name == "init.mp4":
+                return content.mp4_init, "video/mp4"
+            elif name == "media.ts":
+                return content.ts_segment, "video/mp2t"
+
+            num = int(name.split(".", 1)[0])
+            if not content.available(live, num):
+                return
+            if variant == "aes":
+                return content.cached(("aes", num), content.hls_encrypted_segment, num), "video/mp2t"
+            elif variant == "fmp4":
+                return content.mp4_segment, "video/mp4"
+            return content.ts_segment, "video/mp2t"
+
+        elif protocol == "dash":
+            variant, name = parts[2], parts[3]
+            if name == "manifest.mpd":
+                return content.dash_manifest(live, variant).encode("utf8"), "application/dash+xml"
+            elif name == "init.mp4":
+                return content.mp4_init, "video/mp4"
+
+            num = content.dash_segment_num(name.split(".", 1)[0])
+            if not content.available(live, num):
+                return
+            return content.mp4_segment, "video/mp4"
+
+        elif protocol == "hds":
+            name = parts[2]
+            if name == "manifest.f4m":
+                return content.hds_manifest(live).encode("utf8"), "application/f4m+xml"
+            elif name == "bootstrap":
+                return content.hds_bootstrap(live), "application/octet-stream"
+
+            match = re.match(r"streamSeg\d+-Frag(\d+)$", name)
+            num = int(match.group(1)) - 1
+            if not content.available(live, num):
+                return
+            return content.cached(("hds", num), content.hds_fragment, num), "video/f4f"
+
+    def parse_range(self, size):
+        match = _range_re.match(self.headers.get("Range") or "")
+        if not match:
+            return
+
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else None
+        return start, end
+
+    def send_data(self, data, content_type):
+        status = 200
+        byterange = self.parse_range(len(data))
+        headers = []
+
+        if byterange:
+            # The byterange file of the HLS streams repeats the same segment
+            start, end = byterange
+            if end is None:
+                end = start + len(data) - 1
+            offset = start % len(data)
+            length = end - start + 1
+            data = (data[offset:] + data)[:length]
+            status = 206
+            headers.append(("Content-Range", "bytes {0}-{1}/*".format(start, end)))
+
+        self.simulate_latency()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-cache")
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.write_throttled(data)
+
+    def simulate_latency(self):
+        config = self.server.config
+        delay = config.latency
+        if config.jitter:
+            delay += random.uniform(-config.jitter, config.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def write_throttled(self, data):
+        bandwidth = self.server.config.bandwidth
+        start = time.time()
+        written = 0
+
+        try:
+            while written < len(data):
+                chunk = data[written:written + WRITE_SIZE]
+                self.wfile.write(chunk)
+                written += len(chunk)
+
+                if bandwidth:
+                    ahead = written / float(bandwidth) - (time.time() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (IOError, OSError):
+            # The client went away
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        log.debug("{0} - {1}".format(self.address_string(), format % args))
+
+
+class OriginServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 64
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        HTTPServer.__init__(self, (host, port), OriginRequestHandler)
+        self.config = config or OriginConfig()
+        self.content = Content(self.config)
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://{0}:{1}/".format(host, port)
+
+    def handle_error(self, request, client_address):
+        # Clients closing their connections are expected
+        if not isinstance(sys.exc_info()[1], socket.error):
+            HTTPServer.handle_error(self, request, client_address)
+
+    def start(self):
+        self.thread = Thread(target=self.serve_forever,
+                             name="Thread-{0}".format(self.__class__.__name__))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        if self.thread:
+            self.shutdown()
+            self.thread = None
+
+        self.server_close()
+
+
+def serve(config, conn):
+    """Runs an origin until the connection is closed, meant to be the
+    target of a separate process so the origin does not use the CPU time
+    of the benchmark."""
+    server = OriginServer(config)
+    server.start()
+    conn.send(server.url)
+
+    try:
+        conn.recv()
+    except EOFError:
+        pass
+
+    server.close()
@@ -0,0 +1,293 @@
+"""Benchmarks the segmented streams against a local origin.
+
+Each scenario opens a stream of the origin simulator with a new Streamlink
+session in a separate process and reads it until it ends, or for at most
+--duration seconds in the case of live streams. The origin runs in its own
+process, so the CPU time and memory reported are those of the client only.
+
+Run from the repository root:
+
+    PYTHONPATH=resources/lib python -m benchmarks.run [scenario ...]
+
+Outside of Kodi, the stand-ins of benchmarks/kodi are imported in place of
+the xbmc and xbmcvfs modules.
+"""
+
+from __future__ import division
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from streamlink import Streamlink
+from streamlink.stream import DASHStream, HDSStream, HLSStream
+
+from .origin import OriginConfig, serve
+
+READ_SIZE = 64 * 1024
+MB = 1024 * 1024
+
+SCENARIOS = OrderedDict([
+    ("hls-vod", "hls/vod/plain/index.m3u8"),
+    ("hls-vod-aes", "hls/vod/aes/index.m3u8"),
+    ("hls-vod-byterange", "hls/vod/byterange/index.m3u8"),
+    ("hls-vod-fmp4", "hls/vod/fmp4/index.m3u8"),
+    ("hls-live", "hls/live/plain/index.m3u8"),
+    ("hls-live-aes", "hls/live/aes/index.m3u8"),
+    ("hls-live-master", "hls/live/plain/master.m3u8"),
+    ("dash-vod-template", "dash/vod/template/manifest.mpd"),
+    ("dash-vod-timeline", "dash/vod/timeline/manifest.mpd"),
+    ("dash-vod-list", "dash/vod/list/manifest.mpd"),
+    ("dash-live-template", "dash/live/template/manifest.mpd"),
+    ("dash-live-timeline", "dash/live/timeline/manifest.mpd"),
+    ("hds-vod", "hds/vod/manifest.f4m"),
+    ("hds-live", "hds/live/manifest.f4m"),
+])
+
+# key, title, width, precision
+COLUMNS = [
+    ("mb", "MB", 8, 1),
+    ("throughput", "MB/s", 8, 1),
+    ("startup", "startup s", 10, 3),
+    ("cpu_per_mb", "CPU s/MB", 9, 4),
+    ("peak_rss", "RSS MB", 8, 1),
+]
+
+
+def cpu_time():
+    times = os.times()
+    return times[0] + times[1]
+
+
+def peak_rss():
+    if resource is None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss / MB if sys.platform == "darwin" else rss / 1024
+
+
+def open_stream(session, url):
+    if url.endswith("master.m3u8"):
+        streams = HLSStream.parse_variant_playlist(session, url)
+    elif url.endswith(".m3u8"):
+        return HLSStream(session, url)
+    elif url.endswith(".mpd"):
+        streams = DASHStream.parse_manifest(session, url)
+    else:
+        streams = HDSStream.parse_manifest(session, url)
+
+    return list(streams.values())[0]
+
+
+def run_scenario(name, url, args, conn):
+    """Reads a stream and sends its results through conn."""
+    logging.basicConfig(level=args.loglevel.upper(), stream=sys.stderr)
+    session = Streamlink()
+    for protocol in ("hls", "dash", "hds"):
+        session.set_option("{0}-segment-threads".format(protocol), args.threads)
+    for key, value in args.option:
+        session.set_option(key, value)
+
+    cpu_start = cpu_time()
+    start = time.time()
+    first_byte = None
+    size = 0
+
+    stream = open_stream(session, url)
+    fd = stream.open()
+    try:
+        while True:
+            data = fd.read(READ_SIZE)
+            now = time.time()
+            if not data:
+                break
+
+            if first_byte is None:
+                first_byte = now
+            size += len(data)
+
+            if now - start >= args.duration:
+                break
+    finally:
+        fd.close()
+
+    end = time.time()
+    cpu = cpu_time() - cpu_start
+    transfer = end - (first_byte or end)
+
+    conn.send(OrderedDict([
+        ("scenario", name),
+        ("mb", size / MB),
+        ("seconds", end - start),
+        ("throughput", size / MB / transfer if transfer else 0.0),
+        ("startup", (first_byte or end) - start),
+        ("cpu_seconds", cpu),
+        ("cpu_per_mb", cpu / (size / MB) if size else 0.0),
+        ("peak_rss", peak_rss()),
+    ]))
+    conn.close()
+
+
+def run_process(target, *args):
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=target, args=args + (child_conn,))
+    process.daemon = True
+    process.start()
+
+    return process, parent_conn
+
+
+def option(value):
+    """Parses a NAME=VALUE session option, the value is parsed as JSON
+    if possible."""
+    name, sep, value = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError("Expected NAME=VALUE")
+
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+
+    return name, value
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+
+    return (values[middle - 1] + values[middle]) / 2
+
+
+def summarize(results):
+    """Returns the median of every value of several runs of a scenario."""
+    summary = OrderedDict()
+    for key, value in results[0].items():
+        if isinstance(value, (int, float)):
+            summary[key] = median([result[key] for result in results])
+        else:
+            summary[key] = value
+
+    return summary
+
+
+def format_header():
+    return "{0:<20}".format("scenario") + "".join("{0:>{1}}".format(title, width)
+                                                   for key, title, width, precision in COLUMNS)
+
+
+def format_row(result):
+    cells = ["{0:<20}".format(result["scenario"])]
+    for key, title, width, precision in COLUMNS:
+        value = result[key]
+        if value is None:
+            cells.append("{0:>{1}}".format("-", width))
+        else:
+            cells.append("{0:>{1}.{2}f}".format(value, width, precision))
+
+    return "".join(cells)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("scenarios", nargs="*", metavar="SCENARIO",
+                        help="Scenarios to run, one of: {0}. Default is all of them."
+                             .format(", ".join(SCENARIOS)))
+    parser.add_argument("--segment-size", type=int, default=1024 * 1024,
+                        help="Size of a segment in bytes (default: %(default)s)")
+    parser.add_argument("--segment-duration", type=float, default=2.0,
+                        help="Duration of a segment in seconds (default: %(default)s)")
+    parser.add_argument("--segments", type=int, default=60,
+                        help="Number of segments of the VOD streams (default: %(default)s)")
+    parser.add_argument("--window", type=int, default=6,
+                        help="Number of segments in a live playlist (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Latency of the origin in milliseconds (default: %(default)s)")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Maximum variation of the latency in milliseconds (default: %(default)s)")
+    parser.add_argument("--bandwidth", type=float, default=0.0,
+                        help="Bandwidth of a response in Mbit/s, 0 is unlimited (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="Segment download threads (default: %(default)s)")
+    parser.add_argument("--option", type=option, action="append", default=[], metavar="NAME=VALUE",
+                        help="Set a session option, e.g. hls-live-edge=2, can be repeated")
+    parser.add_argument("--duration", type=float, default=30.0,
+                        help="Maximum time a stream is read in seconds (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Runs per scenario, the median is reported (default: %(default)s)")
+    parser.add_argument("--json", action="store_true",
+                        help="Output the results as JSON")
+    parser.add_argument("--loglevel", default="warning",
+                        help="Log level of the streams (default: %(default)s)")
+
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+
+    scenarios = args.scenarios or list(SCENARIOS)
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error("Unknown scenario: {0}".format(name))
+
+    config = OriginConfig(segment_size=args.segment_size,
+                          segment_duration=args.segment_duration,
+                          segments=args.segments,
+                          window=args.window,
+                          latency=args.latency / 1000,
+                          jitter=args.jitter / 1000,
+                          bandwidth=int(args.bandwidth * 1000 * 1000 / 8))
+    origin, origin_conn = run_process(serve, config)
+    base_url = origin_conn.recv()
+    summaries = []
+
+    try:
+        if not args.json:
+            print(format_header())
+
+        for name in scenarios:
+            results = []
+            for i in range(args.repeat):
+                process, conn = run_process(run_scenario, name, base_url + SCENARIOS[name], args)
+                try:
+                    results.append(conn.recv())
+                except EOFError:
+                    break
+                finally:
+                    process.join()
+
+            if not results:
+                sys.stderr.write("Scenario {0} failed\n".format(name))
+                continue
+
+            summary = summarize(results)
+            summaries.append(summary)
+            if not args.json:
+                print(format_row(summary))
+                sys.stdout.flush()
+    finally:
+        origin_conn.send(None)
+        origin.join()
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+
+
+if __name__ == "__main__":
+    main()
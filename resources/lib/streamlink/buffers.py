@@ -1,6 +1,10 @@
+import mmap
+import tempfile
 from collections import deque
 from io import BytesIO
 from threading import Event, Lock
+from time import time
+from weakref import WeakKeyDictionary
 
 
 class Chunk(BytesIO):
@@ -77,6 +81,8 @@ class RingBuffer(Buffer):
 
         self.buffer_size = size
         self.buffer_lock = Lock()
+        self.bytes_written = 0
+        self.pool = None
 
         self.event_free = Event()
         self.event_free.set()
@@ -130,9 +136,13 @@ class RingBuffer(Buffer):
 
                 Buffer.write(self, data[written:written + write_len])
                 data_left -= write_len
+                self.bytes_written += write_len
 
                 self._check_events()
 
+        if self.pool:
+            self.pool.update()
+
     def resize(self, size):
         with self.buffer_lock:
             self.buffer_size = size
@@ -152,6 +162,9 @@ class RingBuffer(Buffer):
         self.event_free.set()
         self.event_used.set()
 
+        if self.pool:
+            self.pool.unregister(self)
+
     @property
     def free(self):
         return max(self.buffer_size - self.length, 0)
@@ -161,4 +174,272 @@ class RingBuffer(Buffer):
         return self.free == 0
 
 
-__all__ = ["Buffer", "RingBuffer"]
+class SpillBuffer(RingBuffer):
+    """RingBuffer which spills to a memory-mapped temporary file.
+
+    Data is kept in memory up to the buffer size, anything written past
+    that goes to a temporary file of up to spill_size bytes, so a lagging
+    reader doesn't stall the writer. The buffer is also full when the oldest
+    spilled data has not been read for spill_time seconds.
+    """
+
+    def __init__(self, size=8192 * 4, spill_size=0, spill_time=None, spill_dir=None):
+        RingBuffer.__init__(self, size)
+
+        self.spill_size = spill_size
+        self.spill_time = spill_time
+        self.spill_dir = spill_dir
+        self.spill_fd = None
+        self.spill_map = None
+        self.spill_start = 0
+        self.spill_end = 0
+        self.spill_times = deque()
+
+    @property
+    def spilled(self):
+        return self.spill_end - self.spill_start
+
+    def _open_spill(self):
+        self.spill_fd = tempfile.TemporaryFile(prefix="streamlink-", dir=self.spill_dir)
+        self.spill_fd.truncate(self.spill_size)
+        self.spill_map = mmap.mmap(self.spill_fd.fileno(), self.spill_size)
+
+    def _close_spill(self):
+        if self.spill_map:
+            self.spill_map.close()
+            self.spill_fd.close()
+            self.spill_map = self.spill_fd = None
+
+    def _spill(self, data):
+        if not self.spill_map:
+            self._open_spill()
+
+        pos = self.spill_end % self.spill_size
+        head = min(len(data), self.spill_size - pos)
+        self.spill_map[pos:pos + head] = data[:head]
+        self.spill_map[:len(data) - head] = data[head:]
+
+        self.spill_end += len(data)
+        self.length += len(data)
+
+        if self.spill_time:
+            self.spill_times.append((self.spill_end, time()))
+
+    def _unspill(self, size):
+        if size < 0 or size > self.spilled:
+            size = self.spilled
+
+        # Only read up to the end of the file, the rest is read next time
+        pos = self.spill_start % self.spill_size
+        size = min(size, self.spill_size - pos)
+        data = self.spill_map[pos:pos + size]
+
+        self.spill_start += size
+        self.length -= size
+
+        while self.spill_times and self.spill_times[0][0] <= self.spill_start:
+            self.spill_times.popleft()
+
+        return data
+
+    def _read(self, size=-1):
+        with self.buffer_lock:
+            if self.length > self.spilled:
+                data = Buffer.read(self, size)
+            elif self.spilled:
+                data = self._unspill(size)
+            else:
+                data = b""
+
+            self._check_events()
+
+        return data
+
+    def write(self, data):
+        if self.closed:
+            return
+
+        data_left = len(data)
+        data_total = len(data)
+
+        while data_left > 0:
+            self.event_free.wait()
+
+            if self.closed:
+                return
+
+            with self.buffer_lock:
+                # Closed while waiting for the lock, don't open the spill again
+                if self.closed:
+                    return
+
+                written = data_total - data_left
+
+                # Data can only go to memory while nothing has been spilled,
+                # to keep it in order
+                if not self.spilled and self.memory_free:
+                    write_len = min(self.memory_free, data_left)
+                    Buffer.write(self, data[written:written + write_len])
+                else:
+                    write_len = min(self.spill_size - self.spilled, data_left)
+                    self._spill(data[written:written + write_len])
+
+                data_left -= write_len
+                self.bytes_written += write_len
+
+                self._check_events()
+
+        if self.pool:
+            self.pool.update()
+
+    def close(self):
+        RingBuffer.close(self)
+
+        # The spilled data is dropped, reading after closing only returns
+        # what is left in memory
+        with self.buffer_lock:
+            self.length -= self.spilled
+            self.spill_start = self.spill_end
+            self.spill_times.clear()
+            self._close_spill()
+
+    @property
+    def memory_free(self):
+        return max(self.buffer_size - (self.length - self.spilled), 0)
+
+    @property
+    def free(self):
+        spill_free = self.spill_size - self.spilled
+        if self.spilled:
+            return spill_free
+
+        return self.memory_free + spill_free
+
+    @property
+    def is_full(self):
+        if self.spill_times and time() - self.spill_times[0][1] > self.spill_time:
+            return True
+
+        return self.free == 0
+
+
+class BufferPoolEntry(object):
+    __slots__ = ("name", "bytes_written", "rate")
+
+    def __init__(self, name, bytes_written):
+        self.name = name
+        self.bytes_written = bytes_written
+        self.rate = 0.0
+
+
+class BufferPool(object):
+    """Shares a total size budget between ring buffers.
+
+    Registered buffers are resized to a share of the budget which is
+    weighted by the rate data is written to them and by how full they are,
+    which grows the buffers of high bitrate streams and lagging readers.
+    Every buffer gets at least min_size bytes, or an equal share if the
+    budget is too small for that.
+
+    Without a budget the buffer sizes are left alone, but the buffers can
+    still be inspected with :meth:`occupancy`.
+    """
+
+    interval = 1.0
+
+    def __init__(self, budget=0, min_size=1024 * 1024):
+        self.budget = budget
+        self.min_size = min_size
+        self.buffers = WeakKeyDictionary()
+        self.lock = Lock()
+        self.last_update = time()
+
+    def register(self, buffer, name=None):
+        """Adds a buffer to the pool and returns it."""
+        with self.lock:
+            self.buffers[buffer] = BufferPoolEntry(name, buffer.bytes_written)
+            buffer.pool = self
+
+        self.rebalance()
+
+        return buffer
+
+    def unregister(self, buffer):
+        with self.lock:
+            self.buffers.pop(buffer, None)
+            buffer.pool = None
+
+        self.rebalance()
+
+    def set_budget(self, budget):
+        self.budget = budget
+        self.rebalance()
+
+    def update(self):
+        """Rebalances the pool if the last update is older than the
+        interval."""
+        if time() - self.last_update >= self.interval:
+            self.rebalance()
+
+    def _update_rates(self):
+        now = time()
+        elapsed = now - self.last_update
+
+        # Rates measured over short periods are too noisy
+        if elapsed < self.interval:
+            return
+
+        self.last_update = now
+        for buffer, entry in list(self.buffers.items()):
+            rate = (buffer.bytes_written - entry.bytes_written) / elapsed
+            entry.rate = rate if not entry.rate else (entry.rate + rate) / 2
+            entry.bytes_written = buffer.bytes_written
+
+    def rebalance(self):
+        with self.lock:
+            self._update_rates()
+
+            if not self.budget or not self.buffers:
+                return
+
+            weights = {}
+            for buffer, entry in list(self.buffers.items()):
+                fill = float(buffer.length) / buffer.buffer_size if buffer.buffer_size else 1.0
+                weights[buffer] = max(entry.rate, 1.0) * (1.0 + min(fill, 1.0))
+
+            min_size = min(self.min_size, self.budget // len(weights))
+            sizes = {}
+            budget = self.budget
+
+            # Buffers whose share would be below the minimum get the minimum,
+            # the rest is shared by weight
+            while weights:
+                total = sum(weights.values())
+                small = [buffer for buffer, weight in weights.items()
+                         if budget * weight / total < min_size]
+
+                if not small:
+                    for buffer, weight in weights.items():
+                        sizes[buffer] = int(budget * weight / total)
+                    break
+
+                for buffer in small:
+                    sizes[buffer] = min_size
+                    budget -= min_size
+                    del weights[buffer]
+
+        for buffer, size in sizes.items():
+            buffer.resize(size)
+
+    def occupancy(self):
+        """Returns the name, size, length and write rate (in bytes per
+        second) of every buffer in the pool."""
+        with self.lock:
+            return [dict(name=entry.name,
+                         size=buffer.buffer_size,
+                         length=buffer.length,
+                         rate=entry.rate)
+                    for buffer, entry in list(self.buffers.items())]
+
+
+__all__ = ["Buffer", "RingBuffer", "SpillBuffer", "BufferPool"]
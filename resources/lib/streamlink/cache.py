@@ -1,7 +1,10 @@
+import copy
 import json
 import os
 import shutil
 import tempfile
+from concurrent.futures import Future
+from threading import Lock, RLock
 from time import time, mktime
 
 from .compat import is_win32
@@ -43,6 +46,9 @@ if not xbmcvfs.exists(temp_streamlink):
 class Cache(object):
     """Caches Python values as JSON and prunes expired entries."""
 
+    # The instances share their files, e.g. when plugins run concurrently
+    _lock = RLock()
+
     def __init__(self, filename, key_prefix=""):
         self.key_prefix = key_prefix
         self.filename = os.path.join(cache_dir, filename)
@@ -89,51 +95,165 @@ class Cache(object):
             os.remove(tempname)
 
     def set(self, key, value, expires=60 * 60 * 24 * 7, expires_at=None):
-        self._load()
-        self._prune()
+        with self._lock:
+            self._load()
+            self._prune()
 
-        if self.key_prefix:
-            key = "{0}:{1}".format(self.key_prefix, key)
+            if self.key_prefix:
+                key = "{0}:{1}".format(self.key_prefix, key)
 
-        expires += time()
+            expires += time()
 
-        if expires_at:
-            expires = mktime(expires_at.timetuple())
+            if expires_at:
+                expires = mktime(expires_at.timetuple())
 
-        self._cache[key] = dict(value=value, expires=expires)
-        self._save()
+            self._cache[key] = dict(value=value, expires=expires)
+            self._save()
 
     def get(self, key, default=None):
-        self._load()
+        with self._lock:
+            self._load()
 
-        if self._prune():
-            self._save()
+            if self._prune():
+                self._save()
 
-        if self.key_prefix:
-            key = "{0}:{1}".format(self.key_prefix, key)
+            if self.key_prefix:
+                key = "{0}:{1}".format(self.key_prefix, key)
 
-        if key in self._cache and "value" in self._cache[key]:
-            return self._cache[key]["value"]
-        else:
-            return default
+            if key in self._cache and "value" in self._cache[key]:
+                return self._cache[key]["value"]
+            else:
+                return default
 
     def get_all(self):
-        ret = {}
-        self._load()
+        with self._lock:
+            ret = {}
+            self._load()
+
+            if self._prune():
+                self._save()
+
+            for key, value in self._cache.items():
+                if self.key_prefix:
+                    prefix = self.key_prefix + ":"
+                else:
+                    prefix = ""
+                if key.startswith(prefix):
+                    okey = key[len(prefix):]
+                    ret[okey] = value["value"]
+
+            return ret
+
+
+def freeze(value):
+    """Returns a hashable form of a value, which is the same for equal
+    dicts, lists and sets, to be used as part of a cache key."""
+    if isinstance(value, dict):
+        return tuple(sorted(((key, freeze(val)) for key, val in value.items()), key=repr))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(val) for val in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(freeze(val) for val in value)
+
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+
+    return value
+
+
+def copy_stream(stream):
+    """Returns a copy of a stream which doesn't share the state set by
+    its callers or changed when it's opened."""
+    stream = copy.copy(stream)
+    if getattr(stream, "segment_window", None) is not None:
+        stream.segment_window = None
+
+    substreams = getattr(stream, "substreams", None)
+    if substreams:
+        stream.substreams = tuple(substream and copy_stream(substream) for substream in substreams)
+
+    # The options of muxed streams are updated when they are opened
+    options = getattr(stream, "options", None)
+    if isinstance(options, dict):
+        stream.options = dict((key, copy.copy(val)) for key, val in options.items())
+
+    return stream
+
+
+def copy_streams(streams):
+    # Synonyms like best and worst stay the same objects as their streams
+    copies = {}
+    for stream in streams.values():
+        if id(stream) not in copies:
+            copies[id(stream)] = copy_stream(stream)
+
+    return type(streams)((name, copies[id(stream)]) for name, stream in streams.items())
+
+
+class StreamsCache(object):
+    """Caches the streams returned by plugins in memory.
+
+    Concurrent calls for the same key wait for the streams of the first
+    call instead of fetching them again. Errors and empty results are
+    not cached. Every call returns copies of the cached streams, so they
+    can be opened independently.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._pending = {}
+        self._lock = Lock()
+
+    def get(self, key, fetch, ttl):
+        """Returns the cached streams of key, or the streams returned by
+        fetch, which are cached for ttl seconds.
+
+        fetch returns the streams and the time they expire at in seconds
+        since the epoch, or None if they expire after ttl.
+        """
+        with self._lock:
+            now = time()
+            for expired in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[expired]
+
+            if key in self._entries:
+                return copy_streams(self._entries[key][1])
+
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = Future()
+                owner = True
+            else:
+                owner = False
 
-        if self._prune():
-            self._save()
+        if not owner:
+            return copy_streams(future.result())
 
-        for key, value in self._cache.items():
-            if self.key_prefix:
-                prefix = self.key_prefix + ":"
-            else:
-                prefix = ""
-            if key.startswith(prefix):
-                okey = key[len(prefix):]
-                ret[okey] = value["value"]
+        try:
+            streams, expires_at = fetch()
+        except BaseException as err:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(err)
+            raise
+
+        expires = time() + ttl
+        if expires_at:
+            expires = min(expires, expires_at)
+
+        with self._lock:
+            del self._pending[key]
+            if streams:
+                self._entries[key] = (expires, streams)
+        future.set_result(streams)
+
+        return copy_streams(streams)
 
-        return ret
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
 
 
-__all__ = ["Cache"]
+__all__ = ["Cache", "StreamsCache"]
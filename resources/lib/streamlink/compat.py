@@ -54,7 +54,7 @@ except ImportError:
     html_unescape = unescape = HTMLParser().unescape
 
 
-getargspec = getattr(inspect, "getfullargspec", inspect.getargspec)
+getargspec = getattr(inspect, "getfullargspec", None) or inspect.getargspec
 
 
 __all__ = ["is_py2", "is_py3", "is_py33", "is_win32", "str", "bytes",
@@ -0,0 +1,234 @@
+"""Metrics of the streams opened by a session.
+
+The metrics are kept per stream in a :class:`MetricsRegistry` which is
+available as :attr:`Streamlink.metrics` and can be read from Python or
+exported in the Prometheus text format, optionally through a local HTTP
+``/metrics`` endpoint. The metrics of a stream are removed once it is
+closed.
+"""
+
+import logging
+from collections import OrderedDict
+from threading import Lock, Thread
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+log = logging.getLogger(__name__)
+
+COUNTER = "counter"
+GAUGE = "gauge"
+SUMMARY = "summary"
+
+# name: (type, help)
+METRICS = OrderedDict([
+    ("segment_request_seconds",
+     (SUMMARY, "Time until the response headers of a segment or HTTP stream were received")),
+    ("segment_download_seconds_total",
+     (COUNTER, "Time spent downloading segments")),
+    ("segment_bytes_total",
+     (COUNTER, "Bytes of segment data downloaded")),
+    ("segments_total",
+     (COUNTER, "Segments downloaded")),
+    ("segment_retries_total",
+     (COUNTER, "Segment requests which were retried")),
+    ("download_resumes_total",
+     (COUNTER, "Interrupted downloads which were resumed")),
+    ("segment_errors_total",
+     (COUNTER, "Segments which failed to download")),
+    ("segment_hedged_requests_total",
+     (COUNTER, "Duplicate requests sent for slow segment responses")),
+    ("segment_hedge_wins_total",
+     (COUNTER, "Duplicate segment requests which responded first")),
+    ("segment_decrypt_seconds",
+     (SUMMARY, "Time spent decrypting a segment")),
+    ("playlist_reload_seconds",
+     (SUMMARY, "Time taken to reload the playlist")),
+    ("playlist_reload_retries_total",
+     (COUNTER, "Playlist reloads which were retried")),
+    ("playlist_reload_lag_seconds",
+     (GAUGE, "How much later than scheduled the playlist was last reloaded")),
+    ("variant_switches_total",
+     (COUNTER, "Switches between the variants of an adaptive stream")),
+    ("buffer_fill_bytes",
+     (GAUGE, "Bytes waiting in the stream buffer")),
+    ("buffer_size_bytes",
+     (GAUGE, "Size of the stream buffer")),
+    ("output_bytes_total",
+     (COUNTER, "Bytes read from the stream by the consumer")),
+])
+
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+
+class StreamMetrics(object):
+    """The metrics of a single stream, which are labeled with the stream's
+    type and URL."""
+
+    def __init__(self, registry, labels):
+        self.registry = registry
+        self.labels = labels
+        self.closed = False
+
+    def inc(self, name, value=1):
+        with self.registry.lock:
+            if self.closed:
+                return
+            values = self.registry.values[name]
+            values[self.labels] = values.get(self.labels, 0) + value
+
+    def set(self, name, value):
+        with self.registry.lock:
+            if self.closed:
+                return
+            self.registry.values[name][self.labels] = value
+
+    def observe(self, name, value):
+        with self.registry.lock:
+            if self.closed:
+                return
+            values = self.registry.values[name]
+            count, total = values.get(self.labels, (0, 0.0))
+            values[self.labels] = (count + 1, total + value)
+
+    def get(self, name):
+        with self.registry.lock:
+            return self.registry.values[name].get(self.labels)
+
+    def close(self):
+        """Removes the metrics of the stream, unless another open stream
+        has the same labels."""
+        with self.registry.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.registry.release(self.labels)
+
+
+class MetricsRegistry(object):
+    """Keeps the metrics of all the streams of a session."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.values = OrderedDict((name, OrderedDict()) for name in METRICS)
+        # The number of open streams with the same labels
+        self.refs = {}
+
+    def stream(self, stream):
+        """Returns the metrics of a stream."""
+        # The query string is left out as it often contains access tokens
+        url = getattr(stream, "url", None) or ""
+        labels = (("type", stream.shortname()),
+                  ("url", url.split("?", 1)[0]))
+        with self.lock:
+            self.refs[labels] = self.refs.get(labels, 0) + 1
+
+        return StreamMetrics(self, labels)
+
+    def release(self, labels):
+        """Removes the metrics with the labels once no stream uses them,
+        the lock has to be held."""
+        self.refs[labels] = self.refs.get(labels, 1) - 1
+        if self.refs[labels] > 0:
+            return
+
+        del self.refs[labels]
+        for values in self.values.values():
+            values.pop(labels, None)
+
+    def collect(self):
+        """Returns a dict of metric name to a list of (labels, value) tuples,
+        summaries are (count, sum) tuples."""
+        with self.lock:
+            return OrderedDict((name, [(dict(labels), value) for labels, value in values.items()])
+                               for name, values in self.values.items())
+
+    def clear(self):
+        with self.lock:
+            for values in self.values.values():
+                values.clear()
+
+    def render(self, prefix="streamlink_"):
+        """Returns the metrics in the Prometheus text format."""
+        lines = []
+        with self.lock:
+            for name, values in self.values.items():
+                metric_type, help_text = METRICS[name]
+                name = prefix + name
+                lines.append("# HELP {0} {1}".format(name, help_text))
+                lines.append("# TYPE {0} {1}".format(name, metric_type))
+
+                for labels, value in values.items():
+                    label_text = ",".join("{0}=\"{1}\"".format(key, escape_label(val))
+                                          for key, val in labels)
+                    if metric_type == SUMMARY:
+                        count, total = value
+                        lines.append("{0}_count{{{1}}} {2}".format(name, label_text, count))
+                        lines.append("{0}_sum{{{1}}} {2}".format(name, label_text, float(total)))
+                    else:
+                        lines.append("{0}{{{1}}} {2}".format(name, label_text, value))
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host="127.0.0.1", port=0):
+        """Starts a HTTP server in a background thread which serves the
+        metrics at /metrics, and returns it."""
+        server = MetricsServer(self, host, port)
+        server.start()
+
+        return server
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        data = self.server.registry.render().encode("utf8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, registry, host="127.0.0.1", port=0):
+        HTTPServer.__init__(self, (host or "", port), MetricsRequestHandler)
+        self.registry = registry
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://{0}:{1}/metrics".format(host or "127.0.0.1", port)
+
+    def start(self):
+        self.thread = Thread(target=self.serve_forever,
+                             name="Thread-{0}".format(self.__class__.__name__))
+        self.thread.daemon = True
+        self.thread.start()
+        log.debug("Serving metrics at {0}", self.url)
+
+    def close(self):
+        if self.thread:
+            self.shutdown()
+            self.thread = None
+
+        self.server_close()
+
+
+__all__ = ["MetricsRegistry", "MetricsServer", "StreamMetrics"]
@@ -4,17 +4,18 @@ from .tag import Header, Tag
 
 
 class FLV(object):
-    def __init__(self, fd=None, strict=False):
+    def __init__(self, fd=None, strict=False, lazy=False):
         self.fd = fd
         self.header = Header.deserialize(self.fd)
         self.strict = strict
+        self.lazy = lazy
 
     def __iter__(self):
         return self
 
     def __next__(self):
         try:
-            tag = Tag.deserialize(self.fd, strict=self.strict)
+            tag = Tag.deserialize(self.fd, strict=self.strict, lazy=self.lazy)
         except (IOError, FLVError):
             raise StopIteration
 
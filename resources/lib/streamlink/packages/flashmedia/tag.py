@@ -1,5 +1,6 @@
 from ctypes import BigEndianStructure, Union, c_uint8
 from io import BytesIO
+from struct import error as struct_error
 
 from .compat import *
 from .error import *
@@ -186,26 +187,90 @@ class Tag(Packet):
         if not padding:
             padding = b""
 
+        self.payload = None
         self.data = data
         self.streamid = streamid
         self.timestamp = timestamp
         self.padding = padding
 
     def __repr__(self):
+        if self.decoded:
+            data = repr(self.data)
+        else:
+            data = "<Payload size={0}>".format(len(self.payload))
+
         reprformat = "<Tag type={type} timestamp={timestamp} streamid={streamid} filter={filter} data={data}>"
         return reprformat.format(type=self.type, timestamp=self.timestamp,
                                  streamid=self.streamid, filter=self.filter,
-                                 data=repr(self.data))
+                                 data=data)
 
     type = flagproperty("flags", "type")
     filter = flagproperty("flags", "filter", True)
 
+    @classmethod
+    def _lazy(cls, flags, timestamp, streamid, payload):
+        tag = cls(flags.bit.type, timestamp, None, streamid,
+                  bool(flags.bit.filter))
+        tag.payload = payload
+
+        return tag
+
+    @property
+    def decoded(self):
+        """False while the payload of a lazily deserialised tag has
+        not been decoded yet."""
+        return self.payload is None
+
+    def decode(self):
+        """Decodes the raw payload of a lazily deserialised tag.
+
+        Raises IOError if the payload is malformed, like reading a tag
+        which is not lazily deserialised does.
+        """
+        if self.decoded:
+            return
+
+        payload = self.payload.tobytes()
+        datacls = TagDataTypes[self.type]
+
+        try:
+            data, offset = datacls.deserialize_from(payload, 0, buf_size=len(payload))
+        except (IOError, struct_error) as err:
+            raise IOError("Unable to decode tag: {0}".format(err))
+
+        self._data = data
+        self._padding = payload[offset:]
+        self.payload = None
+
+    @property
+    def data(self):
+        self.decode()
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self.decode()
+        self._data = data
+
+    @property
+    def padding(self):
+        self.decode()
+        return self._padding
+
+    @padding.setter
+    def padding(self, padding):
+        self.decode()
+        self._padding = padding
+
     @property
     def data_size(self):
         return self.data.size
 
     @property
     def tag_size(self):
+        if not self.decoded:
+            return 11 + len(self.payload)
+
         return 11 + self.data_size + len(self.padding)
 
     @property
@@ -213,7 +278,7 @@ class Tag(Packet):
         return 4 + self.tag_size
 
     @classmethod
-    def _deserialize(cls, io, strict=False, raw_data=False):
+    def _deserialize(cls, io, strict=False, raw_data=False, lazy=False):
         header = io.read(11)
 
         if len(header) < 11:
@@ -237,16 +302,19 @@ class Tag(Packet):
 
         tag_data = chunked_read(io, data_size, exception=FLVError)
 
-        if data_size > 0 and not raw_data:
-            tag_data_io = BytesIO(tag_data)
-            data = datacls.deserialize(tag_data_io)
-            padding = tag_data_io.read()
+        if data_size > 0 and not raw_data and lazy:
+            tag = cls._lazy(flags, timestamp, streamid, memoryview(tag_data))
         else:
-            data = RawData(tag_data)
-            padding = b""
+            if data_size > 0 and not raw_data:
+                tag_data_io = BytesIO(tag_data)
+                data = datacls.deserialize(tag_data_io)
+                padding = tag_data_io.read()
+            else:
+                data = RawData(tag_data)
+                padding = b""
 
-        tag = Tag(flags.bit.type, timestamp, data,
-                  streamid, bool(flags.bit.filter), padding)
+            tag = Tag(flags.bit.type, timestamp, data,
+                      streamid, bool(flags.bit.filter), padding)
 
         tag_size = U32BE.read(io)
 
@@ -257,7 +325,7 @@ class Tag(Packet):
 
     @classmethod
     def _deserialize_from(cls, buf, offset, strict=False,
-                          raw_data=False):
+                          raw_data=False, lazy=False):
         (flagb, data_size, timestamp, timestamp_ext,
          streamid) = unpack_many_from(buf, offset, (U8, U24BE, U24BE, U8, U24BE))
 
@@ -276,17 +344,24 @@ class Tag(Packet):
         else:
             raise FLVError("Unknown tag type!")
 
-        if data_size > 0 and not raw_data:
-            data, doffset = datacls.deserialize_from(buf, offset, buf_size=data_size)
-            padding = buf[doffset:offset + data_size]
+        if data_size > 0 and not raw_data and lazy:
+            if offset + data_size > len(buf):
+                raise FLVError("Insufficient tag data")
+
+            payload = memoryview(buf)[offset:offset + data_size]
+            tag = cls._lazy(flags, timestamp, streamid, payload)
         else:
-            data = RawData(buf[offset:offset + data_size])
-            padding = b""
+            if data_size > 0 and not raw_data:
+                data, doffset = datacls.deserialize_from(buf, offset, buf_size=data_size)
+                padding = buf[doffset:offset + data_size]
+            else:
+                data = RawData(buf[offset:offset + data_size])
+                padding = b""
 
-        offset += data_size
+            tag = Tag(flags.bit.type, timestamp, data,
+                      streamid, bool(flags.bit.filter), padding)
 
-        tag = Tag(flags.bit.type, timestamp, data,
-                  streamid, bool(flags.bit.filter), padding)
+        offset += data_size
 
         tag_size = U32BE.unpack_from(buf, offset)[0]
         offset += U32BE.size
@@ -297,6 +372,17 @@ class Tag(Packet):
         return (tag, offset)
 
     def _serialize(self, packet, strict=True):
+        if not self.decoded:
+            # Write the untouched payload back without decoding it
+            packet += U8(self.flags.byte)
+            packet += U24BE(len(self.payload))
+            packet += U24BE(self.timestamp & 0xFFFFFF)
+            packet += U8((self.timestamp >> 24) & 0x7F)
+            packet += U24BE(self.streamid)
+            packet += self.payload
+            packet += U32BE(self.tag_size)
+            return
+
         packet += U8(self.flags.byte)
         packet += U24BE(self.data_size)
 
@@ -313,15 +399,20 @@ class Tag(Packet):
         packet += U32BE(self.tag_size)
 
     def _serialize_into(self, packet, offset):
+        data_size = self.data_size if self.decoded else len(self.payload)
         offset = pack_many_into(packet, offset,
                                 (U8, U24BE, U24BE, U8, U24BE),
-                                (self.flags.byte, self.data_size,
+                                (self.flags.byte, data_size,
                                  self.timestamp & 0xFFFFFF,
                                  (self.timestamp >> 24) & 0x7F,
                                  self.streamid))
 
-        offset = self.data.serialize_into(packet, offset)
-        offset = pack_bytes_into(packet, offset, self.padding)
+        if not self.decoded:
+            packet[offset:offset + data_size] = self.payload
+            offset += data_size
+        else:
+            offset = self.data.serialize_into(packet, offset)
+            offset = pack_bytes_into(packet, offset, self.padding)
 
         U32BE.pack_into(packet, offset, self.tag_size)
         offset += 4
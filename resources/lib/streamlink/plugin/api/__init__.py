@@ -4,9 +4,10 @@ from types import ModuleType as module
 
 from .http_session import HTTPSession
 from .mapper import StreamMapper
+from .resolver import DNSCache
 from .support_plugin import load_support_plugin
 
-__all__ = ["HTTPSession", "StreamMapper", "load_support_plugin", "http"]
+__all__ = ["DNSCache", "HTTPSession", "StreamMapper", "load_support_plugin", "http"]
 
 
 class SupportPlugin(module):
@@ -1,4 +1,11 @@
+import errno
+import logging
+import select
+import socket
+import threading
 import time
+from collections import OrderedDict
+
 from requests import Session, __build__ as requests_version
 from requests.adapters import HTTPAdapter
 
@@ -12,6 +19,15 @@ try:
 except ImportError:
     TIMEOUT_ADAPTER_NEEDED = False
 
+try:
+    from requests.packages.urllib3.connection import HTTPConnection, HTTPSConnection
+    from requests.packages.urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+    from requests.packages.urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+except ImportError:
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+    from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
 try:
     from requests.packages import urllib3
 
@@ -21,10 +37,26 @@ try:
 except (ImportError, AttributeError):
     pass
 
+from ...compat import urlparse
 from ...exceptions import PluginError
 from ...utils import parse_json, parse_xml
 
-__all__ = ["HTTPSession"]
+__all__ = ["HTTPSession", "RequestTrace"]
+
+log = logging.getLogger(__name__)
+
+TRACE_EVENTS = ("start", "headers", "first_byte", "complete", "retry", "error")
+
+# The trace of the request currently being sent by a thread, which is where
+# the connection classes below report their timings to
+_trace_local = threading.local()
+# The session sending a request in a thread, whose resolver and connection
+# settings are used by the connection classes below
+_session_local = threading.local()
+
+# Delay before the next address is tried while connecting, RFC 8305
+CONNECTION_ATTEMPT_DELAY = 0.25
+_CONNECT_IN_PROGRESS = (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, getattr(errno, "WSAEWOULDBLOCK", -1))
 
 
 def _parse_keyvalue_list(val):
@@ -36,12 +68,301 @@ def _parse_keyvalue_list(val):
             continue
 
 
-class HTTPAdapterWithReadTimeout(HTTPAdapter):
+class RequestTrace(object):
+    """The progress of a single request, which is passed to the trace hooks
+    of a :class:`HTTPSession`.
+
+    The timings are in seconds and are reset on every attempt:
+
+    - dns: resolving the host name of a new connection
+    - connect: establishing the TCP connection
+    - tls: the TLS handshake (and proxy tunnel) of a new connection
+    - ttfb: from sending the request until the response headers arrived
+    - transfer: from the response headers until the last byte of the body
+
+    The connection timings stay at zero when a pooled connection was reused.
+    """
+
+    def __init__(self, session, method, url):
+        self.session = session
+        self.method = method
+        self.url = url
+        self.attempt = 0
+        self.response = None
+        self.error = None
+        self.retry_delay = None
+        self.bytes_received = 0
+        self.started_at = None
+        self.headers_at = None
+        self.timings = None
+
+    def emit(self, event):
+        for hook in self.session.trace_hooks.get(event, ()):
+            try:
+                hook(event, self)
+            except Exception as err:
+                log.error("Trace hook {0!r} failed on {1}: {2}", hook, event, err)
+
+    def start(self, attempt):
+        self.attempt = attempt
+        self.response = None
+        self.error = None
+        self.retry_delay = None
+        self.bytes_received = 0
+        self.headers_at = None
+        self.timings = OrderedDict((name, 0.0) for name in ("dns", "connect", "tls", "ttfb", "transfer"))
+        self.started_at = time.time()
+        self.emit("start")
+
+    def headers(self, res):
+        self.response = res
+        self.headers_at = time.time()
+        connection = self.timings["dns"] + self.timings["connect"] + self.timings["tls"]
+        self.timings["ttfb"] = max(self.headers_at - self.started_at - connection, 0.0)
+        self.emit("headers")
+
+    def retry(self, err, delay):
+        self.error = err
+        self.retry_delay = delay
+        self.emit("retry")
+
+    def fail(self, err):
+        self.error = err
+        self.emit("error")
+
+    def iter_content(self, iter_content, streamed):
+        """Wraps the iter_content method of the response, which is also what
+        the content property reads the body with."""
+        def traced_iter_content(*args, **kwargs):
+            first = True
+            try:
+                for chunk in iter_content(*args, **kwargs):
+                    if first:
+                        first = False
+                        self.emit("first_byte")
+                    self.bytes_received += len(chunk)
+                    self.timings["transfer"] = time.time() - self.headers_at
+                    yield chunk
+            except Exception as err:
+                # Errors of a body read as part of the request are handled
+                # by the retry loop of the request instead
+                if streamed:
+                    self.fail(err)
+                raise
+
+            if first:
+                self.emit("first_byte")
+            self.timings["transfer"] = time.time() - self.headers_at
+            self.emit("complete")
+
+        return traced_iter_content
+
+
+def getaddrinfo(host, port):
+    return socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+
+
+def interleave_addresses(addresses):
+    """Alternates the address families, starting with the first one."""
+    families = OrderedDict()
+    for address in addresses:
+        families.setdefault(address[0], []).append(address)
+
+    result = []
+    while any(families.values()):
+        for family in families.values():
+            if family:
+                result.append(family.pop(0))
+
+    return result
+
+
+def connect(addresses, timeout=None, source_address=None, socket_options=None, delay=None):
+    """Connects to the first of the addresses which accepts a connection.
+
+    The next address is tried once the previous attempt failed or, with
+    a delay, once it didn't succeed within the delay while the previous
+    attempts continue (Happy Eyeballs). The other attempts are closed.
+    """
+    addresses = list(addresses)
+    pending = {}
+    error = None
+    next_attempt = 0
+    try:
+        while addresses or pending:
+            now = time.time()
+            if addresses and (not pending or (delay is not None and now >= next_attempt)):
+                family, socktype, proto, _, sockaddr = addresses.pop(0)
+                sock = None
+                try:
+                    sock = socket.socket(family, socktype, proto)
+                    for option in socket_options or ():
+                        sock.setsockopt(*option)
+                    if source_address:
+                        sock.bind(source_address)
+                    sock.setblocking(False)
+                    err = sock.connect_ex(sockaddr)
+                    if err not in _CONNECT_IN_PROGRESS:
+                        raise socket.error(err, "Unable to connect to {0}: {1}".format(sockaddr[0], errno.errorcode.get(err, err)))
+                except socket.error as err:
+                    error = err
+                    if sock is not None:
+                        sock.close()
+                    continue
+
+                pending[sock] = now + timeout if timeout is not None else None
+                next_attempt = now + (delay or 0)
+
+            # Wait for a connection until the next attempt is due
+            deadlines = [deadline for deadline in pending.values() if deadline is not None]
+            if addresses and delay is not None:
+                deadlines.append(next_attempt)
+            wait = max(min(deadlines) - now, 0) if deadlines else None
+
+            socks = list(pending)
+            _, writable, failed = select.select([], socks, socks, wait)
+            for sock in set(writable + failed):
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if not err and sock not in failed:
+                    del pending[sock]
+                    sock.settimeout(timeout)
+                    return sock
+
+                error = socket.error(err, "Unable to connect: {0}".format(errno.errorcode.get(err, err)))
+                del pending[sock]
+                sock.close()
+
+            now = time.time()
+            for sock, deadline in list(pending.items()):
+                if deadline is not None and now >= deadline:
+                    error = socket.timeout("timed out")
+                    del pending[sock]
+                    sock.close()
+    finally:
+        for sock in pending:
+            sock.close()
+
+    raise error or socket.error("No addresses to connect to")
+
+
+class TracedConnectionMixin(object):
+    def _new_conn(self):
+        session = getattr(_session_local, "session", None)
+        if session is not None and (session.resolver or session.happy_eyeballs):
+            return self._new_resolved_conn(session.resolve, session.happy_eyeballs)
+
+        if getattr(_trace_local, "trace", None) is None:
+            return super(TracedConnectionMixin, self)._new_conn()
+
+        # Resolved here to be able to time the lookup on its own
+        return self._new_resolved_conn(getaddrinfo)
+
+    def _new_resolved_conn(self, resolve, happy_eyeballs=False):
+        """Connects to the addresses returned by resolve, racing them if
+        Happy Eyeballs is enabled."""
+        trace = getattr(_trace_local, "trace", None)
+        host = getattr(self, "_dns_host", self.host)
+        timeout = self.timeout if isinstance(self.timeout, (int, float)) else socket.getdefaulttimeout()
+
+        start = time.time()
+        try:
+            addresses = resolve(host, self.port)
+        except (socket.error, UnicodeError) as err:
+            raise NewConnectionError(self, "Failed to resolve {0}: {1}".format(host, err))
+        finally:
+            if trace:
+                trace.timings["dns"] += time.time() - start
+
+        if happy_eyeballs:
+            addresses = interleave_addresses(addresses)
+
+        start = time.time()
+        try:
+            return connect(addresses, timeout,
+                           source_address=self.source_address,
+                           socket_options=self.socket_options,
+                           delay=CONNECTION_ATTEMPT_DELAY if happy_eyeballs else None)
+        except socket.timeout:
+            raise ConnectTimeoutError(self, "Connection to {0} timed out. (connect timeout={1})".format(self.host, timeout))
+        except socket.error as err:
+            raise NewConnectionError(self, "Failed to establish a new connection: {0}".format(err))
+        finally:
+            if trace:
+                trace.timings["connect"] += time.time() - start
+
+
+class TracedHTTPConnection(TracedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TracedHTTPSConnection(TracedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        trace = getattr(_trace_local, "trace", None)
+        if trace is None:
+            return super(TracedHTTPSConnection, self).connect()
+
+        before = trace.timings["dns"] + trace.timings["connect"]
+        start = time.time()
+        try:
+            return super(TracedHTTPSConnection, self).connect()
+        finally:
+            elapsed = time.time() - start
+            spent = trace.timings["dns"] + trace.timings["connect"] - before
+            trace.timings["tls"] += max(elapsed - spent, 0.0)
+
+
+class TracedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TracedHTTPConnection
+
+
+class TracedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TracedHTTPSConnection
+
+
+TRACED_POOL_CLASSES = {
+    "http": TracedHTTPConnectionPool,
+    "https": TracedHTTPSConnectionPool
+}
+
+
+class TracingHTTPAdapter(HTTPAdapter):
+    """Creates connections which report their DNS, connect and TLS timings
+    to the trace of the request being sent, if any.
+
+    New connections use the resolver and Happy Eyeballs setting of the
+    session the adapter is mounted in.
+    """
+
+    def __init__(self, session=None, *args, **kwargs):
+        HTTPAdapter.__init__(self, *args, **kwargs)
+        self.session = session
+
+    def send(self, request, *args, **kwargs):
+        _session_local.session = self.session
+        try:
+            return HTTPAdapter.send(self, request, *args, **kwargs)
+        finally:
+            _session_local.session = None
+
+    def init_poolmanager(self, *args, **kwargs):
+        HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = TRACED_POOL_CLASSES
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = HTTPAdapter.proxy_manager_for(self, proxy, **proxy_kwargs)
+        # SOCKS proxies use connection classes of their own
+        if not proxy.lower().startswith("socks"):
+            manager.pool_classes_by_scheme = TRACED_POOL_CLASSES
+
+        return manager
+
+
+class HTTPAdapterWithReadTimeout(TracingHTTPAdapter):
     """This is a backport of the timeout behaviour from requests 2.3.0+
        where timeout is applied to both connect and read."""
 
     def get_connection(self, *args, **kwargs):
-        conn = HTTPAdapter.get_connection(self, *args, **kwargs)
+        conn = TracingHTTPAdapter.get_connection(self, *args, **kwargs)
 
         # Override the urlopen method on this connection
         if not hasattr(conn.urlopen, "wrapped"):
@@ -68,10 +389,19 @@ class HTTPSession(Session):
             self.headers['User-Agent'] = useragents.FIREFOX
 
         self.timeout = 20.0
+        self.trace_hooks = {}
+        # Resolves the host names of new connections, e.g. a DNSCache,
+        # the system resolver is used if None
+        self.resolver = None
+        # Race the connections to the addresses of a host (RFC 8305)
+        self.happy_eyeballs = False
 
         if TIMEOUT_ADAPTER_NEEDED:
-            self.mount("http://", HTTPAdapterWithReadTimeout())
-            self.mount("https://", HTTPAdapterWithReadTimeout())
+            self.mount("http://", HTTPAdapterWithReadTimeout(self))
+            self.mount("https://", HTTPAdapterWithReadTimeout(self))
+        else:
+            self.mount("http://", TracingHTTPAdapter(self))
+            self.mount("https://", TracingHTTPAdapter(self))
 
         self.mount('file://', FileAdapter())
 
@@ -134,6 +464,75 @@ class HTTPSession(Session):
         for name, value in _parse_keyvalue_list(cookies):
             self.params[name] = value
 
+    def add_trace_hook(self, event, hook):
+        """Registers a function which is called as hook(event, trace) with
+        the :class:`RequestTrace` of every request made by this session.
+
+        Events:
+
+        - start: before every attempt of a request
+        - headers: the response headers were received
+        - first_byte: the first byte of the response body was received
+        - complete: the whole response body was received
+        - retry: an attempt failed and the request will be retried
+        - error: the request failed
+
+        Requests are only traced while hooks are registered. The body of
+        streamed responses is traced when read with iter_content.
+        """
+        if event not in TRACE_EVENTS:
+            raise ValueError("Unknown trace event: {0}".format(event))
+
+        self.trace_hooks.setdefault(event, []).append(hook)
+
+    def remove_trace_hook(self, event, hook):
+        hooks = self.trace_hooks.get(event)
+        if hooks and hook in hooks:
+            hooks.remove(hook)
+            if not hooks:
+                del self.trace_hooks[event]
+
+    def _traced_request(self, trace, method, url, *args, **kwargs):
+        streamed = kwargs.pop("stream", False)
+
+        # Always stream to be able to tell the headers and body apart
+        _trace_local.trace = trace
+        try:
+            res = Session.request(self, method, url, stream=True, *args, **kwargs)
+        finally:
+            _trace_local.trace = None
+
+        trace.headers(res)
+        res.iter_content = trace.iter_content(res.iter_content, streamed)
+        if not streamed:
+            res.content
+
+        return res
+
+    def resolve(self, host, port):
+        """Returns the addresses of a host in the format of
+        :func:`socket.getaddrinfo`, using the resolver if set."""
+        if self.resolver:
+            return self.resolver.resolve(host, port)
+
+        return getaddrinfo(host, port)
+
+    def prewarm(self, urls):
+        """Looks up the hosts of the URLs in the background, if the
+        resolver supports it."""
+        if not hasattr(self.resolver, "prewarm"):
+            return
+
+        hosts = set()
+        for url in urls:
+            parsed = urlparse(url)
+            if parsed.scheme in ("http", "https") and parsed.hostname:
+                hosts.add((parsed.hostname, parsed.port or (443 if parsed.scheme == "https" else 80)))
+
+        # Proxied requests connect to the proxy instead
+        if hosts and not self.proxies:
+            self.resolver.prewarm(hosts)
+
     def resolve_url(self, url):
         """Resolves any redirects and returns the final URL."""
         return self.get(url, stream=True).url
@@ -151,7 +550,9 @@ class HTTPSession(Session):
         total_retries = kwargs.pop("retries", 0)
         retry_backoff = kwargs.pop("retry_backoff", 0.3)
         retry_max_backoff = kwargs.pop("retry_max_backoff", 10.0)
+        on_retry = kwargs.pop("on_retry", None)
         retries = 0
+        trace = RequestTrace(self, method, url) if self.trace_hooks else None
 
         if session:
             headers.update(session.headers)
@@ -159,12 +560,21 @@ class HTTPSession(Session):
 
         while True:
             try:
-                res = Session.request(self, method, url,
-                                      headers=headers,
-                                      params=params,
-                                      timeout=timeout,
-                                      proxies=proxies,
-                                      *args, **kwargs)
+                if trace:
+                    trace.start(retries)
+                    res = self._traced_request(trace, method, url,
+                                               headers=headers,
+                                               params=params,
+                                               timeout=timeout,
+                                               proxies=proxies,
+                                               *args, **kwargs)
+                else:
+                    res = Session.request(self, method, url,
+                                          headers=headers,
+                                          params=params,
+                                          timeout=timeout,
+                                          proxies=proxies,
+                                          *args, **kwargs)
                 if raise_for_status and res.status_code not in acceptable_status:
                     res.raise_for_status()
                 break
@@ -172,6 +582,8 @@ class HTTPSession(Session):
                 raise
             except Exception as rerr:
                 if retries >= total_retries:
+                    if trace:
+                        trace.fail(rerr)
                     err = exception("Unable to open URL: {url} ({err})".format(url=url,
                                                                                err=rerr))
                     err.err = rerr
@@ -180,6 +592,10 @@ class HTTPSession(Session):
                 # back off retrying, but only to a maximum sleep time
                 delay = min(retry_max_backoff,
                             retry_backoff * (2 ** (retries - 1)))
+                if trace:
+                    trace.retry(rerr, delay)
+                if on_retry:
+                    on_retry(rerr, delay)
                 time.sleep(delay)
 
         if schema:
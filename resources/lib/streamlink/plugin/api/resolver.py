@@ -0,0 +1,86 @@
+import logging
+import socket
+import threading
+import time
+
+__all__ = ["DNSCache"]
+
+log = logging.getLogger(__name__)
+
+
+class DNSCache(object):
+    """Caches the addresses of host names for ttl seconds.
+
+    Used as the resolver of a :class:`HTTPSession`, so new connections
+    don't wait for the system resolver every time. Concurrent lookups of
+    the same host are made only once. Other resolvers can be used by
+    overriding :meth:`getaddrinfo`, or by setting the resolver of the
+    session to any object with a compatible :meth:`resolve` method.
+    """
+
+    def __init__(self, ttl=60.0):
+        self.ttl = ttl
+        self._entries = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def getaddrinfo(self, host, port):
+        """Returns the addresses of a host, in the format of
+        :func:`socket.getaddrinfo`."""
+        return socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+
+    def cached(self, host, port):
+        with self._lock:
+            entry = self._entries.get((host, port))
+            return bool(entry and entry[0] > time.time())
+
+    def resolve(self, host, port):
+        """Returns the cached addresses of a host, looking them up if they
+        are missing or expired."""
+        key = (host, port)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and entry[0] > time.time():
+                    return entry[1]
+
+                event = self._pending.get(key)
+                if event is None:
+                    event = self._pending[key] = threading.Event()
+                    break
+
+            # Looked up by another thread, which may fail
+            event.wait()
+
+        try:
+            addresses = self.getaddrinfo(host, port)
+            with self._lock:
+                self._entries[key] = (time.time() + self.ttl, addresses)
+
+            return addresses
+        finally:
+            with self._lock:
+                del self._pending[key]
+            event.set()
+
+    def prewarm(self, hosts):
+        """Looks up the (host, port) pairs which are not cached yet in a
+        background thread."""
+        hosts = [host for host in set(hosts) if not self.cached(*host)]
+        if not hosts:
+            return
+
+        def lookup():
+            for host, port in hosts:
+                try:
+                    self.resolve(host, port)
+                except (socket.error, UnicodeError) as err:
+                    log.debug("Unable to resolve {0}: {1}", host, err)
+
+        thread = threading.Thread(target=lookup, name="Thread-{0}".format(self.__class__.__name__))
+        thread.daemon = True
+        thread.start()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
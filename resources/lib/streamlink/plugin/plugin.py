@@ -8,7 +8,7 @@ import requests.cookies
 from functools import partial
 from collections import OrderedDict
 
-from streamlink.cache import Cache
+from streamlink.cache import Cache, freeze
 from streamlink.exceptions import PluginError, NoStreamsError, FatalPluginError
 from streamlink.options import Options, Arguments
 
@@ -50,6 +50,12 @@ NORMAL_PRIORITY = 20
 LOW_PRIORITY = 10
 NO_PRIORITY = 0
 
+# Session options which change the streams returned by plugins, which are
+# part of the key of their cached streams along with the HTTP headers,
+# query parameters and proxies of the session
+STREAMS_CACHE_OPTIONS = ("ffmpeg-ffmpeg", "hls-abr", "hls-abr-max", "hls-abr-min",
+                         "hls-audio-select", "locale", "rtmp-rtmpdump")
+
 
 def stream_weight(stream):
     for group, weights in QUALITY_WEIGTHS_EXTRA.items():
@@ -196,6 +202,9 @@ class Plugin(object):
     options = Options()
     arguments = Arguments()
     session = None
+    # Time the streams found expire at, in seconds since the epoch, e.g.
+    # because of the tokens in their URLs, limits how long they are cached
+    streams_expire_at = None
     _user_input_requester = None
 
     @classmethod
@@ -307,12 +316,34 @@ class Plugin(object):
               stream names as input.
 
 
+        The streams are cached by the session for the
+        ``streams-cache-ttl`` option's number of seconds, and every call
+        returns copies of them.
+
         :param stream_types: A list of stream types to return.
         :param sorting_excludes: Specify which streams to exclude from
                                  the best/worst synonyms.
 
         """
 
+        ttl = self.session and self.session.get_option("streams-cache-ttl")
+        if not ttl:
+            return self._streams(stream_types, sorting_excludes)
+
+        http = self.session.http
+        key = (self.module, self.url, freeze(stream_types), freeze(sorting_excludes),
+               freeze(self.options.options),
+               tuple((name, freeze(self.session.get_option(name))) for name in STREAMS_CACHE_OPTIONS),
+               freeze(dict(http.headers)), freeze(http.params), freeze(http.proxies))
+
+        def fetch():
+            self.streams_expire_at = None
+            streams = self._streams(stream_types, sorting_excludes)
+            return streams, self.streams_expire_at
+
+        return self.session.streams_cache.get(key, fetch, ttl)
+
+    def _streams(self, stream_types=None, sorting_excludes=None):
         try:
             ostreams = self._get_streams()
             if isinstance(ostreams, dict):
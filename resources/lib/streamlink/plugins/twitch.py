@@ -4,7 +4,9 @@ import json
 import logging
 import re
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from random import random
+from time import time
 
 import requests
 
@@ -26,6 +28,10 @@ Segment = namedtuple("Segment", "uri duration title key discontinuity ad byteran
 
 LOW_LATENCY_MAX_LIVE_EDGE = 2
 
+# Access tokens are not reused when they expire sooner than this
+ACCESS_TOKEN_EXPIRY_MARGIN = 60
+CHANNEL_ID_EXPIRY = 60 * 60 * 24 * 7
+
 
 class TwitchM3U8(M3U8):
     def __init__(self):
@@ -312,10 +318,13 @@ class TwitchAPI(object):
                             lambda n: not re.match(r"(.+_)?archives|live|chunked", n)
                         )
                     )
-                }
+                },
+                validate.optional("expires"): int
             },
-            validate.get("chansub"),
-            validate.get("restricted_bitrates")
+            validate.union((
+                validate.all(validate.get("chansub"), validate.get("restricted_bitrates")),
+                validate.get("expires")
+            ))
         ))
 
     def hosted_channel(self, channel_id):
@@ -531,12 +540,27 @@ class Twitch(Plugin):
             raise PluginError("Unable to find video: {0}".format(video_id))
 
     def _channel_from_login(self, channel):
+        key = "channel-id:{0}".format(channel)
+        self._channel_id = self.cache.get(key)
+        if self._channel_id:
+            return
+
         try:
             self._channel_id = self.api.channel_from_login(channel)
         except PluginError:
             raise PluginError("Unable to find channel: {0}".format(channel))
 
+        self.cache.set(key, self._channel_id, expires=CHANNEL_ID_EXPIRY)
+
     def _access_token(self, endpoint, asset):
+        key = "access-token:{0}:{1}".format(endpoint, asset)
+        cached = self.cache.get(key)
+        if cached:
+            log.debug("Using cached access token for {0}".format(asset))
+            sig, token, restricted_bitrates, expires = cached
+            self.streams_expire_at = expires - ACCESS_TOKEN_EXPIRY_MARGIN
+            return sig, token, restricted_bitrates
+
         try:
             sig, token = self.api.access_token(endpoint, asset)
         except PluginError as err:
@@ -546,9 +570,15 @@ class Twitch(Plugin):
                 raise
 
         try:
-            restricted_bitrates = self.api.token(token)
+            restricted_bitrates, expires = self.api.token(token)
         except PluginError:
-            restricted_bitrates = []
+            restricted_bitrates, expires = [], None
+
+        # Tokens are valid until they expire, not only for this stream
+        if expires and expires - time() > ACCESS_TOKEN_EXPIRY_MARGIN:
+            self.streams_expire_at = expires - ACCESS_TOKEN_EXPIRY_MARGIN
+            self.cache.set(key, (sig, token, restricted_bitrates, expires),
+                           expires=expires - time() - ACCESS_TOKEN_EXPIRY_MARGIN)
 
         return sig, token, restricted_bitrates
 
@@ -577,12 +607,12 @@ class Twitch(Plugin):
             self._channel = login
             self.author = display_name
 
-    def _check_for_rerun(self):
+    def _check_for_rerun(self, channel_id):
         if not self.options.get("disable_reruns"):
             return False
 
         try:
-            stream_type, broadcast_platform, broadcaster_software = self.api.stream_rerun(self.channel_id)
+            stream_type, broadcast_platform, broadcaster_software = self.api.stream_rerun(channel_id)
             if stream_type != "live" or broadcast_platform == "rerun" or broadcaster_software == "watch_party_rerun":
                 log.info("Reruns were disabled by command line option")
                 return True
@@ -592,14 +622,28 @@ class Twitch(Plugin):
         return False
 
     def _get_hls_streams_live(self):
-        if self._switch_to_hosted_channel():
-            return
-        if self._check_for_rerun():
-            return
+        # The access token only depends on the channel name and the rerun
+        # check on the channel ID, so they are requested concurrently with
+        # the host check and only requested again if the channel is hosting
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            channel = self.channel
+            access_token = executor.submit(self._access_token, "channels", channel)
+            rerun = executor.submit(self._check_for_rerun, self.channel_id)
+
+            if self._switch_to_hosted_channel():
+                return
+            if self.channel != channel:
+                access_token = executor.submit(self._access_token, "channels", self.channel)
+                rerun = executor.submit(self._check_for_rerun, self.channel_id)
+
+            if rerun.result():
+                return
+            sig, token, restricted_bitrates = access_token.result()
+        finally:
+            executor.shutdown(wait=False)
 
-        # only get the token once the channel has been resolved
         log.debug("Getting live HLS streams for {0}".format(self.channel))
-        sig, token, restricted_bitrates = self._access_token("channels", self.channel)
         url = self.usher.channel(self.channel, sig=sig, token=token, fast_bread=True)
 
         return self._get_hls_streams(url, restricted_bitrates)
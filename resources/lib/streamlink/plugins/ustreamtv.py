@@ -16,7 +16,7 @@ from streamlink.exceptions import PluginError, StreamError
 from streamlink.plugin import Plugin, PluginArguments, PluginArgument
 from streamlink.plugin.api import useragents, validate
 from streamlink.stream import Stream
-from streamlink.stream.dash_manifest import sleep_until, utc
+from streamlink.stream.dash_manifest import datetime_to_seconds, utc
 from streamlink.stream.flvconcat import FLVTagConcat
 from streamlink.stream.segmented import (
     SegmentedStreamReader, SegmentedStreamWriter, SegmentedStreamWorker
@@ -164,18 +164,20 @@ class UHSStreamWriter(SegmentedStreamWriter):
                                      flatten_timestamps=True,
                                      sync_headers=True)
 
+    def available_at(self, chunk):
+        now = datetime.datetime.now(tz=utc)
+        if chunk.available_at > now:
+            time_to_wait = (chunk.available_at - now).total_seconds()
+            log.debug("Waiting for chunk: {fname} ({wait:.01f}s)".format(fname=chunk.num,
+                                                                         wait=time_to_wait))
+
+        return datetime_to_seconds(chunk.available_at)
+
     def fetch(self, chunk, retries=None):
         if not retries or self.closed:
             return
 
         try:
-            now = datetime.datetime.now(tz=utc)
-            if chunk.available_at > now:
-                time_to_wait = (chunk.available_at - now).total_seconds()
-                log.debug("Waiting for chunk: {fname} ({wait:.01f}s)".format(fname=chunk.num,
-                                                                             wait=time_to_wait))
-                sleep_until(chunk.available_at)
-
             return self.session.http.get(chunk.url,
                                          timeout=self.timeout,
                                          exception=StreamError)
@@ -1,20 +1,27 @@
 import imp
 import logging
 import pkgutil
+import re
 import sys
 import traceback
 import warnings
+from email.utils import mktime_tz, parsedate_tz
+from time import time
 
 import requests
 
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from streamlink.logger import StreamlinkLogger, Logger
 from streamlink.utils import update_scheme, memoize
 from streamlink.utils.l10n import Localization
 from . import plugins, __version__
+from .buffers import BufferPool
+from .cache import Cache, StreamsCache
 from .compat import is_win32
 from .exceptions import NoPluginError, PluginError
+from .metrics import MetricsRegistry
 from .options import Options
 from .plugin import api
 
@@ -22,6 +29,11 @@ from .plugin import api
 logging.setLoggerClass(StreamlinkLogger)
 log = logging.getLogger(__name__)
 
+# Permanent redirects without caching headers are cached for a week,
+# URLs which don't lead to a plugin for ten minutes
+PERMANENT_REDIRECT_LIFETIME = 60 * 60 * 24 * 7
+NO_PLUGIN_LIFETIME = 60 * 10
+
 
 def print_small_exception(start_after):
     type, value, traceback_ = sys.exc_info()
@@ -43,6 +55,31 @@ def print_small_exception(start_after):
     sys.stderr.write("\n")
 
 
+def redirect_lifetime(res):
+    """Returns how many seconds the redirects of a response may be
+    cached for, the shortest lifetime of its redirect responses."""
+    lifetimes = []
+    for redirect in res.history:
+        cache_control = redirect.headers.get("Cache-Control", "").lower()
+        max_age = re.search(r"max-age=(\d+)", cache_control)
+        expires = parsedate_tz(redirect.headers.get("Expires", ""))
+        date = parsedate_tz(redirect.headers.get("Date", ""))
+
+        if "no-store" in cache_control or "no-cache" in cache_control:
+            return 0
+        elif max_age:
+            lifetimes.append(int(max_age.group(1)))
+        elif expires:
+            lifetimes.append(mktime_tz(expires) - (mktime_tz(date) if date else time()))
+        elif redirect.status_code in (301, 308):
+            lifetimes.append(PERMANENT_REDIRECT_LIFETIME)
+        else:
+            # Temporary redirects are only cached when the server allows it
+            return 0
+
+    return max(min(lifetimes), 0) if lifetimes else 0
+
+
 class PythonDeprecatedWarning(UserWarning):
     pass
 
@@ -75,25 +112,45 @@ class Streamlink(object):
             "hls-playlist-reload-time": "default",
             "hls-start-offset": 0,
             "hls-duration": None,
+            "hls-mux-internal": False,
+            "hls-fast-start": False,
+            "hls-low-latency": False,
+            "hls-abr": False,
+            "hls-abr-min": None,
+            "hls-abr-max": None,
             "http-stream-timeout": 60.0,
             "ringbuffer-size": 1024 * 1024 * 16,  # 16 MB
+            "ringbuffer-budget": 0,
+            "ringbuffer-spill-size": 0,
+            "ringbuffer-spill-time": None,
+            "ringbuffer-spill-dir": None,
             "rtmp-timeout": 60.0,
             "rtmp-rtmpdump": is_win32 and "rtmpdump.exe" or "rtmpdump",
             "rtmp-proxy": None,
             "stream-segment-attempts": 3,
+            "stream-segment-hedge": None,
             "stream-segment-threads": 1,
             "stream-segment-timeout": 10.0,
+            "stream-split-connections": 4,
+            "stream-split-threshold": None,
             "stream-timeout": 60.0,
+            "streams-cache-ttl": 0,
             "subprocess-errorlog": False,
             "subprocess-errorlog-path": None,
             "ffmpeg-ffmpeg": None,
             "ffmpeg-video-transcode": "copy",
             "ffmpeg-audio-transcode": "copy",
+            "ffmpeg-pipe-size": 1024 * 1024,  # 1 MB
             "locale": None,
+            "redirect-cache": True,
             "user-input-requester": None
         })
         if options:
             self.options.update(options)
+        self.buffer_pool = BufferPool(self.options.get("ringbuffer-budget"))
+        self.metrics = MetricsRegistry()
+        self.streams_cache = StreamsCache()
+        self.redirect_cache = Cache(filename="redirect-cache.json")
         self.plugins = OrderedDict({})
         self.load_builtin_plugins()
         self._logger = None
@@ -153,6 +210,35 @@ class Streamlink(object):
         hls-timeout              (float) Timeout for reading data from
                                  HLS streams, default: ``60.0``
 
+        hls-mux-internal         (bool) Mux HLS streams with separate
+                                 audio tracks in-process instead of
+                                 using FFmpeg, default: ``False``.
+                                 The in-process muxer is always used
+                                 when FFmpeg is not available.
+
+        hls-fast-start           (bool) Prefetch the media playlists of
+                                 variant playlists and download the
+                                 first segments of a HLS stream in
+                                 parallel to start faster,
+                                 default: ``False``
+
+        hls-low-latency          (bool) Download the partial segments of
+                                 Low-Latency HLS streams close to the
+                                 live edge, default: ``False``
+
+        hls-abr                  (bool) Add an ``adaptive`` stream to
+                                 variant playlists, which switches
+                                 between the variants depending on the
+                                 download throughput, default: ``False``
+
+        hls-abr-min              (str) Lowest quality the adaptive stream
+                                 switches to, e.g. ``360p``,
+                                 default: ``None``
+
+        hls-abr-max              (str) Highest quality the adaptive
+                                 stream switches to, e.g. ``1080p``,
+                                 default: ``None``
+
         http-proxy               (str) Specify a HTTP proxy to use for
                                  all HTTP requests
 
@@ -191,6 +277,16 @@ class Streamlink(object):
         http-stream-timeout      (float) Timeout for reading data from
                                  HTTP streams, default: ``60.0``
 
+        http-dns-cache-ttl       (float) Cache the addresses of host names
+                                 for this many seconds and look up the
+                                 segment hosts of HLS playlists in
+                                 advance, default: ``None`` (disabled)
+
+        http-happy-eyeballs      (bool) Connect to the IPv6 and IPv4
+                                 addresses of a host concurrently and use
+                                 the first connection (RFC 8305),
+                                 default: ``False``
+
         subprocess-errorlog      (bool) Log errors from subprocesses to
                                  a file located in the temp directory
 
@@ -201,6 +297,24 @@ class Streamlink(object):
                                  buffer used by most stream types,
                                  default: ``16777216`` (16MB)
 
+        ringbuffer-budget        (int) The total size of the ring buffers
+                                 of all streams of the session, which
+                                 are resized to a share of it based on
+                                 their bitrate and fill level,
+                                 default: ``0`` (unlimited)
+
+        ringbuffer-spill-size    (int) Let the ring buffer of segmented
+                                 streams spill up to this many bytes to
+                                 a memory-mapped temporary file once it
+                                 is full, default: ``0`` (disabled)
+
+        ringbuffer-spill-time    (float) Stop spilling once the oldest
+                                 spilled data is older than this many
+                                 seconds, default: ``None``
+
+        ringbuffer-spill-dir     (str) The directory to create the spill
+                                 file in, default: the temp directory
+
         rtmp-proxy               (str) Specify a proxy (SOCKS) that RTMP
                                  streams will use
 
@@ -229,11 +343,23 @@ class Streamlink(object):
                                  audio when muxing with ffmpeg
                                  e.g. ``aac``
 
+        ffmpeg-pipe-size         (int) The size of the pipes used to pass
+                                 data to and from ffmpeg and of the chunks
+                                 copied into them, default: ``1048576``
+                                 (1MB)
+
         stream-segment-attempts  (int) How many attempts should be done
                                  to download each segment, default: ``3``.
                                  General option used by streams not
                                  covered by other options.
 
+        stream-segment-hedge     (float) Send a duplicate request for a
+                                 segment if no response was received
+                                 within this percentile of the recent
+                                 response times, e.g. ``95``. The first
+                                 response is used, default: ``None``
+                                 (disabled)
+
         stream-segment-threads   (int) The size of the thread pool used
                                  to download segments, default: ``1``.
                                  General option used by streams not
@@ -244,15 +370,36 @@ class Streamlink(object):
                                  General option used by streams not
                                  covered by other options.
 
+        stream-split-connections (int) How many concurrent Range requests
+                                 are used to download a split segment or
+                                 file, default: ``4``
+
+        stream-split-threshold   (int) Segments and HTTP streams of at
+                                 least this many bytes are downloaded in
+                                 parts with concurrent Range requests, if
+                                 the server supports them, default:
+                                 ``None`` (disabled)
+
         stream-timeout           (float) Timeout for reading data from
                                  stream, default: ``60.0``.
                                  General option used by streams not
                                  covered by other options.
 
+        streams-cache-ttl        (float) Cache the streams found by the
+                                 plugins for a URL and options for this
+                                 many seconds, or until the tokens of the
+                                 plugin expire, default: ``0`` (disabled)
+
         locale                   (str) Locale setting, in the RFC 1766 format
                                  eg. en_US or es_ES
                                  default: ``system locale``.
 
+        redirect-cache           (bool) Cache the final URLs of redirects
+                                 which lead to a plugin as allowed by
+                                 their caching headers, and URLs which
+                                 lead to no plugin for ten minutes,
+                                 default: ``True``
+
         user-input-requester     (UserInputRequester) instance of UserInputRequester
                                  to collect input from the user at runtime. Must be
                                  set before the plugins are loaded.
@@ -310,6 +457,13 @@ class Streamlink(object):
             self.http.cert = value
         elif key == "http-timeout":
             self.http.timeout = value
+        elif key == "http-dns-cache-ttl":
+            self.http.resolver = api.DNSCache(ttl=value) if value else None
+        elif key == "http-happy-eyeballs":
+            self.http.happy_eyeballs = value
+        elif key == "ringbuffer-budget":
+            self.buffer_pool.set_budget(value)
+            self.options.set(key, value)
         else:
             self.options.set(key, value)
 
@@ -345,6 +499,10 @@ class Streamlink(object):
             return self.http.cert
         elif key == "http-timeout":
             return self.http.timeout
+        elif key == "http-dns-cache-ttl":
+            return getattr(self.http.resolver, "ttl", None)
+        elif key == "http-happy-eyeballs":
+            return self.http.happy_eyeballs
         else:
             return self.options.get(key)
 
@@ -418,6 +576,14 @@ class Streamlink(object):
             return available_plugins[0](url)
 
         if follow_redirect:
+            cache = self.get_option("redirect-cache")
+            # The final URL of a redirect, or None if the URL leads to no plugin
+            cached = cache and self.redirect_cache.get(url, False)
+            if cached is None:
+                raise NoPluginError
+            if cached:
+                return self.resolve_url(cached, follow_redirect=follow_redirect)
+
             # Attempt to handle a redirect URL
             try:
                 res = self.http.head(url, allow_redirects=True, acceptable_status=[501])
@@ -425,12 +591,22 @@ class Streamlink(object):
                 # Fall back to GET request if server doesn't handle HEAD.
                 if res.status_code == 501:
                     res = self.http.get(url, stream=True)
+            except PluginError:
+                # Failed requests are not cached
+                raise NoPluginError
 
+            try:
                 if res.url != url:
+                    lifetime = redirect_lifetime(res)
+                    if cache and lifetime:
+                        self.redirect_cache.set(url, res.url, expires=lifetime)
                     return self.resolve_url(res.url, follow_redirect=follow_redirect)
-            except PluginError:
+            except NoPluginError:
                 pass
 
+            if cache:
+                self.redirect_cache.set(url, None, expires=NO_PLUGIN_LIFETIME)
+
         raise NoPluginError
 
     def resolve_url_no_redirect(self, url):
@@ -457,6 +633,37 @@ class Streamlink(object):
         plugin = self.resolve_url(url)
         return plugin.streams(**params)
 
+    def streams_many(self, urls, concurrency=4, **params):
+        """Finds the streams of several URLs concurrently.
+
+        Yields a ``(url, streams, error)`` tuple for each URL as soon as
+        its streams are found, where *error* is the exception raised for
+        the URL, or ``None``. The URLs share the HTTP session and caches
+        of this session.
+
+        *params* are passed to :func:`Plugin.streams`.
+
+        :param urls: the URLs to find the streams of
+        :param concurrency: how many URLs to resolve at once
+        """
+
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        futures = {}
+        try:
+            for url in urls:
+                futures[executor.submit(self.streams, url, **params)] = url
+
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as err:
+                    yield futures[future], None, err
+        finally:
+            # The caller may stop early
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
     def get_plugins(self):
         """Returns the loaded plugins for the session."""
 
@@ -13,7 +13,7 @@ from ..exceptions import StreamError
 from ..utils import swfdecompress
 
 from ..packages.flashmedia import FLV, FLVError
-from ..packages.flashmedia.tag import ScriptData
+from ..packages.flashmedia.tag import ScriptData, TAG_TYPE_SCRIPT
 import logging
 
 log = logging.getLogger(__name__)
@@ -115,7 +115,7 @@ class AkamaiHDStreamIO(io.IOBase):
 
     def handshake(self, fd):
         try:
-            self.flv = FLV(fd)
+            self.flv = FLV(fd, lazy=True)
         except FLVError as err:
             raise StreamError(str(err))
 
@@ -133,7 +133,7 @@ class AkamaiHDStreamIO(io.IOBase):
                 break
 
     def process_tag(self, tag, exception=IOError):
-        if isinstance(tag.data, ScriptData) and tag.data.name == "onEdge":
+        if tag.type == TAG_TYPE_SCRIPT and isinstance(tag.data, ScriptData) and tag.data.name == "onEdge":
             self._on_edge(tag.data.value, exception=exception)
 
         self.buffer.write(tag.serialize())
@@ -3,13 +3,14 @@ import itertools
 import logging
 import datetime
 import os.path
+from time import time
 
 import requests
 from streamlink import StreamError, PluginError
 from streamlink.compat import urlparse, urlunparse
 from streamlink.stream.http import valid_args, normalize_key
 from streamlink.stream.stream import Stream
-from streamlink.stream.dash_manifest import MPD, sleeper, sleep_until, utc, freeze_timeline
+from streamlink.stream.dash_manifest import MPD, sleeper, utc, freeze_timeline, datetime_to_seconds
 from streamlink.stream.ffmpegmux import FFMPEGMuxer
 from streamlink.stream.segmented import SegmentedStreamReader, SegmentedStreamWorker, SegmentedStreamWriter
 from streamlink.utils import parse_xml
@@ -26,6 +27,15 @@ class DASHStreamWriter(SegmentedStreamWriter):
         kwargs["timeout"] = options.get("dash-segment-timeout")
         SegmentedStreamWriter.__init__(self, reader, *args, **kwargs)
 
+    def available_at(self, segment):
+        now = datetime.datetime.now(tz=utc)
+        if segment.available_at > now:
+            time_to_wait = (segment.available_at - now).total_seconds()
+            fname = os.path.basename(urlparse(segment.url).path)
+            log.debug("Waiting for segment: {fname} ({wait:.01f}s)".format(fname=fname, wait=time_to_wait))
+
+        return datetime_to_seconds(segment.available_at)
+
     def fetch(self, segment, retries=None):
         if self.closed or not retries:
             return
@@ -33,12 +43,6 @@ class DASHStreamWriter(SegmentedStreamWriter):
         try:
             request_args = copy.deepcopy(self.reader.stream.args)
             headers = request_args.pop("headers", {})
-            now = datetime.datetime.now(tz=utc)
-            if segment.available_at > now:
-                time_to_wait = (segment.available_at - now).total_seconds()
-                fname = os.path.basename(urlparse(segment.url).path)
-                log.debug("Waiting for segment: {fname} ({wait:.01f}s)".format(fname=fname, wait=time_to_wait))
-                sleep_until(segment.available_at)
 
             if segment.range:
                 start, length = segment.range
@@ -48,23 +52,49 @@ class DASHStreamWriter(SegmentedStreamWriter):
                     end = ""
                 headers["Range"] = "bytes={0}-{1}".format(start, end)
 
-            return self.session.http.get(segment.url,
-                                         timeout=self.timeout,
-                                         exception=StreamError,
-                                         headers=headers,
-                                         **request_args)
+            start = time()
+            res = self.request(segment.url,
+                               timeout=self.timeout,
+                               exception=StreamError,
+                               headers=headers,
+                               **request_args)
+
+            self.reader.metrics.observe("segment_request_seconds", res.elapsed.total_seconds())
+            self.reader.metrics.inc("segment_download_seconds_total", time() - start)
+
+            return res
         except StreamError as err:
             log.error("Failed to open segment {0}: {1}", segment.url, err)
+            if retries > 1:
+                self.reader.metrics.inc("segment_retries_total")
+            else:
+                self.reader.metrics.inc("segment_errors_total")
             return self.fetch(segment, retries - 1)
 
     def write(self, segment, res, chunk_size=8192):
+        window = self.reader.segment_window
+        segment_data = []
+        size = 0
+
         for chunk in res.iter_content(chunk_size):
             if not self.closed:
                 self.reader.buffer.write(chunk)
+                size += len(chunk)
+                if window:
+                    segment_data.append(chunk)
             else:
                 log.warning("Download of segment: {} aborted".format(segment.url))
                 return
 
+        self.reader.metrics.inc("segments_total")
+        self.reader.metrics.inc("segment_bytes_total", size)
+
+        if window:
+            if segment.init and not segment.content:
+                window.set_map(b"".join(segment_data))
+            else:
+                window.add(b"".join(segment_data), segment.duration)
+
         log.debug("Download of segment: {} complete".format(segment.url))
 
 
@@ -156,6 +186,7 @@ class DASHStream(Stream):
         self.audio_representation = audio_representation
         self.period = period
         self.args = args
+        self.segment_window = None
 
     def __json__(self):
         req = requests.Request(method="GET", url=self.mpd.url, **valid_args(self.args))
@@ -244,6 +275,10 @@ class DASHStream(Stream):
         return ret
 
     def open(self):
+        if self.segment_window and self.video_representation and self.audio_representation:
+            # The muxed output of both representations has no segments
+            raise StreamError("DASH streams with separate audio and video can't be served as HLS")
+
         if self.video_representation:
             video = DASHStreamReader(self, self.video_representation.id, self.video_representation.mimeType)
             video.open()
@@ -444,8 +444,8 @@ class SegmentTemplate(MPDNode):
             init_url = self.format_initialization(**kwargs)
             if init_url:
                 yield Segment(init_url, 0, True, False)
-        for media_url, available_at in self.format_media(**kwargs):
-            yield Segment(media_url, self.duration_seconds, False, True, available_at)
+        for media_url, available_at, duration in self.format_media(**kwargs):
+            yield Segment(media_url, duration, False, True, available_at)
 
     def make_url(self, url):
         """
@@ -538,25 +538,27 @@ class SegmentTemplate(MPDNode):
                     if self.root.timelines[self.parent.id] == -1 and publish_time - available_at >= suggested_delay:
                         break
 
-                    timeline.append((url, available_at, segment.t))
+                    timeline.append((url, available_at, segment.t, duration.total_seconds()))
 
                     available_at -= duration  # walk backwards in time
 
                 # return the segments in chronological order
-                for url, available_at, t in reversed(timeline):
+                for url, available_at, t, duration in reversed(timeline):
                     if t > self.root.timelines[self.parent.id]:
                         self.root.timelines[self.parent.id] = t
-                        yield (url, available_at)
+                        yield (url, available_at, duration)
 
             else:
                 for segment, n in zip(self.segmentTimeline.segments, count(self.startNumber)):
                     yield (self.make_url(self.media(Time=segment.t, Number=n, **kwargs)),
-                           datetime.datetime.now(tz=utc))
+                           datetime.datetime.now(tz=utc),
+                           segment.d / float(self.timescale))
 
         else:
             for number, available_at in self.segment_numbers():
                 yield (self.make_url(self.media(Number=number, **kwargs)),
-                       available_at)
+                       available_at,
+                       self.duration_seconds)
 
 
 class Representation(MPDNode):
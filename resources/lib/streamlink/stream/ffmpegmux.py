@@ -1,6 +1,8 @@
+import errno
 import os
 import random
 import threading
+import time
 
 import subprocess
 
@@ -10,6 +12,7 @@ from streamlink import StreamError
 from streamlink.stream import Stream
 from streamlink.stream.stream import StreamIO
 from streamlink.utils import NamedPipe
+from streamlink.utils.named_pipe import set_pipe_size
 from streamlink.compat import devnull, which
 import logging
 
@@ -62,21 +65,64 @@ class FFMPEGMuxer(StreamIO):
     def copy_to_pipe(self, stream, pipe):
         log.debug("Starting copy to pipe: {0}".format(pipe.path))
         pipe.open("wb")
-        while not stream.closed:
-            try:
-                data = stream.read(8192)
-                if len(data):
-                    pipe.write(data)
-                else:
-                    break
-            except IOError:
-                log.error("Pipe copy aborted: {0}".format(pipe.path))
-                return
+        read_time = 0.0
+        try:
+            if not self._copy_fd_to_pipe(stream, pipe):
+                while not stream.closed:
+                    start = time.time()
+                    data = stream.read(self.copy_size)
+                    read_time += time.time() - start
+                    if len(data):
+                        pipe.write(data)
+                    else:
+                        break
+        except IOError:
+            log.error("Pipe copy aborted: {0}".format(pipe.path))
+            return
         try:
             pipe.close()
         except IOError:  # might fail closing, but that should be ok for the pipe
             pass
-        log.debug("Pipe copy complete: {0}".format(pipe.path))
+        log.debug("Pipe copy complete: {0} ({1} bytes, {2:.2f}s waiting for input, {3:.2f}s waiting for ffmpeg)".format(
+            pipe.path, pipe.bytes_written, read_time, pipe.write_time))
+
+    def _copy_fd_to_pipe(self, stream, pipe):
+        """Copies file descriptor backed streams in the kernel.
+
+        Returns False if the stream or the platform does not support it.
+        """
+        if hasattr(os, "splice"):
+            copy = os.splice
+        elif hasattr(os, "sendfile"):
+            def copy(src, dst, count):
+                return os.sendfile(dst, src, None, count)
+        else:
+            return False
+
+        if pipe.pipe:
+            return False
+
+        try:
+            src = stream.fileno()
+        except (AttributeError, IOError, OSError, ValueError):
+            return False
+
+        dst = pipe.fileno()
+        while True:
+            start = time.time()
+            try:
+                copied = copy(src, dst, self.copy_size)
+            except OSError as err:
+                if pipe.bytes_written == 0 and err.errno in (errno.EINVAL, errno.ENOSYS):
+                    # unsupported by the file system, use the regular copy instead
+                    return False
+                raise IOError(err)
+            finally:
+                pipe.write_time += time.time() - start
+
+            if not copied:
+                return True
+            pipe.bytes_written += copied
 
     def __init__(self, session, *streams, **options):
         if not self.is_usable(session):
@@ -85,8 +131,11 @@ class FFMPEGMuxer(StreamIO):
         self.session = session
         self.process = None
         self.streams = streams
+        self.pipe_size = session.options.get("ffmpeg-pipe-size")
+        self.copy_size = self.pipe_size or 8192
 
-        self.pipes = [NamedPipe("ffmpeg-{0}-{1}".format(os.getpid(), random.randint(0, 1000))) for _ in self.streams]
+        self.pipes = [NamedPipe("ffmpeg-{0}-{1}".format(os.getpid(), random.randint(0, 1000)), size=self.pipe_size)
+                      for _ in self.streams]
         self.pipe_threads = [threading.Thread(target=self.copy_to_pipe, args=(self, stream, np))
                              for stream, np in
                              zip(self.streams, self.pipes)]
@@ -133,7 +182,10 @@ class FFMPEGMuxer(StreamIO):
         for t in self.pipe_threads:
             t.daemon = True
             t.start()
-        self.process = subprocess.Popen(self._cmd, stdout=subprocess.PIPE, stdin=subprocess.PIPE, stderr=self.errorlog)
+        self.process = subprocess.Popen(self._cmd, stdout=subprocess.PIPE, stdin=subprocess.PIPE, stderr=self.errorlog,
+                                        bufsize=self.pipe_size or -1)
+        if self.pipe_size:
+            set_pipe_size(self.process.stdout.fileno(), self.pipe_size)
 
         return self
 
@@ -154,6 +206,12 @@ class FFMPEGMuxer(StreamIO):
         data = self.process.stdout.read(size)
         return data
 
+    @property
+    def pipe_stats(self):
+        """Bytes copied and time spent blocked writing to each input pipe."""
+        return [dict(path=pipe.path, bytes=pipe.bytes_written, write_time=pipe.write_time)
+                for pipe in self.pipes]
+
     def close(self):
         log.debug("Closing ffmpeg thread")
         if self.process:
@@ -1,6 +1,7 @@
 from __future__ import division
 
 import logging
+import struct
 from collections import namedtuple
 from io import IOBase
 from itertools import chain, islice
@@ -9,21 +10,26 @@ from threading import Thread
 from ..buffers import RingBuffer
 from ..packages.flashmedia import FLVError
 from ..packages.flashmedia.tag import (AudioData, AACAudioData, VideoData,
-                                       AVCVideoData, VideoCommandFrame,
-                                       Header, ScriptData, Tag)
+                                       AVCVideoData, Header, ScriptData, Tag)
 from ..packages.flashmedia.tag import (AAC_PACKET_TYPE_SEQUENCE_HEADER,
                                        AVC_PACKET_TYPE_SEQUENCE_HEADER,
                                        AUDIO_CODEC_ID_AAC,
                                        VIDEO_CODEC_ID_AVC,
+                                       VIDEO_FRAME_TYPE_COMMAND_FRAME,
                                        TAG_TYPE_AUDIO,
+                                       TAG_TYPE_SCRIPT,
                                        TAG_TYPE_VIDEO)
 
 __all__ = ["extract_flv_header_tags", "FLVTagConcat", "FLVTagConcatIO"]
 log = logging.getLogger(__name__)
 FLVHeaderTags = namedtuple("FLVHeaderTags", "metadata aac vc")
 
+FLV_HEADER_SIZE = 13  # Header + size of tag 0
+TAG_HEADER_SIZE = 11
+TAG_TYPES = (TAG_TYPE_AUDIO, TAG_TYPE_VIDEO, TAG_TYPE_SCRIPT)
 
-def iter_flv_tags(fd=None, buf=None, strict=False, skip_header=False):
+
+def iter_flv_tags(fd=None, buf=None, strict=False, skip_header=False, lazy=False):
     if not (fd or buf):
         return
 
@@ -37,9 +43,9 @@ def iter_flv_tags(fd=None, buf=None, strict=False, skip_header=False):
     while fd or buf and offset < len(buf):
         try:
             if fd:
-                tag = Tag.deserialize(fd, strict=strict)
+                tag = Tag.deserialize(fd, strict=strict, lazy=lazy)
             elif buf:
-                tag, offset = Tag.deserialize_from(buf, offset, strict=strict)
+                tag, offset = Tag.deserialize_from(buf, offset, strict=strict, lazy=lazy)
         except (IOError, FLVError) as err:
             if "Insufficient tag header" in str(err):
                 break
@@ -49,6 +55,91 @@ def iter_flv_tags(fd=None, buf=None, strict=False, skip_header=False):
         yield tag
 
 
+class TagHeader(object):
+    """The header of a tag which has not been deserialised."""
+
+    __slots__ = ("type", "filter", "timestamp", "offset", "data_size")
+
+    def __init__(self, type, filter, timestamp, offset, data_size):
+        self.type = type
+        self.filter = filter
+        self.timestamp = timestamp
+        self.offset = offset
+        self.data_size = data_size
+
+    @property
+    def end(self):
+        return self.offset + TAG_HEADER_SIZE + self.data_size + 4
+
+
+def iter_flv_tag_headers(buf, offset=0, end=None):
+    """Iterates over the tag headers in buf without reading the payloads."""
+    buf_size = len(buf) if end is None else end
+
+    while offset < buf_size:
+        if buf_size - offset < TAG_HEADER_SIZE:
+            break
+
+        flags, size_high, size_low, ts_high, ts_low, ts_ext = struct.unpack_from(">BBHBHB", buf, offset)
+        tag = TagHeader(flags & 0x1F, bool(flags & 0x20),
+                        (ts_ext << 24) | (ts_high << 16) | ts_low,
+                        offset, (size_high << 16) | size_low)
+
+        if tag.type not in TAG_TYPES:
+            raise IOError("Unknown tag type!")
+
+        if tag.end > buf_size:
+            raise IOError("Insufficient tag data")
+
+        yield tag
+        offset = tag.end
+
+
+def tag_media_info(tag):
+    """Returns the media type, codec, frame type and AAC/AVC packet type
+    of a deserialised tag."""
+    if not tag.decoded:
+        return payload_media_info(tag.type, tag.filter, tag.payload[:2].tobytes())
+
+    if isinstance(tag.data, AudioData):
+        packet_type = tag.data.data.type if isinstance(tag.data.data, AACAudioData) else None
+        return TAG_TYPE_AUDIO, tag.data.codec, None, packet_type
+    elif isinstance(tag.data, VideoData):
+        packet_type = tag.data.data.type if isinstance(tag.data.data, AVCVideoData) else None
+        return TAG_TYPE_VIDEO, tag.data.codec, tag.data.type, packet_type
+
+    return None, None, None, None
+
+
+def tag_header_media_info(buf, tag):
+    """Returns the same as tag_media_info by only reading the first
+    bytes of the tag payload."""
+    offset = tag.offset + TAG_HEADER_SIZE
+
+    return payload_media_info(tag.type, tag.filter,
+                              buf[offset:offset + min(tag.data_size, 2)])
+
+
+def payload_media_info(tag_type, tag_filter, head):
+    """Returns the same as tag_media_info from the first two bytes of
+    a tag payload."""
+    if not head or tag_filter or tag_type == TAG_TYPE_SCRIPT:
+        return None, None, None, None
+
+    flags = bytearray(head)
+
+    if tag_type == TAG_TYPE_AUDIO:
+        codec = flags[0] >> 4
+        packet_type = flags[1] if codec == AUDIO_CODEC_ID_AAC and len(flags) > 1 else None
+        return TAG_TYPE_AUDIO, codec, None, packet_type
+    else:
+        frame_type, codec = flags[0] >> 4, flags[0] & 0x0F
+        packet_type = None
+        if codec == VIDEO_CODEC_ID_AVC and frame_type != VIDEO_FRAME_TYPE_COMMAND_FRAME and len(flags) > 1:
+            packet_type = flags[1]
+        return TAG_TYPE_VIDEO, codec, frame_type, packet_type
+
+
 def extract_flv_header_tags(stream):
     fd = stream.open()
     metadata = aac_header = avc_header = None
@@ -101,19 +192,33 @@ class FLVTagConcat(object):
         if tag.filter:
             raise IOError("Tag has filter flag set, probably encrypted")
 
+        verified = self.verify_media(*tag_media_info(tag))
+
+        if verified and tag.type == TAG_TYPE_SCRIPT and isinstance(tag.data, ScriptData):
+            if tag.data.name == "onMetaData":
+                if self.duration:
+                    tag.data.value["duration"] = self.duration
+                elif "duration" in tag.data.value:
+                    del tag.data.value["duration"]
+            else:
+                return False
+
+        return verified
+
+    def verify_media(self, media_type, codec, frame_type, packet_type):
         # Only AAC and AVC has detectable headers
-        if isinstance(tag.data, AudioData) and tag.data.codec != AUDIO_CODEC_ID_AAC:
+        if media_type == TAG_TYPE_AUDIO and codec != AUDIO_CODEC_ID_AAC:
             self.audio_header_written = True
-        if isinstance(tag.data, VideoData) and tag.data.codec != VIDEO_CODEC_ID_AVC:
+        if media_type == TAG_TYPE_VIDEO and codec != VIDEO_CODEC_ID_AVC:
             self.video_header_written = True
 
         # Make sure there is no timestamp gap between audio and video when syncing
         if self.sync_headers and self.timestamps_sub and not self.headers_written:
             self.timestamps_sub = {}
 
-        if isinstance(tag.data, AudioData):
-            if isinstance(tag.data.data, AACAudioData):
-                if tag.data.data.type == AAC_PACKET_TYPE_SEQUENCE_HEADER:
+        if media_type == TAG_TYPE_AUDIO:
+            if codec == AUDIO_CODEC_ID_AAC:
+                if packet_type == AAC_PACKET_TYPE_SEQUENCE_HEADER:
                     if self.audio_header_written:
                         return
 
@@ -128,9 +233,11 @@ class FLVTagConcat(object):
                 if self.sync_headers and not self.headers_written:
                     return
 
-        elif isinstance(tag.data, VideoData):
-            if isinstance(tag.data.data, AVCVideoData):
-                if tag.data.data.type == AVC_PACKET_TYPE_SEQUENCE_HEADER:
+        elif media_type == TAG_TYPE_VIDEO:
+            if frame_type == VIDEO_FRAME_TYPE_COMMAND_FRAME:
+                return
+            elif codec == VIDEO_CODEC_ID_AVC:
+                if packet_type == AVC_PACKET_TYPE_SEQUENCE_HEADER:
                     if self.video_header_written:
                         return
 
@@ -141,21 +248,10 @@ class FLVTagConcat(object):
 
                     if not self.video_header_written:
                         return
-            elif isinstance(tag.data.data, VideoCommandFrame):
-                return
             else:
                 if self.sync_headers and not self.headers_written:
                     return
 
-        elif isinstance(tag.data, ScriptData):
-            if tag.data.name == "onMetaData":
-                if self.duration:
-                    tag.data.value["duration"] = self.duration
-                elif "duration" in tag.data.value:
-                    del tag.data.value["duration"]
-            else:
-                return False
-
         return True
 
     def adjust_tag_gap(self, tag):
@@ -197,7 +293,7 @@ class FLVTagConcat(object):
             skip_header = not not self.tags
 
         tags_iterator = filter(None, self.tags)
-        flv_iterator = iter_flv_tags(fd=fd, buf=buf, skip_header=skip_header)
+        flv_iterator = iter_flv_tags(fd=fd, buf=buf, skip_header=skip_header, lazy=True)
 
         for tag in chain(tags_iterator, flv_iterator):
             yield tag
@@ -236,6 +332,90 @@ class FLVTagConcat(object):
 
         self.tags = []
 
+    def iter_buffer_chunks(self, buf, skip_header=None, offset=0, end=None):
+        """Same as iter_chunks, but for a bytearray of tags between offset
+        and end.
+
+        Audio and video tags are verified by their header bytes, their
+        timestamps are rewritten in place and consecutive tags are returned
+        as a single chunk. Only script tags are deserialised.
+        """
+        if skip_header is None:
+            skip_header = not not self.tags
+
+        if not skip_header:
+            if buf[offset:offset + 3] != b"FLV":
+                raise IOError("Invalid FLV header")
+            offset += FLV_HEADER_SIZE
+
+        view = memoryview(buf)
+        timestamps = dict(self.timestamps_add)
+        tag_iterator = chain(filter(None, self.tags), iter_flv_tag_headers(buf, offset, end))
+
+        if not self.flv_header_written:
+            analyzed_tags = self.analyze_tags(tag_iterator)
+        else:
+            analyzed_tags = []
+
+        chunk_start = chunk_end = None
+        for tag in chain(analyzed_tags, tag_iterator):
+            if not self.flv_header_written:
+                flv_header = Header(has_video=self.has_video,
+                                    has_audio=self.has_audio)
+                yield flv_header.serialize()
+                self.flv_header_written = True
+
+            if isinstance(tag, TagHeader) and tag.type == TAG_TYPE_SCRIPT:
+                try:
+                    tag, _ = Tag.deserialize_from(bytes(buf[tag.offset:tag.end]), 0)
+                except FLVError as err:
+                    raise IOError(err)
+
+            if isinstance(tag, TagHeader):
+                if tag.filter:
+                    raise IOError("Tag has filter flag set, probably encrypted")
+                verified = self.verify_media(*tag_header_media_info(buf, tag))
+            else:
+                verified = self.verify_tag(tag)
+
+            if not verified:
+                continue
+
+            self.adjust_tag_gap(tag)
+            self.adjust_tag_timestamp(tag)
+
+            if self.duration:
+                norm_timestamp = tag.timestamp / 1000
+                if norm_timestamp > self.duration:
+                    break
+
+            if isinstance(tag, TagHeader):
+                struct.pack_into(">BHB", buf, tag.offset + 4,
+                                 (tag.timestamp >> 16) & 0xFF, tag.timestamp & 0xFFFF,
+                                 (tag.timestamp >> 24) & 0x7F)
+                struct.pack_into(">I", buf, tag.end - 4, TAG_HEADER_SIZE + tag.data_size)
+
+                if chunk_end != tag.offset:
+                    if chunk_start is not None:
+                        yield view[chunk_start:chunk_end].tobytes()
+                    chunk_start = tag.offset
+                chunk_end = tag.end
+            else:
+                if chunk_start is not None:
+                    yield view[chunk_start:chunk_end].tobytes()
+                    chunk_start = chunk_end = None
+                yield tag.serialize()
+
+            timestamps[tag.type] = tag.timestamp
+
+        if chunk_start is not None:
+            yield view[chunk_start:chunk_end].tobytes()
+
+        if not self.flatten_timestamps:
+            self.timestamps_add = timestamps
+
+        self.tags = []
+
 
 class FLVTagConcatWorker(Thread):
     def __init__(self, iterator, stream):
@@ -289,6 +469,7 @@ class FLVTagConcatIO(IOBase):
 
     def open(self, iterator):
         self.buffer = RingBuffer(self.session.get_option("ringbuffer-size"))
+        self.session.buffer_pool.register(self.buffer, type(self).__name__)
         self.worker = self.__worker__(iterator, self)
         self.worker.start()
 
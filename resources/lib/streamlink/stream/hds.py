@@ -6,27 +6,31 @@ import random
 import re
 import os.path
 import string
+import struct
 
 from binascii import unhexlify
+from bisect import bisect_left, bisect_right
 from collections import namedtuple
 from copy import deepcopy
 from hashlib import sha256
 from io import BytesIO
 from math import ceil
+from time import time
+
+from requests.exceptions import RequestException
 
 from .flvconcat import FLVTagConcat
 from .segmented import (SegmentedStreamReader,
                         SegmentedStreamWriter,
                         SegmentedStreamWorker)
 from .stream import Stream
-from .wrappers import StreamIOIterWrapper
 
 from ..cache import Cache
 from ..compat import parse_qsl, urljoin, urlparse, urlunparse, bytes, range
 from ..exceptions import StreamError, PluginError
 from ..utils import absolute_url, swfdecompress
 
-from ..packages.flashmedia import F4V, F4VError
+from ..packages.flashmedia import F4VError
 from ..packages.flashmedia.box import Box
 from ..packages.flashmedia.tag import ScriptData, Tag, TAG_TYPE_SCRIPT
 
@@ -48,6 +52,32 @@ FRAGMENT_URL = "{url}{identifier}{quality}Seg{segment}-Frag{fragment}"
 Fragment = namedtuple("Fragment", "segment fragment duration url")
 
 
+def find_box(buf, box_type):
+    """Returns the start and end offsets of the payload of the first
+    top-level F4V box of the given type in buf."""
+    offset, buf_size = 0, len(buf)
+
+    while buf_size - offset >= 8:
+        size, typ = struct.unpack_from(">I4s", buf, offset)
+        header_size = 8
+
+        if size == 1:
+            if buf_size - offset < 16:
+                break
+            size = struct.unpack_from(">Q", buf, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = buf_size - offset
+
+        if size < header_size:
+            raise F4VError("Invalid box size: {0}".format(size))
+
+        if typ == box_type:
+            return offset + header_size, min(offset + size, buf_size)
+
+        offset += size
+
+
 class HDSStreamWriter(SegmentedStreamWriter):
     def __init__(self, reader, *args, **kwargs):
         options = reader.stream.session.options
@@ -74,30 +104,48 @@ class HDSStreamWriter(SegmentedStreamWriter):
             request_params = self.stream.request_params.copy()
             params = request_params.pop("params", {})
             params.pop("g", None)
-            return self.session.http.get(fragment.url,
-                                         stream=True,
-                                         timeout=self.timeout,
-                                         exception=StreamError,
-                                         params=params,
-                                         **request_params)
+            res = self.request(fragment.url,
+                               stream=True,
+                               timeout=self.timeout,
+                               exception=StreamError,
+                               params=params,
+                               **request_params)
+
+            self.reader.metrics.observe("segment_request_seconds", res.elapsed.total_seconds())
+
+            return res
         except StreamError as err:
             log.error("Failed to open fragment {0}-{1}: {2}",
                       fragment.segment, fragment.fragment, err)
+            if retries > 1:
+                self.reader.metrics.inc("segment_retries_total")
+            else:
+                self.reader.metrics.inc("segment_errors_total")
             return self.fetch(fragment, retries - 1)
 
     def write(self, fragment, res, chunk_size=8192):
-        fd = StreamIOIterWrapper(res.iter_content(chunk_size))
-        self.convert_fragment(fragment, fd)
+        metrics = self.reader.metrics
+        buf = bytearray()
+        start = time()
+        try:
+            for chunk in res.iter_content(chunk_size):
+                buf += chunk
+        except (RequestException, StreamError) as err:
+            log.error("Download of fragment {0}-{1} failed: {2}",
+                      fragment.segment, fragment.fragment, err)
+            metrics.inc("segment_errors_total")
+            return
+        finally:
+            metrics.inc("segment_download_seconds_total", time() - start)
+
+        metrics.inc("segments_total")
+        metrics.inc("segment_bytes_total", len(buf))
 
-    def convert_fragment(self, fragment, fd):
-        mdat = None
+        self.convert_fragment(fragment, buf)
+
+    def convert_fragment(self, fragment, buf):
         try:
-            f4v = F4V(fd, raw_payload=True)
-            # Fast forward to mdat box
-            for box in f4v:
-                if box.type == "mdat":
-                    mdat = box.payload.data
-                    break
+            mdat = find_box(buf, b"mdat")
         except F4VError as err:
             log.error("Failed to parse fragment {0}-{1}: {2}",
                       fragment.segment, fragment.fragment, err)
@@ -109,7 +157,8 @@ class HDSStreamWriter(SegmentedStreamWriter):
             return
 
         try:
-            for chunk in self.concater.iter_chunks(buf=mdat, skip_header=True):
+            start, end = mdat
+            for chunk in self.concater.iter_buffer_chunks(buf, skip_header=True, offset=start, end=end):
                 self.reader.buffer.write(chunk)
 
                 if self.closed:
@@ -144,6 +193,14 @@ class HDSStreamWorker(SegmentedStreamWorker):
         self.invalid_fragments = set()
         self.live_edge = self.session.options.get("hds-live-edge")
 
+        # Run table indexes, rebuilt on every bootstrap update
+        self.fragment_run_starts = []
+        self.fragment_run_durations = []
+        self.segment_run_starts = []
+        self.segment_run_ends = []
+        self.segment_run_segments = []
+        self.segment_runs_reversed = False
+
         self.update_bootstrap()
 
     def update_bootstrap(self):
@@ -163,6 +220,7 @@ class HDSStreamWorker(SegmentedStreamWorker):
         self.fragmentruntable = bootstrap.payload.fragment_run_table_entries[0]
 
         self.first_fragment, last_fragment = self.fragment_count()
+        self.index_fragment_runs()
         fragment_duration = self.fragment_duration(last_fragment)
 
         if last_fragment != self.last_fragment:
@@ -171,6 +229,8 @@ class HDSStreamWorker(SegmentedStreamWorker):
         else:
             bootstrap_changed = False
 
+        self.index_segment_runs()
+
         if self.current_fragment < 0:
             if self.live:
                 current_fragment = last_fragment
@@ -251,10 +311,15 @@ class HDSStreamWorker(SegmentedStreamWorker):
 
         return first_fragment, end_fragment
 
-    def fragment_duration(self, fragment):
-        fragment_duration = 0
+    def index_fragment_runs(self):
+        """Indexes the fragment run table by first fragment.
+
+        Also records the fragments marked as discontinuities and the last
+        fragment of the stream, which only change with the bootstrap.
+        """
         table = self.fragmentruntable.payload.fragment_run_entry_table
         time_scale = self.fragmentruntable.payload.time_scale
+        runs = []
 
         for i, fragmentrun in enumerate(table):
             if fragmentrun.discontinuity_indicator is not None:
@@ -270,21 +335,49 @@ class HDSStreamWorker(SegmentedStreamWorker):
                 elif fragmentrun.discontinuity_indicator > 0:
                     continue
 
-            if fragment >= fragmentrun.first_fragment:
-                fragment_duration = fragmentrun.fragment_duration / time_scale
+            runs.append((fragmentrun.first_fragment,
+                         fragmentrun.fragment_duration / time_scale))
 
-        return fragment_duration
+        # Stable sort, the last of several runs with the same first fragment wins
+        runs.sort(key=lambda run: run[0])
+        self.fragment_run_starts = [first_fragment for first_fragment, duration in runs]
+        self.fragment_run_durations = [duration for first_fragment, duration in runs]
 
-    def segment_from_fragment(self, fragment):
+    def index_segment_runs(self):
+        """Indexes the fragment ranges of the segment run table."""
         table = self.segmentruntable.payload.segment_run_entry_table
+        runs = list(self.iter_segment_table(table)) if table else []
 
-        for segment, start, end in self.iter_segment_table(table):
-            if start - 1 <= fragment <= end:
-                return segment
+        # The table is iterated from the end when it does not start at
+        # the first segment, keep the index in ascending order.
+        self.segment_runs_reversed = bool(table) and table[0].first_segment != 1
+        if self.segment_runs_reversed:
+            runs.reverse()
+
+        self.segment_run_segments = [segment for segment, start, end in runs]
+        self.segment_run_starts = [start - 1 for segment, start, end in runs]
+        self.segment_run_ends = [end for segment, start, end in runs]
+
+    def fragment_duration(self, fragment):
+        i = bisect_right(self.fragment_run_starts, fragment) - 1
+        if i < 0:
+            return 0
+
+        return self.fragment_run_durations[i]
+
+    def segment_from_fragment(self, fragment):
+        # Adjacent runs overlap by one fragment, the run that comes first
+        # in the table iteration order takes precedence.
+        if self.segment_runs_reversed:
+            i = bisect_right(self.segment_run_starts, fragment) - 1
         else:
-            segment = 1
+            i = bisect_left(self.segment_run_ends, fragment)
+
+        if (0 <= i < len(self.segment_run_segments)
+                and self.segment_run_starts[i] <= fragment <= self.segment_run_ends[i]):
+            return self.segment_run_segments[i]
 
-        return segment
+        return 1
 
     def iter_segment_table(self, table):
         # If the first segment in the table starts at the beginning we
@@ -1,24 +1,46 @@
 import logging
 import re
 import struct
+from datetime import timedelta
+from threading import Lock
+from time import time
 
 from collections import defaultdict, namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from Crypto.Cipher import AES
 from requests.exceptions import ChunkedEncodingError
 
 from streamlink.compat import urlparse, str
 from streamlink.exceptions import StreamError
+from streamlink.plugin.plugin import stream_sorting_filter, stream_weight
 from streamlink.stream import hls_playlist
 from streamlink.stream.ffmpegmux import FFMPEGMuxer, MuxedStream
 from streamlink.stream.http import HTTPStream
-from streamlink.stream.segmented import (SegmentedStreamReader,
+from streamlink.stream.segmented import (CompatThreadPoolExecutor,
+                                         SegmentedStreamReader,
                                          SegmentedStreamWriter,
                                          SegmentedStreamWorker)
+from streamlink.stream.tsmux import TSMuxer
 from streamlink.utils import LazyFormatter
 
 log = logging.getLogger(__name__)
 Sequence = namedtuple("Sequence", "num segment")
 
+# Threads used to prefetch the media playlists of a variant playlist
+PREFETCH_THREADS = 4
+# Timeout of the requests which check the media playlists of a variant playlist
+CHECK_STREAMS_TIMEOUT = 5.0
+# Segments with these extensions are packed audio instead of MPEG-TS
+PACKED_AUDIO_EXTENSIONS = (".aac", ".ac3", ".ec3", ".mp3")
+
+# A media playlist of an adaptive stream
+Variant = namedtuple("Variant", "name bandwidth url")
+
+# Adaptive streams use variants of up to this share of the estimated
+# throughput, and only switch down while less is buffered than this
+ABR_SAFETY_FACTOR = 0.8
+ABR_LOW_BUFFER = 10
+
 
 def num_to_iv(n):
     return struct.pack(">8xq", n)
@@ -36,6 +58,49 @@ def pkcs7_decode(paddedData, keySize=16):
     return paddedData[:-val]
 
 
+def is_encrypted(segment):
+    return bool(segment.key and segment.key.method != "NONE")
+
+
+class ThroughputEstimator(object):
+    """Estimates the download throughput in bits per second.
+
+    Downloads are averaged by a fast and a slow exponentially weighted
+    moving average, weighted by their duration. The lower of both is the
+    estimate, so it drops quickly and rises slowly.
+    """
+
+    # Smaller downloads mostly measure the latency
+    MIN_BYTES = 16 * 1024
+
+    def __init__(self, fast_half_life=2.0, slow_half_life=8.0):
+        self.half_lives = (fast_half_life, slow_half_life)
+        self.averages = [0.0, 0.0]
+        self.total_seconds = 0.0
+        self.lock = Lock()
+
+    def add(self, size, seconds):
+        if size < self.MIN_BYTES or seconds <= 0:
+            return
+
+        bps = size * 8 / float(seconds)
+        with self.lock:
+            for i, half_life in enumerate(self.half_lives):
+                alpha = 0.5 ** (seconds / half_life)
+                self.averages[i] = alpha * self.averages[i] + (1 - alpha) * bps
+            self.total_seconds += seconds
+
+    @property
+    def estimate(self):
+        with self.lock:
+            if not self.total_seconds:
+                return None
+
+            # The averages start at zero, correct for it
+            return min(average / (1 - 0.5 ** (self.total_seconds / half_life))
+                       for average, half_life in zip(self.averages, self.half_lives))
+
+
 class HLSStreamWriter(SegmentedStreamWriter):
     def __init__(self, reader, *args, **kwargs):
         options = reader.stream.session.options
@@ -50,6 +115,17 @@ class HLSStreamWriter(SegmentedStreamWriter):
         self.key_uri = None
         self.key_uri_override = options.get("hls-segment-key-uri")
         self.stream_data = options.get("hls-segment-stream-data")
+        # The EXT-X-MAP whose data is the map of the segment window
+        self.window_map = None
+
+        # Fast start downloads the first segments in parallel and streams
+        # the first of them, to write data as soon as possible
+        self.startup_segments = 0
+        self.startup_executor = None
+        self.startup_sequences = []
+        if options.get("hls-fast-start"):
+            self.startup_segments = max(int(options.get("hls-live-edge")), 1)
+            self.startup_executor = CompatThreadPoolExecutor(max_workers=self.startup_segments)
 
         if self.ignore_names:
             # creates a regex from a list of segment names,
@@ -59,6 +135,36 @@ class HLSStreamWriter(SegmentedStreamWriter):
             self.ignore_names_re = re.compile(r"(?:{blacklist})\.ts".format(
                 blacklist=self.ignore_names), re.IGNORECASE)
 
+    def close(self):
+        SegmentedStreamWriter.close(self)
+
+        if self.startup_executor:
+            self.startup_executor.shutdown(wait=True, cancel_futures=True)
+
+    def put(self, sequence):
+        if self.closed or sequence is None or self.startup_segments <= 0:
+            return SegmentedStreamWriter.put(self, sequence)
+
+        self.startup_sequences.append(sequence.num)
+        future = self.startup_executor.submit(self.fetch, sequence,
+                                              retries=self.retries)
+        self.queue(self.futures, (sequence, future))
+
+        self.startup_segments -= 1
+        if self.startup_segments == 0:
+            self.startup_executor.shutdown(wait=False)
+
+    def stream_segment(self, sequence):
+        if sequence.segment.key:
+            return False
+
+        # The other startup segments are downloaded completely by their
+        # threads, streaming would download them one after the other
+        if sequence.num in self.startup_sequences:
+            return sequence.num == self.startup_sequences[0]
+
+        return self.stream_data
+
     def create_decryptor(self, key, sequence):
         if key.method != "AES-128":
             raise StreamError("Unable to decrypt cipher {0}", key.method)
@@ -112,6 +218,28 @@ class HLSStreamWriter(SegmentedStreamWriter):
 
         return request_params
 
+    def update_window_map(self, window, map_):
+        """Downloads the initialization section of the following segments
+        into the segment window, if it has changed."""
+        if map_ == self.window_map:
+            return
+
+        request_params = dict(self.reader.request_params)
+        headers = dict(request_params.pop("headers", {}))
+        if map_.byterange:
+            bytes_start = map_.byterange.offset or 0
+            bytes_end = bytes_start + max(map_.byterange.range - 1, 0)
+            headers["Range"] = "bytes={0}-{1}".format(bytes_start, bytes_end)
+
+        res = self.session.http.get(map_.uri,
+                                    timeout=self.timeout,
+                                    exception=StreamError,
+                                    retries=self.retries,
+                                    headers=headers,
+                                    **request_params)
+        window.set_map(res.content)
+        self.window_map = map_
+
     def fetch(self, sequence, retries=None):
         if self.closed or not retries:
             return
@@ -123,19 +251,47 @@ class HLSStreamWriter(SegmentedStreamWriter):
                 log.debug("Skipping segment {0}".format(sequence.num))
                 return
 
-            return self.session.http.get(sequence.segment.uri,
-                                         stream=(self.stream_data
-                                                 and not sequence.segment.key),
-                                         timeout=self.timeout,
-                                         exception=StreamError,
-                                         retries=self.retries,
-                                         **request_params)
+            start = time()
+            res = self.request(sequence.segment.uri,
+                               stream=self.stream_segment(sequence),
+                               timeout=self.timeout,
+                               exception=StreamError,
+                               retries=self.retries,
+                               **request_params)
+
+            self.reader.metrics.observe("segment_request_seconds", res.elapsed.total_seconds())
+            self.reader.metrics.inc("segment_download_seconds_total", time() - start)
+            if self.reader.throughput and not self.stream_segment(sequence):
+                self.reader.throughput.add(len(res.content), time() - start)
+
+            return res
         except StreamError as err:
             log.error("Failed to open segment {0}: {1}", sequence.num, err)
+            self.reader.metrics.inc("segment_errors_total")
             return
 
     def write(self, sequence, res, chunk_size=8192):
-        if sequence.segment.key and sequence.segment.key.method != "NONE":
+        window = self.reader.segment_window
+        metrics = self.reader.metrics
+        segment_data = []
+        size = 0
+        encrypted = sequence.segment.key and sequence.segment.key.method != "NONE"
+
+        if window and sequence.segment.map:
+            if encrypted:
+                # The initialization section would have to be decrypted as well
+                log.error("Encrypted fragmented MP4 streams can't be served as HLS")
+                self.close()
+                return
+
+            try:
+                self.update_window_map(window, sequence.segment.map)
+            except StreamError as err:
+                log.error("Failed to download the initialization section: {0}", err)
+                self.close()
+                return
+
+        if encrypted:
             try:
                 decryptor = self.create_decryptor(sequence.segment.key,
                                                   sequence.num)
@@ -145,8 +301,10 @@ class HLSStreamWriter(SegmentedStreamWriter):
                 return
 
             data = res.content
+            size = len(data)
             # If the input data is not a multiple of 16, cut off any garbage
             garbage_len = len(data) % 16
+            start = time()
             if garbage_len:
                 log.debug("Cutting off {0} bytes of garbage "
                           "before decrypting", garbage_len)
@@ -154,15 +312,44 @@ class HLSStreamWriter(SegmentedStreamWriter):
             else:
                 decrypted_chunk = decryptor.decrypt(data)
 
-            self.reader.buffer.write(pkcs7_decode(decrypted_chunk))
+            chunk = pkcs7_decode(decrypted_chunk)
+            metrics.observe("segment_decrypt_seconds", time() - start)
+            self.reader.buffer.write(chunk)
+            if window:
+                segment_data.append(chunk)
         else:
+            start = time()
+            blocked = 0
             try:
                 for chunk in res.iter_content(chunk_size):
+                    write_start = time()
                     self.reader.buffer.write(chunk)
-            except ChunkedEncodingError:
+                    blocked += time() - write_start
+                    size += len(chunk)
+                    if window:
+                        segment_data.append(chunk)
+            except (ChunkedEncodingError, StreamError):
                 log.error("Download of segment {0} failed", sequence.num)
+                metrics.inc("segment_errors_total")
+                if window:
+                    window.skip()
 
                 return
+            finally:
+                # Only the streamed download happens here, buffer waits included
+                if self.stream_segment(sequence):
+                    metrics.inc("segment_download_seconds_total", time() - start)
+
+            if self.reader.throughput and self.stream_segment(sequence):
+                # Waiting for free buffer space is not part of the download
+                self.reader.throughput.add(size, res.elapsed.total_seconds() + time() - start - blocked)
+
+        metrics.inc("segments_total")
+        metrics.inc("segment_bytes_total", size)
+
+        if window:
+            window.add(b"".join(segment_data), sequence.segment.duration,
+                       sequence.segment.discontinuity)
 
         log.debug("Download of segment {0} complete", sequence.num)
 
@@ -177,6 +364,7 @@ class HLSStreamWorker(SegmentedStreamWorker):
         self.playlist_sequence = -1
         self.playlist_sequences = []
         self.playlist_reload_time = 15
+        self.playlist_reloaded_at = None
         self.playlist_reload_time_override = self.session.options.get("hls-playlist-reload-time")
         self.playlist_reload_retries = self.session.options.get("hls-playlist-reload-attempts")
         self.live_edge = self.session.options.get("hls-live-edge")
@@ -185,6 +373,16 @@ class HLSStreamWorker(SegmentedStreamWorker):
             int(self.session.options.get("hls-duration")) if self.session.options.get("hls-duration") else None)
         self.hls_live_restart = self.stream.force_restart or self.session.options.get("hls-live-restart")
 
+        # Low-Latency HLS, the media sequence number and part index of
+        # the next part to download
+        self.low_latency = self.session.options.get("hls-low-latency")
+        self.playlist = None
+        self.part_target_duration = None
+        self.part_msn = None
+        self.part_index = 0
+        # Time of the last reload which wasn't a delta playlist
+        self.playlist_full_reloaded_at = None
+
         if str(self.playlist_reload_time_override).isnumeric() and float(self.playlist_reload_time_override) >= 2:
             self.playlist_reload_time_override = float(self.playlist_reload_time_override)
         elif self.playlist_reload_time_override not in ["segment", "live-edge"]:
@@ -212,20 +410,47 @@ class HLSStreamWorker(SegmentedStreamWorker):
     def _reload_playlist(self, text, url):
         return hls_playlist.load(text, url)
 
+    def playlist_url(self):
+        return self.stream.url
+
+    def _reload_retried(self, err, delay):
+        self.reader.metrics.inc("playlist_reload_retries_total")
+
+    def select_playlist(self):
+        """Called after each segment, returns True if the next segments
+        are taken from another media playlist."""
+        return False
+
     def reload_playlist(self):
         if self.closed:
             return
 
         self.reader.buffer.wait_free()
-        log.debug("Reloading playlist")
-        res = self.session.http.get(self.stream.url,
-                                    exception=StreamError,
-                                    retries=self.playlist_reload_retries,
-                                    **self.reader.request_params)
-        try:
-            playlist = self._reload_playlist(res.text, res.url)
-        except ValueError as err:
-            raise StreamError(err)
+        playlist = self.take_prefetched_playlist()
+        if playlist is None:
+            log.debug("Reloading playlist")
+            start = time()
+            if self.playlist_reloaded_at:
+                lag = start - self.playlist_reloaded_at - self.playlist_reload_time
+                self.reader.metrics.set("playlist_reload_lag_seconds", max(lag, 0))
+
+            request_params = self.reader.request_params
+            directives = self.playlist_directives()
+            if directives:
+                request_params = dict(request_params)
+                request_params["params"] = dict(request_params.get("params") or {}, **directives)
+
+            res = self.session.http.get(self.playlist_url(),
+                                        exception=StreamError,
+                                        retries=self.playlist_reload_retries,
+                                        on_retry=self._reload_retried,
+                                        **request_params)
+            self.playlist_reloaded_at = time()
+            self.reader.metrics.observe("playlist_reload_seconds", self.playlist_reloaded_at - start)
+            try:
+                playlist = self._reload_playlist(res.text, res.url)
+            except ValueError as err:
+                raise StreamError(err)
 
         if playlist.is_master:
             raise StreamError("Attempted to play a variant playlist, use "
@@ -234,15 +459,51 @@ class HLSStreamWorker(SegmentedStreamWorker):
         if playlist.iframes_only:
             raise StreamError("Streams containing I-frames only is not playable")
 
-        media_sequence = playlist.media_sequence or 0
+        if not playlist.skip:
+            self.playlist_full_reloaded_at = self.playlist_reloaded_at
+
+        # Delta playlists leave out the oldest segments
+        media_sequence = (playlist.media_sequence or 0) + (playlist.skip.skipped_segments if playlist.skip else 0)
         sequences = [Sequence(media_sequence + i, s)
                      for i, s in enumerate(playlist.segments)]
+        self.playlist = playlist
 
         self.playlist_reload_time = self._playlist_reload_time(playlist, sequences)
+        # The segments may be served by other hosts than the playlist
+        self.session.http.prewarm(segment.uri for segment in playlist.segments)
 
         if sequences:
             self.process_sequences(playlist, sequences)
 
+    def take_prefetched_playlist(self):
+        """Returns the playlist prefetched by the stream, unless a live
+        playlist is older than its target duration."""
+        future = getattr(self.stream, "prefetched_playlist", None)
+        if future is None:
+            return
+
+        # It is used only once, and waiting for it is faster than starting over
+        self.stream.prefetched_playlist = None
+        result = future.result()
+        if result is None:
+            return
+
+        fetched_at, res = result
+        try:
+            playlist = self._reload_playlist(res.text, res.url)
+        except ValueError:
+            return
+
+        age = time() - fetched_at
+        if not playlist.is_endlist and age > (playlist.target_duration or 0):
+            log.debug("Prefetched playlist is outdated ({0:.1f}s)", age)
+            return
+
+        log.debug("Using prefetched playlist ({0:.1f}s)", age)
+        self.playlist_reloaded_at = fetched_at
+
+        return playlist
+
     def _playlist_reload_time(self, playlist, sequences):
         if self.playlist_reload_time_override == "segment" and sequences:
             return sequences[-1].segment.duration
@@ -273,13 +534,158 @@ class HLSStreamWorker(SegmentedStreamWorker):
             self.playlist_end = last_sequence.num
 
         if self.playlist_sequence < 0:
-            if self.playlist_end is None and not self.hls_live_restart:
+            if (self.low_latency and playlist.part_target_duration and self.playlist_end is None
+                    and not self.hls_live_restart and self.duration_offset_start == 0):
+                self.part_target_duration = playlist.part_target_duration
+                self.part_msn, self.part_index = self.part_start_position(playlist, first_sequence.num)
+                self.playlist_sequence = self.part_msn
+                log.debug("Low latency streaming, starting at part {0}.{1}", self.part_msn, self.part_index)
+            elif self.playlist_end is None and not self.hls_live_restart:
                 edge_index = -(min(len(sequences), max(int(self.live_edge), 1)))
                 edge_sequence = sequences[edge_index]
                 self.playlist_sequence = edge_sequence.num
             else:
                 self.playlist_sequence = first_sequence.num
 
+    def part_start_position(self, playlist, first_num):
+        """Returns the media sequence number and part index to start at,
+        the first independent part at least the part hold back from the
+        end of the playlist."""
+        parts = []
+        for i, segment_parts in enumerate(playlist.segment_parts):
+            parts.extend((first_num + i, j, part) for j, part in enumerate(segment_parts))
+        parts.extend((first_num + len(playlist.segments), j, part) for j, part in enumerate(playlist.parts))
+
+        if not parts:
+            return first_num + len(playlist.segments) - 1, 0
+
+        server_control = playlist.server_control
+        hold_back = (server_control and server_control.part_hold_back) or playlist.part_target_duration * 3
+        duration = 0
+        for msn, index, part in reversed(parts):
+            duration += part.duration
+            # Encrypted segments can only be decrypted from their start
+            if duration >= hold_back and (index == 0 or (part.independent and not is_encrypted(part))):
+                return msn, index
+
+        # Not enough parts listed, start at the oldest segment with parts
+        msn, index, part = parts[0]
+        return (msn, 0) if index == 0 else (msn + 1, 0)
+
+    @staticmethod
+    def encrypted_parts(playlist):
+        """Returns whether the parts of the next segment are encrypted."""
+        segments = playlist.parts or playlist.segments
+        return bool(segments) and is_encrypted(segments[-1])
+
+    def playlist_directives(self):
+        """Returns the query parameters of a blocking playlist reload."""
+        if self.part_msn is None or not self.playlist:
+            return
+
+        server_control = self.playlist.server_control
+        if not server_control or not server_control.can_block_reload:
+            return
+
+        directives = {"_HLS_msn": self.part_msn, "_HLS_part": self.part_index}
+        if self.part_index == 0 and self.encrypted_parts(self.playlist):
+            # Waits for the whole segment instead
+            del directives["_HLS_part"]
+        # A delta playlist may only be requested while the last full one is
+        # younger than half of the skip boundary
+        if (server_control.can_skip_until and self.playlist_full_reloaded_at
+                and time() - self.playlist_full_reloaded_at < server_control.can_skip_until / 2):
+            directives["_HLS_skip"] = "YES"
+
+        return directives
+
+    def iter_parts(self):
+        """Yields the whole segments and the parts of the playlist which
+        follow the current position."""
+        playlist = self.playlist
+        first_num = playlist.media_sequence or 0
+        if playlist.skip:
+            first_num += playlist.skip.skipped_segments
+
+        if self.part_msn < first_num:
+            log.warning("Skipping segments {0}-{1}, they are no longer available",
+                        self.part_msn, first_num - 1)
+            self.part_msn, self.part_index = first_num, 0
+
+        for i, segment in enumerate(playlist.segments):
+            num = first_num + i
+            if num < self.part_msn:
+                continue
+
+            if self.part_index == 0:
+                yield Sequence(num, segment)
+            else:
+                parts = playlist.segment_parts[i] if i < len(playlist.segment_parts) else []
+                if not parts:
+                    log.warning("Skipping the rest of segment {0}, its parts are no longer available", num)
+                for part in parts[self.part_index:]:
+                    yield Sequence(num, part)
+
+            self.part_msn, self.part_index = num + 1, 0
+
+        num = first_num + len(playlist.segments)
+        if self.part_msn != num:
+            return
+
+        # The parts of an encrypted segment are decrypted as a whole, since
+        # each part continues the cipher of the previous one and only the
+        # last part is padded
+        if self.part_index == 0 and self.encrypted_parts(playlist):
+            return
+
+        for part in playlist.parts[self.part_index:]:
+            yield Sequence(num, part)
+            self.part_index += 1
+
+        # The next part is requested before it is available, the server
+        # responds once it is complete
+        for hint in playlist.preload_hints:
+            if hint.type != "PART" or hint.byterange_start is not None:
+                continue
+
+            template = (playlist.parts or playlist.segments)[-1]
+            part = template._replace(uri=hint.uri, duration=self.part_target_duration,
+                                     discontinuity=False, byterange=None)
+            yield Sequence(num, part)
+            self.part_index += 1
+            break
+
+    def iter_low_latency_segments(self):
+        server_control = self.playlist.server_control
+        blocking = server_control and server_control.can_block_reload
+        total_duration = 0
+
+        while not self.closed:
+            new_parts = False
+            for sequence in self.iter_parts():
+                new_parts = True
+                log.debug("Adding segment {0} to queue ({1})", sequence.num, sequence.segment.uri)
+                yield sequence
+                total_duration += sequence.segment.duration
+                if self.duration_limit and total_duration >= self.duration_limit:
+                    log.info("Stopping stream early after {0}".format(self.duration_limit))
+                    return
+
+                if self.closed:
+                    return
+
+            if self.playlist_end is not None and self.part_msn > self.playlist_end:
+                return
+
+            # A blocking reload returns when the next part is available, but
+            # the server may also respond right away without any new parts
+            if (blocking and new_parts) or self.wait(self.part_target_duration):
+                try:
+                    self.reload_playlist()
+                except StreamError as err:
+                    log.warning("Failed to reload playlist: {0}", err)
+                    self.wait(self.part_target_duration)
+
     def valid_sequence(self, sequence):
         return sequence.num >= self.playlist_sequence
 
@@ -299,8 +705,14 @@ class HLSStreamWorker(SegmentedStreamWorker):
         return default
 
     def iter_segments(self):
+        if self.part_msn is not None:
+            for sequence in self.iter_low_latency_segments():
+                yield sequence
+            return
+
         total_duration = 0
         while not self.closed:
+            switched = False
             for sequence in filter(self.valid_sequence, self.playlist_sequences):
                 log.debug("Adding segment {0} to queue", sequence.num)
                 yield sequence
@@ -315,8 +727,11 @@ class HLSStreamWorker(SegmentedStreamWorker):
                     return
 
                 self.playlist_sequence = sequence.num + 1
+                if self.select_playlist():
+                    switched = True
+                    break
 
-            if self.wait(self.playlist_reload_time):
+            if switched or self.wait(self.playlist_reload_time):
                 try:
                     self.reload_playlist()
                 except StreamError as err:
@@ -338,6 +753,110 @@ class HLSStreamReader(SegmentedStreamReader):
         self.request_params.pop("timeout", None)
         self.request_params.pop("url", None)
 
+        # Measured by the writer for adaptive streams
+        self.throughput = None
+
+
+class AdaptiveHLSStreamWorker(HLSStreamWorker):
+    """Switches between the variants of an adaptive stream at segment
+    boundaries, depending on the throughput and the buffer level."""
+
+    def __init__(self, reader, *args, **kwargs):
+        self.variants = reader.stream.variants
+        self.variant = 0
+        self.switched = False
+        # Program date time the next segment should start at
+        self.next_date = None
+        # Segments are queued just ahead of the downloads, so that
+        # switches take effect soon
+        self.queue_size = reader.stream.session.options.get("hls-segment-threads")
+        HLSStreamWorker.__init__(self, reader, *args, **kwargs)
+
+    def playlist_url(self):
+        return self.variants[self.variant].url
+
+    def buffered_seconds(self):
+        return self.reader.buffer.length * 8 / float(self.variants[self.variant].bandwidth)
+
+    def select_variant(self):
+        estimate = self.reader.throughput.estimate
+        if estimate is None:
+            return self.variant
+
+        variant = 0
+        for i, candidate in enumerate(self.variants):
+            if candidate.bandwidth <= estimate * ABR_SAFETY_FACTOR:
+                variant = i
+
+        # No need to switch down while enough is buffered
+        if variant < self.variant and self.buffered_seconds() >= ABR_LOW_BUFFER:
+            return self.variant
+
+        return variant
+
+    def select_playlist(self):
+        variant = self.select_variant()
+        if variant == self.variant:
+            return False
+
+        log.info("Switching to variant {0} ({1} bps), estimated throughput: {2:.0f} bps",
+                 self.variants[variant].name, self.variants[variant].bandwidth,
+                 self.reader.throughput.estimate)
+        self.reader.metrics.inc("variant_switches_total")
+        self.variant = variant
+        self.switched = True
+
+        return True
+
+    def aligned_sequence(self, sequences):
+        """Returns the number of the first segment of the new variant
+        which starts after the segments queued so far, aligned by program
+        date time if the playlist has it and by media sequence otherwise."""
+        date = None
+        for sequence in sequences:
+            date = sequence.segment.date or date
+            if date and self.next_date:
+                # Allow for inexact timestamps
+                if date + timedelta(seconds=sequence.segment.duration / 2.0) > self.next_date:
+                    return sequence.num
+            if date:
+                date += timedelta(seconds=sequence.segment.duration)
+
+        return self.playlist_sequence
+
+    def process_sequences(self, playlist, sequences):
+        if self.switched:
+            self.switched = False
+            self.playlist_sequence = self.aligned_sequence(sequences)
+
+        HLSStreamWorker.process_sequences(self, playlist, sequences)
+
+    def iter_segments(self):
+        variant = self.variant
+        for sequence in HLSStreamWorker.iter_segments(self):
+            segment = sequence.segment
+            if segment.date:
+                self.next_date = segment.date + timedelta(seconds=segment.duration)
+            elif self.next_date:
+                self.next_date += timedelta(seconds=segment.duration)
+
+            if variant != self.variant:
+                variant = self.variant
+                sequence = Sequence(sequence.num, segment._replace(discontinuity=True))
+
+            while self.writer.futures.qsize() >= self.queue_size and self.wait(0.1):
+                pass
+
+            yield sequence
+
+
+class AdaptiveHLSStreamReader(HLSStreamReader):
+    __worker__ = AdaptiveHLSStreamWorker
+
+    def __init__(self, stream, *args, **kwargs):
+        HLSStreamReader.__init__(self, stream, *args, **kwargs)
+        self.throughput = ThroughputEstimator()
+
 
 class MuxedHLSStream(MuxedStream):
     __shortname__ = "hls-multi"
@@ -357,6 +876,68 @@ class MuxedHLSStream(MuxedStream):
 
         super(MuxedHLSStream, self).__init__(session, *substreams, format="mpegts", maps=maps, **ffmpeg_options)
 
+    def open(self):
+        if self.mux_internal(self.session):
+            if self.mpegts_substreams():
+                fds = []
+                for substream in self.substreams:
+                    log.debug("Opening {0} substream".format(substream.shortname()))
+                    fds.append(substream.open())
+
+                return TSMuxer(self.session, *fds).open()
+
+            if not FFMPEGMuxer.is_usable(self.session):
+                log.warning("Opening the stream without its alternate audio, only MPEG-TS "
+                            "segments can be muxed without FFmpeg")
+                return self.substreams[0].open()
+
+            log.debug("Muxing with FFmpeg, the internal muxer only supports MPEG-TS segments")
+
+        return super(MuxedHLSStream, self).open()
+
+    @classmethod
+    def mux_internal(cls, session):
+        """Returns whether the substreams are muxed by the in-process muxer
+        instead of FFmpeg, which only supports MPEG-TS segments."""
+        return bool(session.options.get("hls-mux-internal")) or not FFMPEGMuxer.is_usable(session)
+
+    def mpegts_substreams(self):
+        """Returns whether the segments of all substreams are MPEG-TS,
+        judging by their playlists. The playlists are prefetched, so the
+        substreams use them when opened."""
+        executor = ThreadPoolExecutor(max_workers=len(self.substreams))
+        try:
+            for substream in self.substreams:
+                if substream.prefetched_playlist is None:
+                    substream.prefetch_playlist(executor)
+        finally:
+            executor.shutdown(wait=False)
+
+        for substream in self.substreams:
+            result = substream.prefetched_playlist.result()
+            if result is None:
+                return False
+
+            try:
+                playlist = hls_playlist.load(result[1].text, base_uri=result[1].url)
+            except ValueError as err:
+                log.debug("Unable to check the segments of {0}: {1}", substream.url, err)
+                return False
+
+            if not self.mpegts_playlist(playlist):
+                return False
+
+        return True
+
+    @staticmethod
+    def mpegts_playlist(playlist):
+        """Returns whether the segments of a media playlist are MPEG-TS."""
+        # Fragmented MP4 segments require an initialization section
+        return bool(playlist.segments) and not any(
+            segment.map or urlparse(segment.uri).path.lower().endswith(PACKED_AUDIO_EXTENSIONS)
+            for segment in playlist.segments
+        )
+
 
 class HLSStream(HTTPStream):
     """Implementation of the Apple HTTP Live Streaming protocol
@@ -376,10 +957,37 @@ class HLSStream(HTTPStream):
         self.force_restart = force_restart
         self.start_offset = start_offset
         self.duration = duration
+        self.segment_window = None
+        self.prefetched_playlist = None
 
     def __repr__(self):
         return "<HLSStream({0!r})>".format(self.url)
 
+    def prefetch_playlist(self, executor):
+        """Starts fetching the playlist in the background, the worker
+        uses the response when the stream is opened while it is fresh."""
+        self.prefetched_playlist = executor.submit(self._prefetch_playlist)
+
+    def _prefetch_playlist(self):
+        request_params = dict(self.args)
+        for key in ("exception", "stream", "timeout", "url"):
+            request_params.pop(key, None)
+
+        return self._fetch_playlist(self.session, self.url, **request_params)
+
+    @staticmethod
+    def _fetch_playlist(session_, url, **request_params):
+        """Returns the time and response of a playlist request, or None
+        if it failed."""
+        try:
+            res = session_.http.get(url, exception=StreamError,
+                                    **request_params)
+        except StreamError as err:
+            log.debug("Failed to prefetch playlist: {0}", err)
+            return
+
+        return time(), res
+
     def __json__(self):
         json = HTTPStream.__json__(self)
 
@@ -411,10 +1019,14 @@ class HLSStream(HTTPStream):
         :param name_key: Prefer to use this key as stream name, valid keys are:
                          name, pixels, bitrate.
         :param name_prefix: Add this prefix to the stream names.
-        :param check_streams: Only allow streams that are accessible.
+        :param check_streams: Only allow streams that are accessible, their
+                              playlists are requested concurrently.
         :param force_restart: Start at the first segment even for a live stream
         :param name_fmt: A format string for the name, allowed format keys are
                          name, pixels, bitrate.
+
+        With the hls-abr option an additional "adaptive" stream switches
+        between the variants.
         """
         locale = session_.localization
         # Backwards compatibility with "namekey" and "nameprefix" params.
@@ -424,12 +1036,32 @@ class HLSStream(HTTPStream):
 
         res = session_.http.get(url, exception=IOError, **request_params)
 
+        # Media playlists are fetched while the rest is parsed and until
+        # one of the streams is opened
+        fast_start = session_.options.get("hls-fast-start")
+        if check_streams or fast_start:
+            prefetch_executor = ThreadPoolExecutor(max_workers=PREFETCH_THREADS)
+        else:
+            prefetch_executor = None
+
         try:
             parser = cls._get_variant_playlist(res)
         except ValueError as err:
             raise IOError("Failed to parse playlist: {0}".format(err))
 
+        # The responses of the checks are used by the streams when opened
+        checked_playlists = {}
+        if check_streams:
+            check_params = dict(request_params)
+            check_params.pop("exception", None)
+            check_params.setdefault("timeout", CHECK_STREAMS_TIMEOUT)
+            for playlist in filter(lambda p: not p.is_iframe, parser.playlists):
+                if playlist.uri not in checked_playlists:
+                    checked_playlists[playlist.uri] = prefetch_executor.submit(cls._fetch_playlist, session_,
+                                                                               playlist.uri, **check_params)
+
         streams = OrderedDict()
+        variants = []
         for playlist in filter(lambda p: not p.is_iframe, parser.playlists):
             names = dict(name=None, pixels=None, bitrate=None)
             audio_streams = []
@@ -487,6 +1119,7 @@ class HLSStream(HTTPStream):
 
             if not stream_name:
                 continue
+            quality = stream_name
             if name_prefix:
                 stream_name = "{0}{1}".format(name_prefix, stream_name)
 
@@ -500,17 +1133,12 @@ class HLSStream(HTTPStream):
                 elif num_alts > 0:
                     stream_name = "{0}{1}".format(stream_name, num_alts + 1)
 
-            if check_streams:
-                try:
-                    session_.http.get(playlist.uri, **request_params)
-                except KeyboardInterrupt:
-                    raise
-                except Exception:
-                    continue
+            if check_streams and checked_playlists[playlist.uri].result() is None:
+                continue
 
             external_audio = preferred_audio or default_audio or fallback_audio
 
-            if external_audio and FFMPEGMuxer.is_usable(session_):
+            if external_audio:
                 external_audio_msg = u", ".join([
                     u"(language={0}, name={1})".format(x.language, (x.name or "N/A"))
                     for x in external_audio
@@ -525,6 +1153,11 @@ class HLSStream(HTTPStream):
                                         start_offset=start_offset,
                                         duration=duration,
                                         **request_params)
+                # The video playlist is checked by the internal muxer
+                if check_streams:
+                    stream.substreams[0].prefetched_playlist = checked_playlists[playlist.uri]
+                elif fast_start:
+                    stream.substreams[0].prefetch_playlist(prefetch_executor)
             else:
                 stream = cls(session_,
                              playlist.uri,
@@ -532,6 +1165,73 @@ class HLSStream(HTTPStream):
                              start_offset=start_offset,
                              duration=duration,
                              **request_params)
+                if check_streams:
+                    stream.prefetched_playlist = checked_playlists[playlist.uri]
+                elif fast_start:
+                    stream.prefetch_playlist(prefetch_executor)
+                if playlist.stream_info.bandwidth:
+                    variants.append(Variant(quality, playlist.stream_info.bandwidth, playlist.uri))
             streams[stream_name] = stream
 
+        if prefetch_executor:
+            prefetch_executor.shutdown(wait=False)
+
+        # Subclasses of HLSStream have their own workers, which the
+        # adaptive stream can't switch between
+        if session_.options.get("hls-abr") and cls is HLSStream:
+            variants = AdaptiveHLSStream.filter_variants(variants,
+                                                         session_.options.get("hls-abr-min"),
+                                                         session_.options.get("hls-abr-max"))
+            if len(variants) > 1:
+                streams["{0}adaptive".format(name_prefix)] = AdaptiveHLSStream(session_,
+                                                                               url,
+                                                                               variants,
+                                                                               force_restart=force_restart,
+                                                                               start_offset=start_offset,
+                                                                               duration=duration,
+                                                                               **request_params)
+
         return streams
+
+
+class AdaptiveHLSStream(HLSStream):
+    """A HLS stream which switches between the variants of a variant
+    playlist, depending on the download throughput and buffer level.
+
+    *Attributes:*
+
+    - :attr:`url` The URL to the variant playlist.
+    - :attr:`variants` A list of :class:`Variant`, sorted by bandwidth.
+    - :attr:`args` A :class:`dict` containing keyword arguments passed
+      to :meth:`requests.request`, such as headers and cookies.
+
+    """
+
+    def __init__(self, session_, url, variants, **args):
+        HLSStream.__init__(self, session_, url, **args)
+        self.variants = sorted(variants, key=lambda v: v.bandwidth)
+
+    def __repr__(self):
+        return "<AdaptiveHLSStream({0!r}, {1} variants)>".format(self.url, len(self.variants))
+
+    @staticmethod
+    def filter_variants(variants, min_quality=None, max_quality=None):
+        """Returns the variants within the quality bounds, which are
+        compared like the stream sorting excludes of a plugin."""
+        exprs = []
+        if min_quality:
+            exprs.append("<{0}".format(min_quality))
+        if max_quality:
+            exprs.append(">{0}".format(max_quality))
+
+        for expr in exprs:
+            filter_func = stream_sorting_filter(expr, stream_weight)
+            variants = [variant for variant in variants if filter_func(variant.name)]
+
+        return variants
+
+    def open(self):
+        reader = AdaptiveHLSStreamReader(self)
+        reader.open()
+
+        return reader
@@ -34,6 +34,19 @@ Media = namedtuple("Media", "uri type group_id language name default autoselect
 # EXT-X-START
 Start = namedtuple("Start", "time_offset precise")
 
+# EXT-X-PART, has the fields of a segment
+Part = namedtuple("Part", "uri duration title key discontinuity byterange date map independent gap")
+
+# EXT-X-PRELOAD-HINT
+PreloadHint = namedtuple("PreloadHint", "type uri byterange_start byterange_length")
+
+# EXT-X-SERVER-CONTROL
+ServerControl = namedtuple("ServerControl",
+                           "can_block_reload can_skip_until can_skip_dateranges hold_back part_hold_back")
+
+# EXT-X-SKIP
+Skip = namedtuple("Skip", "skipped_segments recently_removed_dateranges")
+
 # EXT-X-STREAM-INF
 StreamInfo = namedtuple("StreamInfo", "bandwidth program_id codecs resolution audio video subtitles")
 
@@ -59,10 +72,19 @@ class M3U8(object):
         self.start = None
         self.version = None
 
+        # Low-Latency HLS
+        self.part_target_duration = None
+        self.server_control = None
+        self.skip = None
+
         self.media = []
         self.playlists = []
         self.dateranges = []
         self.segments = []
+        # The parts of each segment, and of the segment being published
+        self.segment_parts = []
+        self.parts = []
+        self.preload_hints = []
 
     @classmethod
     def is_date_in_daterange(cls, date, daterange):
@@ -259,7 +281,7 @@ class M3U8Parser(object):
     def parse_tag_ext_x_map(self, value):
         attr = self.parse_attributes(value)
         byterange = self.parse_byterange(attr.get("BYTERANGE", ""))
-        self.state["map"] = Map(attr.get("URI"), byterange)
+        self.state["map"] = Map(self.uri(attr.get("URI")), byterange)
 
     def parse_tag_ext_x_i_frame_stream_inf(self, value):
         attr = self.parse_attributes(value)
@@ -268,6 +290,67 @@ class M3U8Parser(object):
         playlist = Playlist(self.uri(attr.get("URI")), stream_info, [], True)
         self.m3u8.playlists.append(playlist)
 
+    def parse_tag_ext_x_part_inf(self, value):
+        attr = self.parse_attributes(value)
+        part_target = attr.get("PART-TARGET")
+        if part_target:
+            self.m3u8.part_target_duration = float(part_target)
+
+    def parse_tag_ext_x_part(self, value):
+        attr = self.parse_attributes(value)
+        parts = self.state.setdefault("parts", [])
+        byterange = attr.get("BYTERANGE")
+        if byterange:
+            # Without an offset the part follows the previous one
+            length, _, offset = byterange.partition("@")
+            byterange = ByteRange(int(length), int(offset) if offset else None)
+
+        part = Part(
+            self.uri(attr.get("URI")),
+            float(attr.get("DURATION", 0)),
+            None,
+            self.state.get("key"),
+            # Only the first part of a segment can follow a discontinuity
+            not parts and self.state.get("discontinuity", False),
+            byterange,
+            None,
+            self.state.get("map"),
+            self.parse_bool(attr.get("INDEPENDENT")),
+            self.parse_bool(attr.get("GAP"))
+        )
+        parts.append(part)
+
+    def parse_tag_ext_x_preload_hint(self, value):
+        attr = self.parse_attributes(value)
+        start = attr.get("BYTERANGE-START")
+        length = attr.get("BYTERANGE-LENGTH")
+        hint = PreloadHint(attr.get("TYPE"),
+                           self.uri(attr.get("URI")),
+                           int(start) if start else None,
+                           int(length) if length else None)
+        self.m3u8.preload_hints.append(hint)
+
+    def parse_tag_ext_x_server_control(self, value):
+        attr = self.parse_attributes(value)
+
+        def parse_float(key):
+            value = attr.get(key)
+            return float(value) if value else None
+
+        self.m3u8.server_control = ServerControl(
+            self.parse_bool(attr.get("CAN-BLOCK-RELOAD")),
+            parse_float("CAN-SKIP-UNTIL"),
+            self.parse_bool(attr.get("CAN-SKIP-DATERANGES")),
+            parse_float("HOLD-BACK"),
+            parse_float("PART-HOLD-BACK")
+        )
+
+    def parse_tag_ext_x_skip(self, value):
+        attr = self.parse_attributes(value)
+        removed = attr.get("RECENTLY-REMOVED-DATERANGES")
+        self.m3u8.skip = Skip(int(attr.get("SKIPPED-SEGMENTS", 0)),
+                              removed.split("\t") if removed else [])
+
     def parse_tag_ext_x_version(self, value):
         self.m3u8.version = int(value)
 
@@ -289,6 +372,7 @@ class M3U8Parser(object):
         elif self.state.pop("expect_segment", None):
             segment = self.get_segment(self.uri(line))
             self.m3u8.segments.append(segment)
+            self.m3u8.segment_parts.append(self.state.pop("parts", []))
         elif self.state.pop("expect_playlist", None):
             playlist = self.get_playlist(self.uri(line))
             self.m3u8.playlists.append(playlist)
@@ -308,6 +392,9 @@ class M3U8Parser(object):
         for line in lines:
             parse_line(line)
 
+        # Parts of a segment which is not complete yet
+        self.m3u8.parts = self.state.pop("parts", [])
+
         # Associate Media entries with each Playlist
         for playlist in self.m3u8.playlists:
             for media_type in ("audio", "video", "subtitles"):
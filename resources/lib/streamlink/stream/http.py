@@ -3,6 +3,7 @@ import requests
 from streamlink.compat import getargspec
 from streamlink.exceptions import StreamError
 from streamlink.stream import Stream
+from streamlink.stream.ranged import RangedResponse, ResumableResponse
 from streamlink.stream.wrappers import StreamIOThreadWrapper, StreamIOIterWrapper
 
 
@@ -19,6 +20,30 @@ def valid_args(args):
     return dict(filter(lambda kv: kv[0] in argspec.args, args.items()))
 
 
+class HTTPStreamIterator(object):
+    """Iterates over the content of a response, counting the bytes read in
+    the metrics of the stream, which are removed when it's closed."""
+
+    def __init__(self, res, metrics, chunk_size=8192):
+        self.iterator = res.iter_content(chunk_size)
+        self.metrics = metrics
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        chunk = next(self.iterator)
+        self.metrics.inc("output_bytes_total", len(chunk))
+        return chunk
+
+    next = __next__
+
+    def close(self):
+        if hasattr(self.iterator, "close"):
+            self.iterator.close()
+        self.metrics.close()
+
+
 class HTTPStream(Stream):
     """A HTTP stream using the requests library.
 
@@ -66,13 +91,29 @@ class HTTPStream(Stream):
     def open(self):
         method = self.args.get("method", "GET")
         timeout = self.session.options.get("http-timeout")
-        res = self.session.http.request(method=method,
-                                        stream=True,
-                                        exception=StreamError,
-                                        timeout=timeout,
-                                        **self.args)
-
-        fd = StreamIOIterWrapper(res.iter_content(8192))
+        metrics = self.session.metrics.stream(self)
+        try:
+            res = self.session.http.request(method=method,
+                                            stream=True,
+                                            exception=StreamError,
+                                            timeout=timeout,
+                                            **self.args)
+        except StreamError:
+            metrics.close()
+            raise
+        metrics.observe("segment_request_seconds", res.elapsed.total_seconds())
+
+        args = dict(self.args)
+        args.pop("url")
+        args.pop("method", None)
+        res = ResumableResponse(self.session, res, metrics=metrics, exception=StreamError, timeout=timeout, **args)
+
+        threshold = self.session.options.get("stream-split-threshold")
+        if threshold and RangedResponse.supported(res, threshold):
+            res = RangedResponse(self.session, res, self.session.options.get("stream-split-connections"),
+                                 exception=StreamError, timeout=timeout, **args)
+
+        fd = StreamIOIterWrapper(HTTPStreamIterator(res, metrics))
         if self.buffered:
             fd = StreamIOThreadWrapper(self.session, fd, timeout=timeout)
 
@@ -0,0 +1,280 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import logging
+import re
+
+from requests.exceptions import ChunkedEncodingError, ConnectionError
+
+from ..exceptions import StreamError
+
+log = logging.getLogger(__name__)
+
+MIN_PART_SIZE = 1024 * 1024
+MAX_PART_SIZE = 8 * 1024 * 1024
+RESUME_ATTEMPTS = 3
+
+_content_range_re = re.compile(r"bytes (\d+)-(\d+)/")
+
+
+def range_request_params(request_params, start, end=""):
+    """Returns the arguments of a request for a range of the same URL."""
+    params = dict(request_params)
+    # The query string is already part of the URL of the response
+    params.pop("params", None)
+    params.pop("stream", None)
+    headers = dict(params.pop("headers", None) or {})
+    headers["Range"] = "bytes={0}-{1}".format(start, end)
+    params["headers"] = headers
+
+    return params
+
+
+def content_validator(res):
+    """Returns the header and value which identify the version of the
+    content of a response, its strong ETag or else its Last-Modified date,
+    or None if there is neither."""
+    etag = res.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return "ETag", etag
+    if "Last-Modified" in res.headers:
+        return "Last-Modified", res.headers["Last-Modified"]
+
+
+def range_matches(res, validator):
+    """Returns whether the response to a range request is of the same
+    version of the content as the one the validator is from."""
+    if validator is None:
+        return True
+
+    header, value = validator
+    return res.headers.get(header, value) == value
+
+
+class ResumableResponse(object):
+    """Resumes the download of a response with a Range request when the
+    connection is interrupted, continuing after the last byte read.
+
+    Other attributes are those of the original response.
+    """
+
+    def __init__(self, session, res, attempts=RESUME_ATTEMPTS, metrics=None, **request_params):
+        self.session = session
+        self.res = res
+        self.current = res
+        self.attempts = attempts or RESUME_ATTEMPTS
+        self.metrics = metrics
+        self.exception = request_params.pop("exception", StreamError)
+        self.request_params = request_params
+        self.start, self.end = self.content_range(res)
+        self._content = None
+
+    def __getattr__(self, name):
+        return getattr(self.res, name)
+
+    @staticmethod
+    def content_range(res):
+        """Returns the position of the first and last byte of the content
+        of a response, either may be None if unknown."""
+        if res.status_code == 206:
+            match = _content_range_re.match(res.headers.get("Content-Range", ""))
+            if not match:
+                return None, None
+
+            return int(match.group(1)), int(match.group(2))
+
+        try:
+            return 0, int(res.headers["Content-Length"]) - 1
+        except (KeyError, ValueError):
+            return 0, None
+
+    @property
+    def resumable(self):
+        res = self.res
+        return (res.request.method == "GET"
+                and self.start is not None
+                # The position would be of the decoded content
+                and res.headers.get("Content-Encoding", "identity").lower() == "identity"
+                and (res.status_code == 206
+                     or (res.status_code == 200 and res.headers.get("Accept-Ranges", "").lower() == "bytes")))
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = b"".join(self.iter_content(MIN_PART_SIZE))
+
+        return self._content
+
+    def close(self):
+        self.current.close()
+
+    def resume(self, position):
+        params = range_request_params(self.request_params, position,
+                                      "" if self.end is None else self.end)
+        # Makes sure the rest is of the same version of the content
+        validator = content_validator(self.res)
+        if validator:
+            params["headers"]["If-Range"] = validator[1]
+
+        res = self.session.http.get(self.res.url,
+                                    stream=True,
+                                    exception=self.exception,
+                                    **params)
+        if (res.status_code != 206 or self.content_range(res)[0] != position
+                or not range_matches(res, validator)):
+            res.close()
+            raise self.exception("Unable to resume {0} at byte {1}: {2}".format(
+                                 self.res.url, position, res.status_code))
+
+        return res
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        if self._content is not None:
+            for i in range(0, len(self._content), chunk_size):
+                yield self._content[i:i + chunk_size]
+            return
+
+        position = self.start or 0
+        attempts = self.attempts
+        while True:
+            try:
+                for chunk in self.current.iter_content(chunk_size):
+                    position += len(chunk)
+                    # Only attempts without any progress are counted
+                    attempts = self.attempts
+                    yield chunk
+            except (ChunkedEncodingError, ConnectionError) as err:
+                if not self.resumable or attempts <= 1:
+                    raise
+                error = err
+            else:
+                if self.end is None or position > self.end or not self.resumable:
+                    return
+
+                error = "closed after {0} of {1} bytes".format(position - self.start, self.end + 1 - self.start)
+                if attempts <= 1:
+                    raise self.exception("Connection of {0} {1}".format(self.res.url, error))
+
+            attempts -= 1
+            log.warning("Download of {0} interrupted, resuming at byte {1}: {2}", self.res.url, position, error)
+            if self.metrics:
+                self.metrics.inc("download_resumes_total")
+            self.current.close()
+            self.current = self.resume(position)
+
+
+class RangedResponse(object):
+    """Downloads the content of a response with concurrent Range requests.
+
+    The first part is read from the original response while the following
+    parts are requested, ``connections`` at a time, and the content is
+    yielded in order. Other attributes are those of the original response.
+    """
+
+    def __init__(self, session, res, connections, **request_params):
+        self.session = session
+        self.res = res
+        self.connections = max(connections, 2)
+        self.length = int(res.headers["Content-Length"])
+        self.part_size = min(max(-(-self.length // self.connections), MIN_PART_SIZE),
+                             MAX_PART_SIZE, self.length)
+        self.exception = request_params.pop("exception", StreamError)
+        self.request_params = request_params
+        self._content = None
+
+    def __getattr__(self, name):
+        return getattr(self.res, name)
+
+    @classmethod
+    def supported(cls, res, threshold):
+        """Returns whether the content of a response can be split, if it's
+        at least threshold bytes large."""
+        if res.status_code != 200 or res.request.method != "GET":
+            return False
+
+        if res.headers.get("Accept-Ranges", "").lower() != "bytes":
+            return False
+
+        # The ranges would be of the encoded content
+        if res.headers.get("Content-Encoding", "identity").lower() != "identity":
+            return False
+
+        try:
+            return int(res.headers.get("Content-Length", 0)) >= threshold
+        except ValueError:
+            return False
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = b"".join(self.iter_content(MIN_PART_SIZE))
+
+        return self._content
+
+    def close(self):
+        self.res.close()
+
+    def ranges(self):
+        for start in range(self.part_size, self.length, self.part_size):
+            yield start, min(start + self.part_size, self.length) - 1
+
+    def fetch_part(self, start, end):
+        params = range_request_params(self.request_params, start, end)
+        # The whole content is sent instead if it has changed in the meantime
+        validator = content_validator(self.res)
+        if validator:
+            params["headers"]["If-Range"] = validator[1]
+
+        res = self.session.http.get(self.res.url,
+                                    exception=self.exception,
+                                    **params)
+        if res.status_code != 206 or len(res.content) != end - start + 1:
+            raise self.exception("Unexpected response to range {0}-{1} of {2}: {3}, {4} bytes".format(
+                                 start, end, self.res.url, res.status_code, len(res.content)))
+        if not range_matches(res, validator):
+            raise self.exception("Content of {0} changed while downloading range {1}-{2}".format(
+                                 self.res.url, start, end))
+
+        return res.content
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        if self._content is not None:
+            for i in range(0, len(self._content), chunk_size):
+                yield self._content[i:i + chunk_size]
+            return
+
+        log.debug("Downloading {0} in parts of {1} bytes with {2} connections",
+                  self.res.url, self.part_size, self.connections)
+
+        ranges = self.ranges()
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=self.connections)
+        try:
+            for start, end in islice(ranges, self.connections - 1):
+                pending.append(executor.submit(self.fetch_part, start, end))
+
+            remaining = self.part_size
+            for chunk in self.res.iter_content(chunk_size):
+                chunk = chunk[:remaining]
+                remaining -= len(chunk)
+                yield chunk
+                if not remaining:
+                    break
+            # The rest of the content is downloaded by the range requests
+            self.res.close()
+            if remaining:
+                raise self.exception("Connection closed before the first part of {0} was read".format(self.res.url))
+
+            while pending:
+                future = pending.popleft()
+                for start, end in islice(ranges, 1):
+                    pending.append(executor.submit(self.fetch_part, start, end))
+
+                data = future.result()
+                for i in range(0, len(data), chunk_size):
+                    yield data[i:i + chunk_size]
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+            self.res.close()
@@ -0,0 +1,214 @@
+import logging
+import math
+import os
+import shutil
+import tempfile
+from collections import deque
+from threading import Condition
+
+log = logging.getLogger(__name__)
+
+# Used for segments of unknown duration if there is no previous segment
+DEFAULT_SEGMENT_DURATION = 10.0
+
+
+class WindowSegment(object):
+    __slots__ = ("num", "duration", "discontinuity", "map", "data")
+
+    def __init__(self, num, duration, discontinuity=False, map=None, data=None):
+        self.num = num
+        self.duration = duration
+        self.discontinuity = discontinuity
+        self.map = map
+        self.data = data
+
+
+class SegmentWindow(object):
+    """Keeps the most recent segments of a stream and describes them as a
+    HLS media playlist.
+
+    Segments are added by the stream writer as they are downloaded and are
+    dropped again once they are older than the window depth. They are kept
+    in memory, or in a temporary directory created inside path.
+
+    The initialization sections of fragmented MP4 segments are numbered and
+    kept in memory for as long as a segment of the window refers to them.
+
+    :param depth: the duration of the window in seconds
+    :param path: the directory to store the segments in instead of memory
+    :param extension: the file extension to use for the segments
+    """
+
+    def __init__(self, depth=120.0, path=None, extension="ts"):
+        self.depth = depth
+        self.extension = extension
+        self.segments = deque()
+        self.sequence = 0
+        self.discontinuity_sequence = 0
+        self.discontinuity = False
+        self.map = None
+        self.maps = {}
+        self.map_sequence = 0
+        self.ended = False
+        self.cond = Condition()
+
+        if path:
+            self.path = tempfile.mkdtemp(prefix="streamlink-", dir=path)
+        else:
+            self.path = None
+
+    @property
+    def duration(self):
+        return sum(segment.duration for segment in self.segments)
+
+    def segment_path(self, num):
+        return os.path.join(self.path, "{0}.{1}".format(num, self.extension))
+
+    def add(self, data, duration, discontinuity=False):
+        """Adds the data of the next segment to the window.
+
+        The duration of the previous segment is assumed if the duration
+        is unknown (None).
+        """
+        with self.cond:
+            if duration is None:
+                duration = self.segments[-1].duration if self.segments else DEFAULT_SEGMENT_DURATION
+            segment = WindowSegment(self.sequence, duration,
+                                    discontinuity or self.discontinuity, self.map)
+            self.sequence += 1
+            self.discontinuity = False
+
+            if self.path:
+                with open(self.segment_path(segment.num), "wb") as fd:
+                    fd.write(data)
+            else:
+                segment.data = data
+
+            self.segments.append(segment)
+
+            while len(self.segments) > 1 and self.duration - self.segments[0].duration >= self.depth:
+                self.remove(self.segments.popleft())
+
+            self.cond.notify_all()
+
+    def remove(self, segment):
+        if segment.discontinuity:
+            self.discontinuity_sequence += 1
+
+        # The maps are numbered in order, so the oldest segment still refers
+        # to a map if any of the segments does
+        if segment.map is not None and segment.map != self.map:
+            if not self.segments or self.segments[0].map != segment.map:
+                self.maps.pop(segment.map, None)
+
+        if self.path:
+            try:
+                os.remove(self.segment_path(segment.num))
+            except OSError:
+                pass
+
+    def skip(self):
+        """Marks the next segment as discontinuous, e.g. after a segment
+        failed to download."""
+        with self.cond:
+            self.discontinuity = True
+
+    def set_map(self, data):
+        """Sets the initialization section of the following segments.
+
+        A section that differs from the current one is numbered anew and
+        the next segment is marked as discontinuous."""
+        with self.cond:
+            if self.map is not None and self.maps.get(self.map) == data:
+                return
+            if self.map is not None:
+                self.discontinuity = True
+            self.map = self.map_sequence
+            self.maps[self.map] = data
+            self.map_sequence += 1
+
+    def end(self):
+        with self.cond:
+            self.ended = True
+            self.cond.notify_all()
+
+    def wait(self, timeout=None):
+        """Waits until the window contains a segment or the stream has ended.
+
+        Returns True if there are segments available."""
+        with self.cond:
+            if not self.segments and not self.ended:
+                self.cond.wait(timeout)
+
+            return len(self.segments) > 0
+
+    def get(self, num):
+        """Returns the data of a segment or None if it is not part of the
+        window (anymore)."""
+        with self.cond:
+            if not self.segments:
+                return
+
+            index = num - self.segments[0].num
+            if not 0 <= index < len(self.segments):
+                return
+
+            segment = self.segments[index]
+            if not self.path:
+                return segment.data
+
+            # Read it while locked, so it is not removed in the meantime
+            with open(self.segment_path(num), "rb") as fd:
+                return fd.read()
+
+    def get_map(self, num):
+        """Returns the data of an initialization section or None if no
+        segment of the window refers to it (anymore)."""
+        with self.cond:
+            return self.maps.get(num)
+
+    def playlist(self):
+        """Returns the HLS media playlist of the current window."""
+        with self.cond:
+            segments = list(self.segments)
+            target_duration = int(math.ceil(max([s.duration for s in segments] or [1])))
+            fragmented = any(s.map is not None for s in segments)
+            lines = ["#EXTM3U",
+                     "#EXT-X-VERSION:{0}".format(6 if fragmented else 3),
+                     "#EXT-X-TARGETDURATION:{0}".format(target_duration),
+                     "#EXT-X-MEDIA-SEQUENCE:{0}".format(segments[0].num if segments else self.sequence)]
+
+            if self.discontinuity_sequence:
+                lines.append("#EXT-X-DISCONTINUITY-SEQUENCE:{0}".format(self.discontinuity_sequence))
+
+            map_ = None
+            for segment in segments:
+                if segment.discontinuity:
+                    lines.append("#EXT-X-DISCONTINUITY")
+                if segment.map is not None and segment.map != map_:
+                    lines.append("#EXT-X-MAP:URI=\"init-{0}.mp4\"".format(segment.map))
+                map_ = segment.map
+
+                # Segments with an initialization section are fragmented MP4
+                extension = "m4s" if segment.map is not None else self.extension
+                lines.append("#EXTINF:{0:.3f},".format(segment.duration))
+                lines.append("{0}.{1}".format(segment.num, extension))
+
+            if self.ended:
+                lines.append("#EXT-X-ENDLIST")
+
+            return "\n".join(lines) + "\n"
+
+    def close(self):
+        with self.cond:
+            self.segments.clear()
+            self.maps.clear()
+            self.ended = True
+            self.cond.notify_all()
+
+        if self.path:
+            log.debug("Removing segment window directory {0}", self.path)
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+__all__ = ["SegmentWindow"]
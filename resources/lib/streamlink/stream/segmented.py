@@ -1,15 +1,29 @@
+from collections import deque
 from concurrent import futures
 from concurrent.futures.thread import ThreadPoolExecutor
+import heapq
+import itertools
 import logging
-from threading import Thread, Event
+from threading import Condition, Thread, Event
 from sys import version_info
+from time import time
 
+from requests.exceptions import RequestException
+
+from .ranged import RangedResponse, ResumableResponse
 from .stream import StreamIO
-from ..buffers import RingBuffer
+from ..buffers import RingBuffer, SpillBuffer
 from ..compat import queue
+from ..exceptions import StreamError
 
 log = logging.getLogger(__name__)
 
+# Response times kept to compute the hedging deadline
+HEDGE_SAMPLES = 100
+# Requests are not hedged before this many responses were received
+HEDGE_MIN_SAMPLES = 10
+HEDGE_MIN_DELAY = 0.05
+
 
 class CompatThreadPoolExecutor(ThreadPoolExecutor):
     if version_info < (3, 9):
@@ -35,6 +49,94 @@ class CompatThreadPoolExecutor(ThreadPoolExecutor):
                     t.join()
 
 
+class ResponseTimes(object):
+    """The time until the first byte of the recent responses."""
+
+    def __init__(self, size=HEDGE_SAMPLES):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, percent):
+        """Returns the given percentile of the response times, or None
+        if there are not enough samples yet."""
+        samples = sorted(self.samples)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+
+        return samples[min(int(len(samples) * percent / 100.0), len(samples) - 1)]
+
+
+class FetchScheduler(Thread):
+    """Submits calls to an executor at a later time.
+
+    Scheduled calls are kept in a heap ordered by their time, so they
+    don't occupy a thread of the executor while they wait. The returned
+    future resolves with the result of the call.
+    """
+
+    def __init__(self, executor):
+        self.closed = False
+        self.executor = executor
+        self.heap = []
+        self.counter = itertools.count()
+        self.condition = Condition()
+
+        Thread.__init__(self, name="Thread-{0}".format(self.__class__.__name__))
+        self.daemon = True
+
+    def close(self):
+        """Shuts down the thread and cancels the scheduled calls."""
+        with self.condition:
+            self.closed = True
+            for item in self.heap:
+                item[2].cancel()
+            self.heap = []
+            self.condition.notify()
+
+    def submit(self, when, fn, *args, **kwargs):
+        """Schedules fn to be submitted at when, in seconds since the epoch."""
+        future = futures.Future()
+        with self.condition:
+            heapq.heappush(self.heap, (when, next(self.counter), future, fn, args, kwargs))
+            self.condition.notify()
+
+        return future
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.closed and (not self.heap or self.heap[0][0] > time()):
+                    self.condition.wait(self.heap[0][0] - time() if self.heap else None)
+
+                if self.closed:
+                    return
+
+                when, _, future, fn, args, kwargs = heapq.heappop(self.heap)
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                result = self.executor.submit(fn, *args, **kwargs)
+            except RuntimeError:
+                # The executor has been shut down
+                future.set_exception(futures.CancelledError())
+                continue
+
+            result.add_done_callback(lambda result, future=future: self._resolve(future, result))
+
+    @staticmethod
+    def _resolve(future, result):
+        if result.cancelled():
+            future.set_exception(futures.CancelledError())
+        elif result.exception() is not None:
+            future.set_exception(result.exception())
+        else:
+            future.set_result(result.result())
+
+
 class SegmentedStreamWorker(Thread):
     """The general worker thread.
 
@@ -117,7 +219,18 @@ class SegmentedStreamWriter(Thread):
         self.timeout = timeout
         self.ignore_names = ignore_names
         self.executor = CompatThreadPoolExecutor(max_workers=threads)
+        # Started for the first segment which is not available yet
+        self.scheduler = None
         self.futures = queue.Queue(size)
+        # Duplicate requests are sent for responses slower than this percentile
+        self.hedge_percentile = self.session.options.get("stream-segment-hedge")
+        self.hedge_executor = None
+        self.response_times = ResponseTimes()
+        if self.hedge_percentile:
+            self.hedge_executor = CompatThreadPoolExecutor(max_workers=threads * 2)
+        # Segments of at least this many bytes are downloaded in parts
+        self.split_threshold = self.session.options.get("stream-split-threshold")
+        self.split_connections = self.session.options.get("stream-split-connections")
 
         Thread.__init__(self, name="Thread-{0}".format(self.__class__.__name__))
         self.daemon = True
@@ -129,21 +242,45 @@ class SegmentedStreamWriter(Thread):
 
         self.closed = True
         self.reader.buffer.close()
+        if self.scheduler:
+            self.scheduler.close()
         self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.hedge_executor:
+            self.hedge_executor.shutdown(wait=False, cancel_futures=True)
+
+        if self.reader.segment_window:
+            self.reader.segment_window.end()
 
     def put(self, segment):
         """Adds a segment to the download pool and write queue."""
         if self.closed:
             return
 
-        if segment is not None:
-            future = self.executor.submit(self.fetch, segment,
-                                          retries=self.retries)
-        else:
+        if segment is None:
             future = None
+        else:
+            available_at = self.available_at(segment)
+            if available_at > time():
+                # Fetched once it is available, without blocking a thread until then
+                if not self.scheduler:
+                    self.scheduler = FetchScheduler(self.executor)
+                    self.scheduler.start()
+                future = self.scheduler.submit(available_at, self.fetch, segment,
+                                               retries=self.retries)
+            else:
+                future = self.executor.submit(self.fetch, segment,
+                                              retries=self.retries)
 
         self.queue(self.futures, (segment, future))
 
+    def available_at(self, segment):
+        """Returns the time the segment can be fetched at, in seconds
+        since the epoch.
+
+        Can be overridden by the inheriting class.
+        """
+        return 0
+
     def queue(self, queue_, value):
         """Puts a value into a queue but aborts if this thread is closed."""
         while not self.closed:
@@ -153,6 +290,98 @@ class SegmentedStreamWriter(Thread):
             except queue.Full:
                 continue
 
+    def request(self, url, stream=False, **kwargs):
+        """Sends a GET request for a segment.
+
+        When hedging is enabled and no response was received within the
+        configured percentile of the recent response times, a duplicate
+        request is sent on another connection. The first response is
+        returned and the other request is discarded.
+
+        Segments larger than the split threshold are downloaded with
+        concurrent Range requests, and interrupted downloads are resumed
+        after the last byte read.
+        """
+        kwargs.setdefault("on_retry", self._retried)
+        if self.hedge_executor:
+            res = self._hedged_request(url, **kwargs)
+        else:
+            res = self.session.http.get(url, stream=True, **kwargs)
+
+        res = ResumableResponse(self.session, res, self.retries, metrics=self.reader.metrics, **kwargs)
+        if self.split_threshold and RangedResponse.supported(res, self.split_threshold):
+            res = RangedResponse(self.session, res, self.split_connections, **kwargs)
+
+        if not stream:
+            try:
+                res.content
+            except RequestException as err:
+                if res.resumable:
+                    raise kwargs.get("exception", StreamError)("Unable to read {0}: {1}".format(url, err))
+
+                # Downloaded again from the start, retried by the session
+                return self.session.http.get(url, **kwargs)
+
+        return res
+
+    def _retried(self, err, delay):
+        self.reader.metrics.inc("segment_retries_total")
+
+    def _hedged_request(self, url, **kwargs):
+        delay = self.response_times.percentile(self.hedge_percentile)
+        if delay is None:
+            res = self.session.http.get(url, stream=True, **kwargs)
+            self.response_times.add(res.elapsed.total_seconds())
+            return res
+
+        # Responses are streamed so the loser is closed before its body is read
+        pending = [self.hedge_executor.submit(self.session.http.get, url, stream=True, **kwargs)]
+        pending[0].add_done_callback(self._add_response_time)
+        done, _ = futures.wait(pending, timeout=max(delay, HEDGE_MIN_DELAY))
+        if not done and not self.closed:
+            log.debug("Hedging request for {0} after {1:.3f}s", url, delay)
+            self.reader.metrics.inc("segment_hedged_requests_total")
+            hedge = self.hedge_executor.submit(self.session.http.get, url, stream=True, **kwargs)
+            hedge.add_done_callback(self._add_response_time)
+            pending.append(hedge)
+        else:
+            hedge = None
+
+        res = error = None
+        while pending and res is None:
+            done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as err:
+                    error = err
+                    continue
+
+                if res is None:
+                    res = result
+                    if future is hedge:
+                        self.reader.metrics.inc("segment_hedge_wins_total")
+                else:
+                    result.close()
+
+        for future in pending:
+            if not future.cancel():
+                future.add_done_callback(self._discard_response)
+
+        if res is None:
+            raise error
+
+        return res
+
+    def _add_response_time(self, future):
+        if not future.cancelled() and not future.exception():
+            self.response_times.add(future.result().elapsed.total_seconds())
+
+    @staticmethod
+    def _discard_response(future):
+        if not future.cancelled() and not future.exception():
+            future.result().close()
+
     def fetch(self, segment):
         """Fetches a segment.
 
@@ -207,10 +436,20 @@ class SegmentedStreamReader(StreamIO):
             timeout = self.session.options.get("stream-timeout")
 
         self.timeout = timeout
+        # Optional SegmentWindow which the writer adds complete segments to
+        self.segment_window = getattr(stream, "segment_window", None)
+        self.metrics = self.session.metrics.stream(stream)
 
     def open(self):
         buffer_size = self.session.get_option("ringbuffer-size")
-        self.buffer = RingBuffer(buffer_size)
+        spill_size = self.session.get_option("ringbuffer-spill-size")
+        if spill_size:
+            self.buffer = SpillBuffer(buffer_size, spill_size,
+                                      spill_time=self.session.get_option("ringbuffer-spill-time"),
+                                      spill_dir=self.session.get_option("ringbuffer-spill-dir"))
+        else:
+            self.buffer = RingBuffer(buffer_size)
+        self.session.buffer_pool.register(self.buffer, repr(self.stream))
         self.writer = self.__writer__(self)
         self.worker = self.__worker__(self)
 
@@ -221,10 +460,17 @@ class SegmentedStreamReader(StreamIO):
         self.worker.close()
         self.writer.close()
         self.buffer.close()
+        self.metrics.close()
 
     def read(self, size):
         if not self.buffer:
             return b""
 
-        return self.buffer.read(size, block=self.writer.is_alive(),
+        data = self.buffer.read(size, block=self.writer.is_alive(),
                                 timeout=self.timeout)
+
+        self.metrics.inc("output_bytes_total", len(data))
+        self.metrics.set("buffer_fill_bytes", self.buffer.length)
+        self.metrics.set("buffer_size_bytes", self.buffer.buffer_size)
+
+        return data
@@ -0,0 +1,480 @@
+"""In-process MPEG-TS remuxer.
+
+Merges the elementary streams of several MPEG-TS inputs into a single
+program without spawning an external process. The PIDs of every input
+are remapped into one PID space, a new PAT/PMT is generated and the
+PES packets are interleaved by their decoding timestamps.
+"""
+from __future__ import division
+
+import logging
+import struct
+from collections import OrderedDict
+from threading import Thread
+
+from ..buffers import RingBuffer
+from ..compat import queue, range
+from .stream import StreamIO
+
+log = logging.getLogger(__name__)
+
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+TS_READ_SIZE = TS_PACKET_SIZE * 64
+
+PID_PAT = 0x0000
+PID_PMT = 0x1000
+PID_ES_START = 0x0100
+PID_NULL = 0x1FFF
+
+TABLE_ID_PAT = 0x00
+TABLE_ID_PMT = 0x02
+
+VIDEO_STREAM_TYPES = (0x01, 0x02, 0x10, 0x1B, 0x24, 0x42, 0xEA)
+AUDIO_STREAM_TYPES = (0x03, 0x04, 0x06, 0x0F, 0x11, 0x1C,
+                      0x81, 0x82, 0x83, 0x84, 0x85, 0x86, 0x87)
+
+# Timestamps are 33 bit values in a 90 kHz clock
+TIMESTAMP_WRAP = 1 << 33
+PSI_INTERVAL = 9000  # 100 ms
+
+
+def _crc32_table():
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            if crc & 0x80000000:
+                crc = (crc << 1) ^ 0x04C11DB7
+            else:
+                crc <<= 1
+        table.append(crc & 0xFFFFFFFF)
+
+    return table
+
+
+CRC32_TABLE = _crc32_table()
+
+
+def crc32_mpeg2(data):
+    crc = 0xFFFFFFFF
+    for byte in bytearray(data):
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ CRC32_TABLE[((crc >> 24) ^ byte) & 0xFF]
+
+    return crc
+
+
+def packet_pid(packet):
+    return ((packet[1] & 0x1F) << 8) | packet[2]
+
+
+def packet_payload(packet):
+    """Returns the payload offset of a packet, or None if it has no payload."""
+    adaptation_field_control = (packet[3] >> 4) & 0x03
+    offset = 4
+
+    if adaptation_field_control & 0x02:
+        offset += 1 + packet[4]
+
+    if not adaptation_field_control & 0x01 or offset >= TS_PACKET_SIZE:
+        return None
+
+    return offset
+
+
+def parse_timestamp(data, offset):
+    return (((data[offset] >> 1) & 0x07) << 30
+            | data[offset + 1] << 22
+            | (data[offset + 2] >> 1) << 15
+            | data[offset + 3] << 7
+            | data[offset + 4] >> 1)
+
+
+def pes_timestamp(packet, offset):
+    """Returns the DTS (or PTS if no DTS is set) of a PES header."""
+    pes = packet[offset:]
+    if len(pes) < 14 or pes[0:3] != b"\x00\x00\x01":
+        return None
+
+    pts_dts_flags = pes[7] >> 6
+    if pts_dts_flags == 0x03 and len(pes) >= 19:
+        return parse_timestamp(pes, 14)
+    elif pts_dts_flags & 0x02:
+        return parse_timestamp(pes, 9)
+
+
+def psi_section(packet, offset, table_id):
+    """Returns a PSI section contained in a single packet."""
+    pointer = packet[offset]
+    section = packet[offset + 1 + pointer:]
+    if len(section) < 3 or section[0] != table_id:
+        return None
+
+    section_length = ((section[1] & 0x0F) << 8) | section[2]
+    if len(section) < 3 + section_length:
+        return None
+
+    return section[:3 + section_length]
+
+
+def build_section(table_id, table_id_ext, version, body):
+    length = 5 + len(body) + 4
+    section = bytearray([table_id, 0xB0 | (length >> 8), length & 0xFF,
+                         table_id_ext >> 8, table_id_ext & 0xFF,
+                         0xC1 | ((version & 0x1F) << 1), 0x00, 0x00])
+    section += body
+    section += struct.pack(">I", crc32_mpeg2(section))
+
+    return section
+
+
+class TSUnit(object):
+    """A run of packets starting with a timestamped PES header."""
+
+    __slots__ = ("timestamp", "data")
+
+    def __init__(self, timestamp):
+        self.timestamp = timestamp
+        self.data = bytearray()
+
+
+class TSDemuxer(Thread):
+    """Splits a MPEG-TS input into timestamped units.
+
+    Only packets belonging to the selected elementary streams are kept,
+    PSI tables are consumed and used to track the stream layout.
+    """
+
+    def __init__(self, fd, stream_types, keep_pcr=False, size=64):
+        self.fd = fd
+        self.stream_types = stream_types
+        self.keep_pcr = keep_pcr
+        self.units = queue.Queue(size)
+
+        self.pmt_pid = None
+        self.pcr_pid = None
+        self.streams = OrderedDict()
+        self.version = 0
+        self.error = None
+        self.running = False
+
+        self._last_timestamp = None
+        self._timestamp_offset = 0
+
+        Thread.__init__(self, name="Thread-{0}".format(self.__class__.__name__))
+        self.daemon = True
+
+    def iter_packets(self):
+        buf = bytearray()
+
+        while self.running:
+            data = self.fd.read(TS_READ_SIZE)
+            if not data:
+                break
+
+            buf += data
+            offset = 0
+
+            while len(buf) - offset >= TS_PACKET_SIZE:
+                if buf[offset] != TS_SYNC_BYTE:
+                    sync = buf.find(b"\x47", offset + 1)
+                    log.debug("Lost MPEG-TS sync, skipping {0} bytes",
+                              (sync if sync >= 0 else len(buf)) - offset)
+                    offset = sync if sync >= 0 else len(buf)
+                    continue
+
+                yield buf[offset:offset + TS_PACKET_SIZE]
+                offset += TS_PACKET_SIZE
+
+            del buf[:offset]
+
+    def unwrap_timestamp(self, timestamp):
+        timestamp += self._timestamp_offset
+        if self._last_timestamp is not None and timestamp < self._last_timestamp - TIMESTAMP_WRAP // 2:
+            self._timestamp_offset += TIMESTAMP_WRAP
+            timestamp += TIMESTAMP_WRAP
+
+        self._last_timestamp = timestamp
+
+        return timestamp
+
+    def parse_pat(self, packet, offset):
+        section = psi_section(packet, offset, TABLE_ID_PAT)
+        if not section:
+            return
+
+        for i in range(8, len(section) - 4, 4):
+            program_number = (section[i] << 8) | section[i + 1]
+            if program_number != 0:
+                self.pmt_pid = ((section[i + 2] & 0x1F) << 8) | section[i + 3]
+                break
+
+    def parse_pmt(self, packet, offset):
+        section = psi_section(packet, offset, TABLE_ID_PMT)
+        if not section:
+            return
+
+        pcr_pid = ((section[8] & 0x1F) << 8) | section[9]
+        program_info_length = ((section[10] & 0x0F) << 8) | section[11]
+        streams = OrderedDict()
+
+        i, end = 12 + program_info_length, len(section) - 4
+        while i + 5 <= end:
+            stream_type = section[i]
+            pid = ((section[i + 1] & 0x1F) << 8) | section[i + 2]
+            es_info_length = ((section[i + 3] & 0x0F) << 8) | section[i + 4]
+            descriptors = bytes(section[i + 5:i + 5 + es_info_length])
+            i += 5 + es_info_length
+
+            if stream_type in self.stream_types:
+                streams[pid] = (stream_type, descriptors)
+
+        if streams != self.streams or pcr_pid != self.pcr_pid:
+            self.pcr_pid = pcr_pid
+            # Replaced rather than mutated, the muxer reads it from another thread
+            self.streams = streams
+            self.version += 1
+
+    def iter_units(self):
+        unit = None
+
+        for packet in self.iter_packets():
+            pid = packet_pid(packet)
+            offset = packet_payload(packet)
+
+            if pid == PID_PAT:
+                if offset is not None and packet[1] & 0x40:
+                    self.parse_pat(packet, offset)
+                continue
+            elif pid == self.pmt_pid:
+                if offset is not None and packet[1] & 0x40:
+                    self.parse_pmt(packet, offset)
+                continue
+            elif pid not in self.streams and not (self.keep_pcr and pid == self.pcr_pid):
+                continue
+
+            if offset is not None and packet[1] & 0x40:
+                timestamp = pes_timestamp(packet, offset)
+                if timestamp is not None:
+                    if unit:
+                        yield unit
+                    unit = TSUnit(self.unwrap_timestamp(timestamp))
+
+            # Packets before the first timestamp can not be placed in time
+            if unit:
+                unit.data += packet
+
+        if unit:
+            yield unit
+
+    def put(self, unit):
+        while self.running:
+            try:
+                self.units.put(unit, block=True, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def run(self):
+        self.running = True
+
+        try:
+            for unit in self.iter_units():
+                self.put(unit)
+        except IOError as err:
+            self.error = err
+            log.error("Error reading MPEG-TS input: {0}", err)
+
+        self.put(None)
+
+    def get(self, timeout=0.5):
+        """Returns the next unit, None at the end of the input and
+        raises queue.Empty if nothing is available yet."""
+        return self.units.get(block=True, timeout=timeout)
+
+    def stop(self):
+        self.running = False
+
+        if hasattr(self.fd, "close"):
+            try:
+                self.fd.close()
+            except Exception:
+                pass
+
+
+class TSMuxerWorker(Thread):
+    def __init__(self, muxer):
+        self.muxer = muxer
+        self.demuxers = muxer.demuxers
+        self.buffer = muxer.buffer
+        self.running = False
+
+        self.pids = {}
+        self.pcr_pid = PID_NULL
+        self.pmt = bytearray()
+        self.pmt_version = -1
+        self.versions = [0] * len(self.demuxers)
+        self.continuity = {PID_PAT: 0, PID_PMT: 0}
+        self.psi_timestamp = None
+
+        Thread.__init__(self, name="Thread-{0}".format(self.__class__.__name__))
+        self.daemon = True
+
+    def update_program(self):
+        """Remaps the PIDs of all inputs and rebuilds the PMT."""
+        body = bytearray()
+        self.pcr_pid = PID_NULL
+
+        for index, demuxer in enumerate(self.demuxers):
+            self.versions[index] = demuxer.version
+            streams = demuxer.streams
+
+            for pid, (stream_type, descriptors) in streams.items():
+                out_pid = self.map_pid(index, pid)
+                body += bytearray([stream_type, 0xE0 | (out_pid >> 8), out_pid & 0xFF,
+                                   0xF0 | (len(descriptors) >> 8), len(descriptors) & 0xFF])
+                body += descriptors
+
+            if index == 0 and demuxer.pcr_pid not in (None, PID_NULL):
+                self.pcr_pid = self.map_pid(index, demuxer.pcr_pid)
+
+        if self.pcr_pid == PID_NULL and self.pids:
+            self.pcr_pid = min(self.pids.values())
+
+        self.pmt_version = (self.pmt_version + 1) % 32
+        self.pmt = bytearray([0xE0 | (self.pcr_pid >> 8), self.pcr_pid & 0xFF, 0xF0, 0x00]) + body
+        self.psi_timestamp = None
+
+        log.debug("Muxing {0} elementary streams (PMT version {1})",
+                  len(self.pids), self.pmt_version)
+
+    def map_pid(self, index, pid):
+        key = (index, pid)
+        if key not in self.pids:
+            self.pids[key] = PID_ES_START + len(self.pids)
+
+        return self.pids[key]
+
+    def psi_packet(self, pid, section):
+        cc = self.continuity[pid]
+        self.continuity[pid] = (cc + 1) % 16
+
+        packet = bytearray([TS_SYNC_BYTE, 0x40 | (pid >> 8), pid & 0xFF, 0x10 | cc, 0x00])
+        packet += section
+        packet += b"\xff" * (TS_PACKET_SIZE - len(packet))
+
+        return packet
+
+    def write_psi(self):
+        pat = build_section(TABLE_ID_PAT, 1, 0,
+                            bytearray([0x00, 0x01, 0xE0 | (PID_PMT >> 8), PID_PMT & 0xFF]))
+        pmt = build_section(TABLE_ID_PMT, 1, self.pmt_version, self.pmt)
+
+        self.buffer.write(self.psi_packet(PID_PAT, pat) + self.psi_packet(PID_PMT, pmt))
+
+    def remap(self, index, unit):
+        data = unit.data
+        out = bytearray()
+
+        for offset in range(0, len(data), TS_PACKET_SIZE):
+            out_pid = self.pids.get((index, packet_pid(data[offset:offset + 3])))
+            if out_pid is None:
+                continue
+
+            packet = data[offset:offset + TS_PACKET_SIZE]
+            packet[1] = (packet[1] & 0xE0) | (out_pid >> 8)
+            packet[2] = out_pid & 0xFF
+            out += packet
+
+        return out
+
+    def next_unit(self, demuxer):
+        while self.running:
+            try:
+                return demuxer.get()
+            except queue.Empty:
+                continue
+
+    def run(self):
+        self.running = True
+        heads = [None] * len(self.demuxers)
+        active = list(range(len(self.demuxers)))
+
+        while self.running and active:
+            for index in list(active):
+                if heads[index] is None:
+                    heads[index] = self.next_unit(self.demuxers[index])
+                    if heads[index] is None:
+                        active.remove(index)
+
+            if not self.running or not active:
+                break
+
+            if any(self.demuxers[i].version != self.versions[i] for i in active):
+                self.update_program()
+
+            index = min(active, key=lambda i: heads[i].timestamp)
+            unit, heads[index] = heads[index], None
+
+            if self.psi_timestamp is None or abs(unit.timestamp - self.psi_timestamp) >= PSI_INTERVAL:
+                self.write_psi()
+                self.psi_timestamp = unit.timestamp
+
+            self.buffer.write(self.remap(index, unit))
+
+        self.stop()
+
+    def stop(self):
+        self.running = False
+        self.buffer.close()
+
+
+class TSMuxer(StreamIO):
+    """Muxes MPEG-TS substreams in-process.
+
+    The first stream provides video and audio, the audio elementary
+    streams of any further streams are added to the same program.
+    """
+
+    def __init__(self, session, *streams, **options):
+        self.session = session
+        self.streams = streams
+        self.timeout = options.pop("timeout", None) or session.options.get("stream-timeout")
+        self.buffer = None
+        self.demuxers = []
+        self.worker = None
+
+    def open(self):
+        self.buffer = RingBuffer(self.session.get_option("ringbuffer-size"))
+        self.session.buffer_pool.register(self.buffer, type(self).__name__)
+        self.demuxers = [
+            TSDemuxer(stream,
+                      VIDEO_STREAM_TYPES + AUDIO_STREAM_TYPES if i == 0 else AUDIO_STREAM_TYPES,
+                      keep_pcr=i == 0)
+            for i, stream in enumerate(self.streams)
+        ]
+        self.worker = TSMuxerWorker(self)
+
+        for demuxer in self.demuxers:
+            demuxer.start()
+        self.worker.start()
+
+        return self
+
+    def read(self, size=-1):
+        if not self.buffer:
+            return b""
+
+        return self.buffer.read(size, block=self.worker.is_alive(),
+                                timeout=self.timeout)
+
+    def close(self):
+        log.debug("Closing MPEG-TS muxer")
+        if self.worker:
+            self.worker.stop()
+
+        for demuxer in self.demuxers:
+            demuxer.stop()
+
+
+__all__ = ["TSMuxer"]
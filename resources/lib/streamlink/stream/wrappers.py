@@ -40,7 +40,8 @@ class StreamIOIterWrapper(io.IOBase):
         return self.buffer.read(size)
 
     def close(self):
-        pass
+        if hasattr(self.iterator, "close"):
+            self.iterator.close()
 
 
 class StreamIOThreadWrapper(io.IOBase):
@@ -89,6 +90,7 @@ class StreamIOThreadWrapper(io.IOBase):
 
     def __init__(self, session, fd, timeout=30):
         self.buffer = RingBuffer(session.get_option("ringbuffer-size"))
+        session.buffer_pool.register(self.buffer, repr(fd))
         self.fd = fd
         self.timeout = timeout
 
@@ -1,5 +1,7 @@
+import errno
 import os
 import tempfile
+import time
 
 from ..compat import is_win32, is_py3
 
@@ -13,12 +15,43 @@ if is_win32:
     PIPE_WAIT = 0x00000000
     PIPE_UNLIMITED_INSTANCES = 255
     INVALID_HANDLE_VALUE = -1
+else:
+    import fcntl
+
+    # Linux only, the constant is missing from the fcntl module before Python 3.10
+    F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031)
+    F_GETPIPE_SZ = getattr(fcntl, "F_GETPIPE_SZ", 1032)
+
+
+def set_pipe_size(fd, size):
+    """Attempts to resize the kernel buffer of a pipe.
+
+    Returns the resulting size of the buffer or None if the platform
+    does not support resizing pipes.
+    """
+    if is_win32 or not size:
+        return None
+
+    try:
+        fcntl.fcntl(fd, F_SETPIPE_SZ, size)
+    except (IOError, OSError) as err:
+        # EPERM: larger than /proc/sys/fs/pipe-max-size
+        if err.errno not in (errno.EPERM, errno.EINVAL, errno.EBADF):
+            raise
+
+    try:
+        return fcntl.fcntl(fd, F_GETPIPE_SZ)
+    except (IOError, OSError):
+        return None
 
 
 class NamedPipe(object):
-    def __init__(self, name):
+    def __init__(self, name, size=None):
         self.fifo = None
         self.pipe = None
+        self.size = size
+        self.bytes_written = 0
+        self.write_time = 0.0
 
         if is_win32:
             self.path = os.path.join("\\\\.\\pipe", name)
@@ -31,7 +64,7 @@ class NamedPipe(object):
         os.mkfifo(name, 0o660)
 
     def _create_named_pipe(self, path):
-        bufsize = 8192
+        bufsize = self.size or 8192
 
         if is_py3:
             create_named_pipe = windll.kernel32.CreateNamedPipeW
@@ -53,17 +86,37 @@ class NamedPipe(object):
     def open(self, mode):
         if not self.pipe:
             self.fifo = open(self.path, mode)
+            if self.size:
+                self.size = set_pipe_size(self.fifo.fileno(), self.size) or self.size
 
-    def write(self, data):
+    def fileno(self):
         if self.pipe:
-            windll.kernel32.ConnectNamedPipe(self.pipe, None)
-            written = c_ulong(0)
-            windll.kernel32.WriteFile(self.pipe, cast(data, c_void_p),
-                                      len(data), byref(written),
-                                      None)
+            raise IOError("Named pipes on Windows do not have a file descriptor")
+
+        return self.fifo.fileno()
+
+    def write(self, data):
+        start = time.time()
+        try:
+            if self.pipe:
+                windll.kernel32.ConnectNamedPipe(self.pipe, None)
+                written = c_ulong(0)
+                if not windll.kernel32.WriteFile(self.pipe, cast(data, c_void_p),
+                                                 len(data), byref(written),
+                                                 None):
+                    error_code = windll.kernel32.GetLastError()
+                    raise IOError("Error code 0x{0:08X}".format(error_code))
+                written = written.value
+            else:
+                written = self.fifo.write(data)
+                # File objects of Python 2 return None, they write all of it or raise
+                if written is None:
+                    written = len(data)
+
+            self.bytes_written += written
             return written
-        else:
-            return self.fifo.write(data)
+        finally:
+            self.write_time += time.time() - start
 
     def close(self):
         if self.pipe:
@@ -400,8 +400,72 @@ def build_parser():
         type=num(int, min=0, max=65535),
         default=0,
         help="""
-        A fixed port to use for the external HTTP server if that mode is
-        enabled. Omit or set to 0 to use a random high ( >1024) port.
+        A fixed port to use for the external HTTP server if that mode or
+        --player-external-hls is enabled. Omit or set to 0 to use a random
+        high ( >1024) port.
+        """
+    )
+    player.add_argument(
+        "--player-external-http-buffer-size",
+        metavar="SIZE",
+        type=filesize,
+        default=16 * 1024 * 1024,
+        help="""
+        The size of the buffer shared by the clients of the external HTTP
+        server. Add a M or K suffix to specify mega or kilo bytes instead of
+        bytes.
+
+        All clients are served from a single stream. A client which falls
+        behind by more than this amount of data will skip ahead to the most
+        recent data. Only MPEG-TS streams can be skipped ahead in, clients
+        of other streams are disconnected instead, and can only connect while
+        the start of the stream is still in the buffer.
+
+        Default is 16M.
+        """
+    )
+    player.add_argument(
+        "--player-external-http-drop-slow",
+        action="store_true",
+        help="""
+        Disconnect clients of the external HTTP server which fall behind the
+        shared buffer instead of letting them skip ahead.
+        """
+    )
+    player.add_argument(
+        "--player-external-hls",
+        action="store_true",
+        help="""
+        Serve the stream as a local HLS playlist without running any player,
+        similar to --player-external-http.
+
+        The segments are downloaded once and kept in a rolling window, which
+        lets players seek back in the stream and reconnect without restarting
+        the download. Any number of players can watch the stream at the same
+        time.
+
+        Only HLS streams and DASH streams without separate audio and video
+        are supported.
+        """
+    )
+    player.add_argument(
+        "--player-external-hls-dvr",
+        metavar="DURATION",
+        type=hours_minutes_seconds,
+        default=120,
+        help="""
+        The duration of the window of segments served by --player-external-hls,
+        in seconds or in the HH:MM:SS format.
+
+        Default is 120.
+        """
+    )
+    player.add_argument(
+        "--player-external-hls-cache-dir",
+        metavar="DIR",
+        help="""
+        Store the segments served by --player-external-hls in a temporary
+        directory inside DIR instead of in memory.
         """
     )
     player.add_argument(
@@ -672,6 +736,30 @@ def build_parser():
 
         """
     )
+    stream.add_argument(
+        "--metrics-port",
+        metavar="PORT",
+        type=num(int, min=0, max=65535),
+        help="""
+        Serve metrics about the opened streams, like segment download times,
+        retries and buffer fill levels, in the Prometheus text format at
+        http://127.0.0.1:PORT/metrics. The metrics of a stream are removed
+        once it is closed.
+        """
+    )
+    stream.add_argument(
+        "--streams-cache-ttl",
+        metavar="SECONDS",
+        type=num(float, min=0),
+        help="""
+        Cache the list of available streams of a URL for SECONDS second(s),
+        or until the tokens of the plugin expire if that is sooner. The
+        streams are fetched again after that, e.g. when a new client
+        connects to --player-external-http.
+
+        Default is 0 (disabled).
+        """
+    )
 
     transport = parser.add_argument_group("Stream transport options")
     transport.add_argument(
@@ -898,6 +986,70 @@ def build_parser():
         help="""
         Skip to the beginning of a live stream, or as far back as possible.
         """)
+    transport.add_argument(
+        "--hls-mux-internal",
+        action="store_true",
+        help="""
+        Mux HLS streams with separate audio tracks in-process instead of
+        using FFmpeg. Only MPEG-TS segments are supported, streams with other
+        segments are muxed by FFmpeg, or played without their separate audio
+        tracks if it is not available.
+
+        The in-process muxer is always used when FFmpeg is not available.
+        """)
+    transport.add_argument(
+        "--hls-fast-start",
+        action="store_true",
+        help="""
+        Start HLS streams faster.
+
+        The media playlists of a variant playlist are fetched while the
+        stream is selected, the first --hls-live-edge segments are
+        downloaded in parallel and the first of them is streamed.
+
+        This makes additional requests for the playlists of the streams
+        which are not used.
+        """)
+    transport.add_argument(
+        "--hls-low-latency",
+        action="store_true",
+        help="""
+        Play Low-Latency HLS streams close to the live edge.
+
+        The partial segments of the stream are downloaded as soon as they
+        are published, using blocking playlist reloads if the server
+        supports them. The stream starts the part hold back of the
+        playlist behind the live edge, --hls-live-edge is ignored.
+
+        Streams without partial segments are played as usual. Encrypted
+        segments are downloaded whole once they are complete.
+        """)
+    transport.add_argument(
+        "--hls-abr",
+        action="store_true",
+        help="""
+        Add an "adaptive" stream to HLS variant playlists.
+
+        The adaptive stream starts with the lowest quality and switches
+        between the variants at segment boundaries, depending on the
+        measured download throughput and the amount of buffered data.
+        """)
+    transport.add_argument(
+        "--hls-abr-min",
+        metavar="QUALITY",
+        help="""
+        Lowest quality the adaptive stream switches to, e.g. "360p".
+
+        Qualities are compared like the values of --stream-sorting-excludes.
+        """)
+    transport.add_argument(
+        "--hls-abr-max",
+        metavar="QUALITY",
+        help="""
+        Highest quality the adaptive stream switches to, e.g. "1080p".
+
+        Qualities are compared like the values of --stream-sorting-excludes.
+        """)
     transport.add_argument(
         "--http-stream-timeout",
         type=num(float, min=0),
@@ -932,6 +1084,53 @@ def build_parser():
         Raspberry Pi) when playing stream types that require some extra
         processing (such as HDS) to avoid unnecessary background processing.
         """)
+    transport.add_argument(
+        "--ringbuffer-budget",
+        metavar="SIZE",
+        type=filesize,
+        help="""
+        The total size of the ringbuffers of all open streams. Add a M or K
+        suffix to specify mega or kilo bytes instead of bytes.
+
+        Each ringbuffer gets a share of this budget based on the bitrate of
+        its stream and on how far behind the player is, instead of the fixed
+        --ringbuffer-size.
+
+        Default is 0 (no budget).
+        """)
+    transport.add_argument(
+        "--ringbuffer-spill-size",
+        metavar="SIZE",
+        type=filesize,
+        help="""
+        Once the ringbuffer of HLS and DASH streams is full, keep writing up to
+        SIZE more bytes to a memory-mapped temporary file. Add a M or K suffix
+        to specify mega or kilo bytes instead of bytes.
+
+        This lets the download keep up with the live stream while the player
+        is paused or slow, without keeping all of the data in memory.
+
+        Default is 0 (disabled).
+        """)
+    transport.add_argument(
+        "--ringbuffer-spill-time",
+        metavar="DURATION",
+        type=hours_minutes_seconds,
+        help="""
+        Stop spilling data to the temporary file once the player has fallen
+        this far behind, in seconds or in the HH:MM:SS format.
+
+        Default is no limit.
+        """)
+    transport.add_argument(
+        "--ringbuffer-spill-dir",
+        metavar="DIR",
+        help="""
+        The directory to create the temporary file of --ringbuffer-spill-size
+        in.
+
+        Default is the system's temporary directory.
+        """)
     transport.add_argument(
         "--rtmp-proxy", "--rtmpdump-proxy",
         metavar="PROXY",
@@ -975,6 +1174,21 @@ def build_parser():
         Default is 3.
         """
     )
+    transport.add_argument(
+        "--stream-segment-hedge",
+        type=num(float, min=0, max=100),
+        metavar="PERCENTILE",
+        help="""
+        Send a duplicate request for a segment if no response was received
+        within this percentile of the recent response times, e.g. 95. The
+        first response is used and the other request is discarded.
+
+        This reduces the stalls caused by single slow responses at the cost
+        of some additional requests. Used by the HLS, DASH and HDS streams.
+
+        Default is disabled.
+        """
+    )
     transport.add_argument(
         "--stream-segment-threads",
         type=num(int, max=10),
@@ -1001,6 +1215,33 @@ def build_parser():
 
         Default is 10.0.
         """)
+    transport.add_argument(
+        "--stream-split-threshold",
+        type=filesize,
+        metavar="SIZE",
+        help="""
+        Segments and HTTP streams of at least this size are downloaded in parts
+        with concurrent Range requests, if the server supports them. This makes
+        better use of the bandwidth of high latency connections.
+
+        Used by the HLS, DASH, HDS and HTTP streams. The size can be given in
+        bytes or with a K or M suffix, e.g. 8M.
+
+        Default is disabled.
+        """
+    )
+    transport.add_argument(
+        "--stream-split-connections",
+        type=num(int, min=2, max=10),
+        metavar="CONNECTIONS",
+        help="""
+        How many concurrent Range requests are used to download a segment or
+        HTTP stream larger than --stream-split-threshold. Minimum value is 2
+        and maximum is 10.
+
+        Default is 4.
+        """
+    )
     transport.add_argument(
         "--stream-timeout",
         type=num(float, min=0),
@@ -1098,6 +1339,20 @@ def build_parser():
         Example: "aac"
         """
     )
+    transport.add_argument(
+        "--ffmpeg-pipe-size",
+        metavar="SIZE",
+        type=filesize,
+        help="""
+        The size of the pipes used to pass data to and from ffmpeg, and of
+        the chunks copied into them. Add a M or K suffix to specify mega or
+        kilo bytes instead of bytes.
+
+        On Linux the size is limited by /proc/sys/fs/pipe-max-size.
+
+        Default is "1M".
+        """
+    )
 
     http = parser.add_argument_group("HTTP options")
     http.add_argument(
@@ -1208,6 +1463,27 @@ def build_parser():
         Default is 20.0.
         """
     )
+    http.add_argument(
+        "--http-dns-cache-ttl",
+        metavar="SECONDS",
+        type=num(float, min=0),
+        help="""
+        Cache the addresses of host names for this many seconds instead of
+        asking the system resolver for every new connection. The hosts of the
+        segments of HLS playlists are also looked up in advance.
+
+        Default is disabled.
+        """
+    )
+    http.add_argument(
+        "--http-happy-eyeballs",
+        action="store_true",
+        help="""
+        Connect to the IPv6 and IPv4 addresses of a host concurrently, starting
+        the next attempt after 250ms, and use the first connection which
+        succeeds. Avoids long connection times on networks with broken IPv6.
+        """
+    )
 
     # Deprecated options
     http.add_argument(
@@ -4,17 +4,20 @@ import logging
 import os
 import platform
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from gettext import gettext
 
 import requests
 import sys
 import signal
+import socket
 
 from contextlib import closing
 from distutils.version import StrictVersion
 from functools import partial
 from itertools import chain
 from socks import __version__ as socks_version
+from threading import Event
 from time import sleep
 from websocket import __version__ as websocket_version
 
@@ -23,7 +26,8 @@ from streamlink import (Streamlink, StreamError, PluginError,
                         NoPluginError)
 from streamlink.cache import Cache
 from streamlink.exceptions import FatalPluginError
-from streamlink.stream import StreamProcess
+from streamlink.stream import DASHStream, HLSStream, StreamProcess
+from streamlink.stream.segment_window import SegmentWindow
 from streamlink.plugin import PluginOptions
 from streamlink.utils import LazyFormatter
 
@@ -34,7 +38,7 @@ from streamlink.utils.encoding import maybe_decode, get_filesystem_encoding
 from .console import ConsoleOutput, ConsoleUserInputRequester
 from .constants import CONFIG_FILES, PLUGINS_DIR, STREAM_SYNONYMS, DEFAULT_STREAM_METADATA
 from .output import FileOutput, PlayerOutput
-from .utils import NamedPipe, HTTPServer, ignored, progress, stream_to_url
+from .utils import NamedPipe, HLSServer, HTTPServer, SharedHTTPServer, ignored, progress, stream_to_url
 
 ACCEPTABLE_ERRNO = (errno.EPIPE, errno.EINVAL, errno.ECONNRESET)
 try:
@@ -127,15 +131,20 @@ def create_output(plugin):
     return out
 
 
-def create_http_server(host=None, port=0):
+def create_http_server(host=None, port=0, shared=False):
     """Creates a HTTP server listening on a given host and port.
 
     If host is empty, listen on all available interfaces, and if port is 0,
-    listen on a random high port.
+    listen on a random high port. A shared server serves a single stream to
+    any number of clients.
     """
 
     try:
-        http = HTTPServer()
+        if shared:
+            http = SharedHTTPServer(buffer_size=args.player_external_http_buffer_size,
+                                    drop_slow=args.player_external_http_drop_slow)
+        else:
+            http = HTTPServer()
         http.bind(host=host, port=port)
     except OSError as err:
         console.exit("Failed to create HTTP server: {0}", err)
@@ -172,6 +181,56 @@ def iter_http_requests(server, player):
             continue
 
 
+def open_http_stream(plugin, initial_streams, player=None, attempts=0, stopped=None):
+    """Fetches and opens the stream, retrying until it succeeds or the
+    player is closed.
+
+    Gives up after failing attempts times if set, or once the optional
+    stopped event is set.
+    """
+    stream_fd = prebuffer = None
+    failures = 0
+    while not stream_fd and (not player or player.running):
+        if (stopped and stopped.is_set()) or (attempts and failures >= attempts):
+            break
+
+        try:
+            streams = initial_streams or fetch_streams(plugin)
+            initial_streams = None
+
+            for stream_name in (resolve_stream_name(streams, s) for s in args.stream):
+                if stream_name in streams:
+                    stream = streams[stream_name]
+                    break
+            else:
+                failures += 1
+                if attempts and failures >= attempts:
+                    log.error("Stream not available")
+                    continue
+
+                log.info("Stream not available, will re-fetch "
+                         "streams in 10 sec")
+                if stopped:
+                    stopped.wait(10)
+                else:
+                    sleep(10)
+                continue
+        except PluginError as err:
+            failures += 1
+            log.error(u"Unable to fetch new streams: {0}".format(err))
+            continue
+
+        try:
+            log.info("Opening stream: {0} ({1})".format(stream_name,
+                                                        type(stream).shortname()))
+            stream_fd, prebuffer = open_stream(stream)
+        except StreamError as err:
+            failures += 1
+            log.error("{0}".format(err))
+
+    return stream_fd, prebuffer
+
+
 def output_stream_http(plugin, initial_streams, external=False, port=0):
     """Continuously output the stream over HTTP."""
     global output
@@ -197,42 +256,14 @@ def output_stream_http(plugin, initial_streams, external=False, port=0):
             console.exit("Failed to start player: {0} ({1})",
                          args.player, err)
     else:
-        server = create_http_server(host=None, port=port)
-        player = None
-
-        log.info("Starting server, access with one of:")
-        for url in server.urls:
-            log.info(" " + url)
+        return output_stream_http_shared(plugin, initial_streams, port=port)
 
     for req in iter_http_requests(server, player):
         user_agent = req.headers.get("User-Agent") or "unknown player"
         log.info("Got HTTP request from {0}".format(user_agent))
 
-        stream_fd = prebuffer = None
-        while not stream_fd and (not player or player.running):
-            try:
-                streams = initial_streams or fetch_streams(plugin)
-                initial_streams = None
-
-                for stream_name in (resolve_stream_name(streams, s) for s in args.stream):
-                    if stream_name in streams:
-                        stream = streams[stream_name]
-                        break
-                else:
-                    log.info("Stream not available, will re-fetch "
-                             "streams in 10 sec")
-                    sleep(10)
-                    continue
-            except PluginError as err:
-                log.error(u"Unable to fetch new streams: {0}".format(err))
-                continue
-
-            try:
-                log.info("Opening stream: {0} ({1})".format(stream_name,
-                                                            type(stream).shortname()))
-                stream_fd, prebuffer = open_stream(stream)
-            except StreamError as err:
-                log.error("{0}".format(err))
+        stream_fd, prebuffer = open_http_stream(plugin, initial_streams, player)
+        initial_streams = None
 
         if stream_fd and prebuffer:
             log.debug("Writing stream to player")
@@ -244,6 +275,109 @@ def output_stream_http(plugin, initial_streams, external=False, port=0):
     server.close()
 
 
+def output_stream_http_shared(plugin, initial_streams, port=0):
+    """Continuously output the stream over HTTP to any number of clients.
+
+    The stream is only opened while there are clients connected and is
+    shared between all of them.
+    """
+    server = create_http_server(host=None, port=port, shared=True)
+
+    log.info("Starting server, access with one of:")
+    for url in server.urls:
+        log.info(" " + url)
+
+    # The stream is opened in the background, so the server keeps
+    # accepting and serving its clients meanwhile
+    executor = ThreadPoolExecutor(max_workers=1)
+    opening = stopped = None
+    try:
+        while True:
+            server.poll()
+
+            if opening and opening.done():
+                stream_fd, prebuffer = opening.result()
+                opening = None
+
+                if stream_fd and server.waiting:
+                    log.debug("Writing stream to HTTP clients")
+                    server.start_stream(stream_fd, prebuffer)
+                elif stream_fd:
+                    stream_fd.close()
+                elif not stopped.is_set():
+                    log.error("Could not open stream, tried {0} times".format(args.retry_open))
+                    # Disconnects the clients which were waiting for it
+                    server.close(True)
+            elif opening and not server.clients:
+                if not stopped.is_set():
+                    log.info("No HTTP clients left, no longer opening stream")
+                    stopped.set()
+            elif server.waiting and not server.streaming and not opening:
+                stopped = Event()
+                opening = executor.submit(open_http_stream, plugin, initial_streams,
+                                          attempts=args.retry_open, stopped=stopped)
+                initial_streams = None
+            elif server.streaming and not server.clients:
+                log.info("No HTTP clients left, closing stream")
+                server.stop_stream()
+    finally:
+        if stopped:
+            stopped.set()
+        executor.shutdown(wait=False)
+        server.close()
+
+
+def output_stream_hls(plugin, stream, port=0):
+    """Downloads the stream and serves its segments as a local HLS playlist."""
+    if not isinstance(stream, (HLSStream, DASHStream)):
+        console.exit("The stream type {0} can not be served as HLS",
+                     type(stream).shortname())
+
+    extension = "m4s" if isinstance(stream, DASHStream) else "ts"
+    try:
+        window = SegmentWindow(depth=args.player_external_hls_dvr,
+                               path=args.player_external_hls_cache_dir,
+                               extension=extension)
+    except (IOError, OSError) as err:
+        console.exit("Failed to create segment cache: {0}", err)
+
+    try:
+        server = HLSServer(window, port=port)
+    except socket.error as err:
+        window.close()
+        console.exit("Failed to create HTTP server: {0}", err)
+
+    stream.segment_window = window
+    try:
+        stream_fd, prebuffer = open_stream(stream)
+    except StreamError as err:
+        window.close()
+        server.close()
+        console.exit("{0}", err)
+
+    server.start()
+    log.info("Starting server, access with one of:")
+    for url in server.urls:
+        log.info(" " + url)
+
+    try:
+        # The stream data itself is not needed, it is only read to keep
+        # the segments coming
+        for data in iter(partial(stream_fd.read, 8192), b""):
+            pass
+    except IOError as err:
+        log.error("Error when reading from stream: {0}".format(err))
+
+    log.info("Stream ended, the window is still being served")
+    try:
+        while True:
+            sleep(1)
+    finally:
+        stream_fd.close()
+        server.close()
+        window.close()
+
+
 def output_stream_passthrough(plugin, stream):
     """Prepares a filename to be passed to the player."""
     global output
@@ -443,6 +577,11 @@ def handle_stream(plugin, streams, stream_name):
                 log.info("Opening stream: {0} ({1})".format(stream_name,
                                                             stream_type))
                 success = output_stream_passthrough(plugin, stream)
+            elif args.player_external_hls:
+                log.info("Opening stream: {0} ({1})".format(stream_name,
+                                                            stream_type))
+                return output_stream_hls(plugin, stream,
+                                         port=args.player_external_http_port)
             elif args.player_external_http:
                 return output_stream_http(plugin, streams, external=True,
                                           port=args.player_external_http_port)
@@ -734,6 +873,12 @@ def setup_http_session():
     if args.http_timeout:
         streamlink.set_option("http-timeout", args.http_timeout)
 
+    if args.http_dns_cache_ttl:
+        streamlink.set_option("http-dns-cache-ttl", args.http_dns_cache_ttl)
+
+    if args.http_happy_eyeballs:
+        streamlink.set_option("http-happy-eyeballs", True)
+
     if args.http_cookies:
         streamlink.set_option("http-cookies", args.http_cookies)
 
@@ -760,6 +905,16 @@ def setup_streamlink():
     streamlink = Streamlink({"user-input-requester": ConsoleUserInputRequester(console)})
 
 
+def setup_metrics():
+    """Serves the metrics of the session over HTTP."""
+    try:
+        server = streamlink.metrics.serve(port=args.metrics_port)
+    except socket.error as err:
+        console.exit("Failed to create metrics server: {0}", err)
+
+    log.info("Serving metrics at {0}".format(server.url))
+
+
 def setup_options():
     """Sets Streamlink options."""
     if args.hls_live_edge:
@@ -804,6 +959,24 @@ def setup_options():
     if args.hls_live_restart:
         streamlink.set_option("hls-live-restart", args.hls_live_restart)
 
+    if args.hls_mux_internal:
+        streamlink.set_option("hls-mux-internal", args.hls_mux_internal)
+
+    if args.hls_fast_start:
+        streamlink.set_option("hls-fast-start", args.hls_fast_start)
+
+    if args.hls_low_latency:
+        streamlink.set_option("hls-low-latency", args.hls_low_latency)
+
+    if args.hls_abr:
+        streamlink.set_option("hls-abr", args.hls_abr)
+
+    if args.hls_abr_min:
+        streamlink.set_option("hls-abr-min", args.hls_abr_min)
+
+    if args.hls_abr_max:
+        streamlink.set_option("hls-abr-max", args.hls_abr_max)
+
     if args.hds_live_edge:
         streamlink.set_option("hds-live-edge", args.hds_live_edge)
 
@@ -825,6 +998,18 @@ def setup_options():
     if args.ringbuffer_size:
         streamlink.set_option("ringbuffer-size", args.ringbuffer_size)
 
+    if args.ringbuffer_budget:
+        streamlink.set_option("ringbuffer-budget", args.ringbuffer_budget)
+
+    if args.ringbuffer_spill_size:
+        streamlink.set_option("ringbuffer-spill-size", args.ringbuffer_spill_size)
+
+    if args.ringbuffer_spill_time:
+        streamlink.set_option("ringbuffer-spill-time", args.ringbuffer_spill_time)
+
+    if args.ringbuffer_spill_dir:
+        streamlink.set_option("ringbuffer-spill-dir", args.ringbuffer_spill_dir)
+
     if args.rtmp_proxy:
         streamlink.set_option("rtmp-proxy", args.rtmp_proxy)
 
@@ -837,15 +1022,27 @@ def setup_options():
     if args.stream_segment_attempts:
         streamlink.set_option("stream-segment-attempts", args.stream_segment_attempts)
 
+    if args.stream_segment_hedge:
+        streamlink.set_option("stream-segment-hedge", args.stream_segment_hedge)
+
     if args.stream_segment_threads:
         streamlink.set_option("stream-segment-threads", args.stream_segment_threads)
 
     if args.stream_segment_timeout:
         streamlink.set_option("stream-segment-timeout", args.stream_segment_timeout)
 
+    if args.stream_split_threshold:
+        streamlink.set_option("stream-split-threshold", args.stream_split_threshold)
+
+    if args.stream_split_connections:
+        streamlink.set_option("stream-split-connections", args.stream_split_connections)
+
     if args.stream_timeout:
         streamlink.set_option("stream-timeout", args.stream_timeout)
 
+    if args.streams_cache_ttl:
+        streamlink.set_option("streams-cache-ttl", args.streams_cache_ttl)
+
     if args.ffmpeg_ffmpeg:
         streamlink.set_option("ffmpeg-ffmpeg", args.ffmpeg_ffmpeg)
     if args.ffmpeg_verbose:
@@ -856,6 +1053,8 @@ def setup_options():
         streamlink.set_option("ffmpeg-video-transcode", args.ffmpeg_video_transcode)
     if args.ffmpeg_audio_transcode:
         streamlink.set_option("ffmpeg-audio-transcode", args.ffmpeg_audio_transcode)
+    if args.ffmpeg_pipe_size:
+        streamlink.set_option("ffmpeg-pipe-size", args.ffmpeg_pipe_size)
 
     streamlink.set_option("subprocess-errorlog", args.subprocess_errorlog)
     streamlink.set_option("subprocess-errorlog-path", args.subprocess_errorlog_path)
@@ -1026,6 +1225,8 @@ def main():
     elif args.url:
         try:
             setup_options()
+            if args.metrics_port is not None:
+                setup_metrics()
             handle_url()
         except KeyboardInterrupt:
             # Close output
@@ -0,0 +1,119 @@
+import logging
+import re
+import socket
+from threading import Thread
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer as BaseHTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer as BaseHTTPServer
+    from socketserver import ThreadingMixIn
+
+log = logging.getLogger("streamlink.cli.http")
+
+_segment_re = re.compile(r"^/(\d+)\.(\w+)$")
+_map_re = re.compile(r"^/init-(\d+)\.mp4$")
+
+
+class HLSRequestHandler(BaseHTTPRequestHandler):
+    server_version = "Streamlink"
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def do_GET(self):
+        self.respond()
+
+    def respond(self, send_body=True):
+        window = self.server.window
+        path = self.path.split("?", 1)[0]
+        match = _segment_re.match(path)
+        map_match = _map_re.match(path)
+
+        if path in ("/", "/index.m3u8"):
+            window.wait(self.server.playlist_timeout)
+            data = window.playlist().encode("utf8")
+            content_type = "application/vnd.apple.mpegurl"
+        elif map_match:
+            data = window.get_map(int(map_match.group(1)))
+            content_type = "video/mp4"
+        elif match:
+            data = window.get(int(match.group(1)))
+            content_type = "video/mp4" if match.group(2) == "m4s" else "video/mp2t"
+        else:
+            data = None
+
+        if data is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        if send_body:
+            try:
+                self.wfile.write(data)
+            except socket.error:
+                pass
+
+    def log_message(self, format, *args):
+        log.debug("{0} - {1}".format(self.address_string(), format % args))
+
+
+class HLSServer(ThreadingMixIn, BaseHTTPServer):
+    """Serves the segments of a SegmentWindow as a HLS stream.
+
+    Any number of clients can request the playlist and the segments, which
+    are read from the window and not from the upstream stream.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, window, host="", port=0, playlist_timeout=30):
+        BaseHTTPServer.__init__(self, (host or "", port), HLSRequestHandler)
+        self.window = window
+        self.playlist_timeout = playlist_timeout
+        self.thread = None
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def urls(self):
+        addrs = set()
+        if self.host not in ("", "0.0.0.0"):
+            addrs.add(self.host)
+        else:
+            try:
+                for info in socket.getaddrinfo(socket.gethostname(), self.port,
+                                               socket.AF_INET):
+                    addrs.add(info[4][0])
+            except socket.gaierror:
+                pass
+
+            addrs.add("127.0.0.1")
+
+        for addr in sorted(addrs):
+            yield "http://{0}:{1}/index.m3u8".format(addr, self.port)
+
+    def start(self):
+        self.thread = Thread(target=self.serve_forever,
+                             name="Thread-{0}".format(self.__class__.__name__))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        if self.thread:
+            self.shutdown()
+            self.thread = None
+
+        self.server_close()
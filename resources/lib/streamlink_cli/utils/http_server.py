@@ -1,6 +1,10 @@
+import errno
+import logging
+import select
 import socket
 
 from io import BytesIO
+from threading import Lock, Thread
 
 try:
     from BaseHTTPServer import BaseHTTPRequestHandler
@@ -20,7 +24,18 @@ class HTTPRequest(BaseHTTPRequestHandler):
         self.error_message = message
 
 
+log = logging.getLogger("streamlink.cli.http")
+
+# Errors which mean that a non-blocking socket is not ready yet
+SOCKET_RETRY_ERRNO = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+# Keeps MPEG-TS packet alignment when a client joins or skips ahead
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = b"\x47"
+
+
 class HTTPServer(object):
+    backlog = 1
+
     def __init__(self):
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -58,7 +73,7 @@ class HTTPServer(object):
         except socket.error as err:
             raise OSError(err)
 
-        self.socket.listen(1)
+        self.socket.listen(self.backlog)
         self.bound = True
         self.host, self.port = self.socket.getsockname()
         if self.host == "0.0.0.0":
@@ -117,3 +132,313 @@ class HTTPServer(object):
             except (OSError, socket.error):
                 pass
             self.socket.close()
+
+
+class SharedBuffer(object):
+    """A ring buffer with one writer and any number of readers.
+
+    Readers keep track of their own absolute position in the written data,
+    data older than the buffer size is overwritten.
+    """
+
+    def __init__(self, size):
+        self.buffer = bytearray(size)
+        self.size = size
+        self.end = 0
+        self.lock = Lock()
+
+    @property
+    def start(self):
+        return max(0, self.end - self.size)
+
+    def write(self, data):
+        data = memoryview(data)
+        with self.lock:
+            if len(data) > self.size:
+                self.end += len(data) - self.size
+                data = data[-self.size:]
+
+            pos = self.end % self.size
+            head = min(len(data), self.size - pos)
+            self.buffer[pos:pos + head] = data[:head]
+            self.buffer[:len(data) - head] = data[head:]
+            self.end += len(data)
+
+    def send(self, conn, cursor):
+        """Sends the data following cursor to a non-blocking socket and
+        returns the amount of bytes sent, or None if the data has already
+        been overwritten."""
+        with self.lock:
+            if cursor < self.start:
+                return None
+
+            pos = cursor % self.size
+            size = min(self.end - cursor, self.size - pos)
+
+            return conn.send(memoryview(self.buffer)[pos:pos + size])
+
+
+class SharedStreamReader(Thread):
+    """Reads a stream into the buffer of a SharedHTTPServer."""
+
+    def __init__(self, stream, buffer, prebuffer=None, chunk_size=8192):
+        self.stream = stream
+        self.buffer = buffer
+        self.prebuffer = prebuffer
+        self.chunk_size = chunk_size
+        self.running = True
+        # Whether the stream is MPEG-TS, None until enough data was read
+        self.mpegts = None
+        self.head = b""
+
+        Thread.__init__(self, name="Thread-{0}".format(self.__class__.__name__))
+        self.daemon = True
+
+    def run(self):
+        if self.prebuffer:
+            self.write(self.prebuffer)
+
+        while self.running:
+            try:
+                data = self.stream.read(self.chunk_size)
+            except IOError as err:
+                log.error("Error when reading from stream: {0}".format(err))
+                break
+
+            if not data:
+                break
+
+            self.write(data)
+
+        log.debug("Stream ended")
+
+    def write(self, data):
+        if self.mpegts is None:
+            self.head += data[:TS_PACKET_SIZE + 1 - len(self.head)]
+            if len(self.head) > TS_PACKET_SIZE:
+                self.mpegts = (self.head[:1] == TS_SYNC_BYTE
+                               and self.head[TS_PACKET_SIZE:] == TS_SYNC_BYTE)
+
+        self.buffer.write(data)
+
+    def stop(self):
+        self.running = False
+        self.stream.close()
+
+
+class HTTPClient(object):
+    """A client connection of a SharedHTTPServer."""
+
+    def __init__(self, conn, addr):
+        self.conn = conn
+        self.addr = addr
+        self.request = None
+        self.request_data = b""
+        self.response = b""
+        self.cursor = None
+        self.closing = False
+
+    @property
+    def waiting(self):
+        return bool(self.request) and not self.closing and self.cursor is None
+
+
+class SharedHTTPServer(HTTPServer):
+    """A non-blocking HTTP server which serves one stream to any number of
+    clients.
+
+    The stream is read once into a shared ring buffer and every client
+    keeps its own read cursor into it. Clients which fall behind the
+    buffer are either skipped ahead to the live edge or disconnected,
+    so they can not stall the others.
+
+    Only MPEG-TS streams can be joined or skipped ahead in, clients of
+    other containers need the header at the start of the stream. They
+    can only join while it is still buffered and are disconnected when
+    they fall behind.
+    """
+    backlog = 16
+
+    def __init__(self, buffer_size=16 * 1024 * 1024, drop_slow=False):
+        super(SharedHTTPServer, self).__init__()
+        self.buffer_size = buffer_size
+        self.buffer = SharedBuffer(buffer_size)
+        self.clients = {}
+        self.drop_slow = drop_slow
+        self.reader = None
+
+    @property
+    def streaming(self):
+        return bool(self.reader and self.reader.is_alive())
+
+    @property
+    def waiting(self):
+        """True if a client is waiting for the stream to be opened."""
+        return any(client.waiting for client in self.clients.values())
+
+    def start_stream(self, stream, prebuffer=None):
+        self.stop_stream()
+
+        # Clients of a previous stream are not moved over to the new one,
+        # the waiting ones start reading from the beginning
+        for client in self.clients.values():
+            if client.waiting:
+                client.cursor = 0
+            elif client.cursor is not None:
+                client.cursor = None
+                client.closing = True
+
+        self.buffer = SharedBuffer(self.buffer_size)
+        self.reader = SharedStreamReader(stream, self.buffer, prebuffer)
+        self.reader.start()
+
+    def stop_stream(self):
+        if self.reader:
+            self.reader.stop()
+            self.reader.join()
+            self.reader = None
+
+    def poll(self, timeout=0.05):
+        """Accepts new clients, reads their requests and sends any new stream
+        data, waiting at most timeout seconds for the sockets to be ready."""
+        streaming = self.streaming
+
+        for client in list(self.clients.values()):
+            if client.waiting and streaming:
+                self._join(client)
+            elif client.cursor is not None and not client.closing:
+                if client.cursor < self.buffer.start:
+                    self._lagging(client)
+                elif not streaming and client.cursor == self.buffer.end:
+                    client.closing = True
+
+            if client.closing and not client.response:
+                self._disconnect(client)
+
+        rlist = [self.socket] + list(self.clients)
+        wlist = [conn for conn, client in self.clients.items()
+                 if client.response or (client.cursor is not None and client.cursor < self.buffer.end)]
+
+        try:
+            readable, writable, _ = select.select(rlist, wlist, [], timeout)
+        except (select.error, socket.error, ValueError) as err:
+            log.debug("Failed to poll sockets: {0}".format(err))
+            return
+
+        for conn in readable:
+            if conn is self.socket:
+                self._accept()
+            elif conn in self.clients:
+                self._read(self.clients[conn])
+
+        for conn in writable:
+            if conn in self.clients:
+                self._write(self.clients[conn])
+
+    def _accept(self):
+        try:
+            conn, addr = self.socket.accept()
+        except socket.error:
+            return
+
+        conn.setblocking(False)
+        self.clients[conn] = HTTPClient(conn, addr)
+
+    def _read(self, client):
+        try:
+            data = client.conn.recv(4096)
+        except socket.error as err:
+            if err.errno in SOCKET_RETRY_ERRNO:
+                return
+            data = b""
+
+        if not data:
+            self._disconnect(client)
+            return
+
+        # Anything received after the request is ignored
+        if client.request:
+            return
+
+        client.request_data += data
+        if b"\r\n\r\n" not in client.request_data and len(client.request_data) < 8192:
+            return
+
+        req = HTTPRequest(client.request_data)
+        if req.command not in ("GET", "HEAD"):
+            log.debug("Invalid request method from {0}: {1}".format(client.addr[0], req.command))
+            client.response = b"HTTP/1.1 501 Not Implemented\r\n\r\n"
+            client.closing = True
+            client.request = req
+            return
+
+        user_agent = req.headers.get("User-Agent") or "unknown player"
+        log.info("Got HTTP request from {0} ({1})".format(user_agent, client.addr[0]))
+
+        client.request = req
+        client.response = (b"HTTP/1.1 200 OK\r\n"
+                           b"Server: Streamlink\r\n"
+                           b"Content-Type: video/unknown\r\n"
+                           b"\r\n")
+
+        # We don't want to send any data on HEAD requests.
+        if req.command == "HEAD":
+            client.closing = True
+
+    def _write(self, client):
+        try:
+            if client.response:
+                sent = client.conn.send(client.response)
+                client.response = client.response[sent:]
+            elif client.cursor is not None:
+                sent = self.buffer.send(client.conn, client.cursor)
+                if sent is None:
+                    self._lagging(client)
+                else:
+                    client.cursor += sent
+        except socket.error as err:
+            if err.errno not in SOCKET_RETRY_ERRNO:
+                self._disconnect(client)
+
+    @property
+    def mpegts(self):
+        return bool(self.reader and self.reader.mpegts)
+
+    def _join(self, client):
+        if self.mpegts:
+            # Join at the live edge
+            client.cursor = self.buffer.end - self.buffer.end % TS_PACKET_SIZE
+        elif self.buffer.start == 0:
+            client.cursor = 0
+        else:
+            log.info("HTTP client {0} can not join the stream, the start of it is no longer "
+                     "buffered".format(client.addr[0]))
+            client.closing = True
+
+    def _lagging(self, client):
+        if self.drop_slow or not self.mpegts:
+            log.info("HTTP client {0} is too slow, disconnecting".format(client.addr[0]))
+            self._disconnect(client)
+        else:
+            skip_to = self.buffer.end - self.buffer.end % TS_PACKET_SIZE
+            log.debug("HTTP client {0} is too slow, skipping {1} bytes".format(
+                      client.addr[0], skip_to - client.cursor))
+            client.cursor = skip_to
+
+    def _disconnect(self, client):
+        if client.request and client.request.command == "GET":
+            log.info("HTTP connection closed ({0})".format(client.addr[0]))
+
+        self.clients.pop(client.conn, None)
+        try:
+            client.conn.close()
+        except socket.error:
+            pass
+
+    def close(self, client_only=False):
+        for client in list(self.clients.values()):
+            self._disconnect(client)
+
+        if not client_only:
+            self.stop_stream()
+            super(SharedHTTPServer, self).close()